@@ -0,0 +1,280 @@
+"""A local stand-in for Groq's OpenAI-compatible chat completions API (standard library only).
+
+Usage:
+    python benchmarks/mock_groq.py                                   # http://127.0.0.1:8000
+    python benchmarks/mock_groq.py --latency 0.3 --tokens-per-second 300
+    python benchmarks/mock_groq.py --rate-429 0.05 --rate-5xx 0.01   # Inject failures
+    python benchmarks/mock_groq.py --rpm 120                         # Enforce a request quota
+    GROQ_API_URL=http://127.0.0.1:8000/openai/v1/chat/completions python main.py "hello"
+
+POST /openai/v1/chat/completions answers with synthetic text, streamed as
+server-sent events when the request asks for "stream". Usage and
+x-ratelimit-* headers are reported like Groq does, so the client's rate
+limiter, retries and metrics behave as they would against the real API.
+GET /stats returns request counters as JSON.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+WORDS = (
+    "the request is handled by a worker that reads the input parses each line and "
+    "returns a result so the caller can continue while the cache keeps recent answers"
+).split()
+
+
+class Counters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {"requests": 0, "streamed": 0, "completed": 0, "429": 0, "5xx": 0, "disconnected": 0}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def add(self, name: str):
+        with self.lock:
+            self.values[name] += 1
+
+    def enter(self):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {**self.values, "in_flight": self.in_flight, "max_in_flight": self.max_in_flight}
+
+
+class Quota:
+    """Requests per minute over a sliding window, like Groq's request limit"""
+
+    def __init__(self, rpm: int):
+        self.rpm = rpm
+        self.sent: deque = deque()
+        self.lock = threading.Lock()
+
+    def take(self) -> tuple[bool, int, float]:
+        """Return (allowed, requests remaining, seconds until the oldest one leaves the window)"""
+        with self.lock:
+            now = time.monotonic()
+            while self.sent and self.sent[0] <= now - 60:
+                self.sent.popleft()
+            allowed = len(self.sent) < self.rpm
+            if allowed:
+                self.sent.append(now)
+            reset = self.sent[0] + 60 - now if self.sent else 0.0
+            return allowed, self.rpm - len(self.sent), reset
+
+
+def answer_text(messages: list, tokens: int, replies: Dict[str, str]) -> list:
+    """The answer as a list of tokens: a scripted reply if one matches, else synthetic text"""
+    last = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    for trigger, reply in replies.items():
+        if trigger in last:
+            return [word + " " for word in reply.split(" ")]
+    rng = random.Random(last)  # The same question gets the same answer
+    words = [rng.choice(WORDS) + " " for _ in range(max(1, tokens - 12))]
+    code = ["\n```python\n", "def ", "handle", "(event", "):\n", "    return ", "event", "\n```\n"]
+    return words[: len(words) // 2] + code + words[len(words) // 2:] + ["\n"]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so connection reuse is measured too
+    server: "MockServer"
+
+    def log_message(self, format, *args):
+        if self.server.options.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, body: Dict, headers: Optional[Dict] = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_HEAD(self):
+        # The client pre-warms its connection with HEAD; Groq answers 405 as well
+        self.send_response(405)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, self.server.counters.snapshot())
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        if self.path != COMPLETIONS_PATH:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        counters = self.server.counters
+        counters.add("requests")
+        counters.enter()
+        try:
+            self._complete(raw)
+        except (BrokenPipeError, ConnectionResetError):
+            counters.add("disconnected")  # Cancelled or hedged away by the client
+            self.close_connection = True
+        finally:
+            counters.leave()
+
+    def _complete(self, raw: bytes):
+        options = self.server.options
+        counters = self.server.counters
+        if self.headers.get("Content-Encoding") == "gzip":
+            import gzip
+            raw = gzip.decompress(raw)
+        try:
+            request = json.loads(raw)
+            messages = request["messages"]
+        except (ValueError, KeyError):
+            self._send_json(400, {"error": {"message": "Invalid request body", "type": "invalid_request_error"}})
+            return
+
+        limits = {}
+        if self.server.quota:
+            allowed, remaining, reset = self.server.quota.take()
+            limits = {
+                "x-ratelimit-limit-requests": str(options.rpm),
+                "x-ratelimit-remaining-requests": str(max(0, remaining)),
+                "x-ratelimit-reset-requests": f"{reset:.2f}s",
+            }
+            if not allowed:
+                counters.add("429")
+                self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                                {**limits, "retry-after": f"{max(reset, options.retry_after):.2f}"})
+                return
+        if random.random() < options.rate_429:
+            counters.add("429")
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "tokens"}},
+                            {"retry-after": str(options.retry_after)})
+            return
+        if random.random() < options.rate_5xx:
+            counters.add("5xx")
+            self._send_json(random.choice((500, 502, 503)), {"error": {"message": "Service unavailable"}})
+            return
+
+        latency = max(0.0, random.gauss(options.latency, options.jitter)) if options.jitter else options.latency
+        time.sleep(latency)
+        tokens = answer_text(messages, options.answer_tokens, self.server.replies)
+        usage = {
+            "prompt_tokens": len(raw) // 4,
+            "completion_tokens": len(tokens),
+            "completion_time": round(len(tokens) / options.tokens_per_second, 4) if options.tokens_per_second else 0.0,
+        }
+        model = request.get("model", "mock")
+        if request.get("stream"):
+            counters.add("streamed")
+            self._stream(model, tokens, usage, limits)
+        else:
+            time.sleep(usage["completion_time"])
+            self._send_json(200, {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            }, limits)
+        counters.add("completed")
+
+    def _stream(self, model: str, tokens: list, usage: Dict, limits: Dict):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in limits.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        def event(data: Dict):
+            chunk = b"data: " + json.dumps(data).encode("utf-8") + b"\n\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+
+        rate = self.server.options.tokens_per_second
+        start = time.monotonic()
+        base = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "model": model}
+        for index, token in enumerate(tokens):
+            if rate:
+                # Pace against the start time, so sleep overhead does not accumulate
+                delay = start + index / rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            event({**base, "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+            self.wfile.flush()
+        event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"usage": usage}})
+        chunk = b"data: [DONE]\n\n"
+        self.wfile.write(b"%x\r\n%s\r\n0\r\n\r\n" % (len(chunk), chunk))
+        self.wfile.flush()
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, options: argparse.Namespace):
+        super().__init__((options.host, options.port), Handler)
+        self.options = options
+        self.counters = Counters()
+        self.quota = Quota(options.rpm) if options.rpm else None
+        self.replies: Dict[str, str] = {}
+        if options.replies:
+            with open(options.replies, "r", encoding="utf-8") as f:
+                self.replies = json.load(f)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{COMPLETIONS_PATH}"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Local mock of the Groq chat completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000, help="0 picks a free port (printed on start)")
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds before the answer starts")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Standard deviation of --latency, in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=500.0, help="Answer pace (0: as fast as possible)")
+    parser.add_argument("--answer-tokens", type=int, default=150, help="Tokens in each synthetic answer")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of requests refused with 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Share of requests failing with 500/502/503")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="retry-after seconds sent with 429s")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute before 429s (0: no quota)")
+    parser.add_argument("--replies", metavar="JSON", help='Scripted answers: {"text in the question": "answer"}')
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    return parser
+
+
+def main() -> int:
+    options = build_parser().parse_args()
+    server = MockServer(options)
+    print(server.url, flush=True)  # First line of output: replay.py reads the URL from it
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.counters.snapshot()), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
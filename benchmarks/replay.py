@@ -0,0 +1,294 @@
+"""Replay chat sessions against a local mock Groq server; report throughput, latency and memory.
+
+Usage:
+    python benchmarks/replay.py                                   # 32 synthetic sessions, 8 at a time
+    python benchmarks/replay.py --concurrency 32 --sessions 256 --turns 4
+    python benchmarks/replay.py --target inline --concurrency 4   # `python main.py "<message>"` per turn
+    python benchmarks/replay.py --input sessions.jsonl            # {"role": "1", "turns": ["...", "..."]} per line
+    python benchmarks/replay.py --from-db ~/.cache/chatbot-cli/sessions.sqlite --sessions 50
+    python benchmarks/replay.py --mock-args "--latency 0.5 --jitter 0.2 --rate-429 0.05"
+    python benchmarks/replay.py --url http://10.0.0.5:8000/openai/v1/chat/completions --json results.json
+
+The chatbot target runs each session's turns in order on one Chatbot, with
+--concurrency sessions at a time in this process. The inline target starts
+main.py once per turn, as a shell user would; inline mode is one-shot, so a
+turn does not see the earlier ones. Nothing needs the network: mock_groq.py
+is started on a free port unless --url is given, and the client runs with a
+throwaway cache directory, so real sessions, cache, metrics and rate limiter
+state are left alone.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# (role number, user messages in order)
+Session = Tuple[str, List[str]]
+
+QUESTIONS = [
+    "What does a context manager do in Python?",
+    "Explain the difference between a process and a thread.",
+    "How do I find which process is listening on port 8080?",
+    "Summarize the CAP theorem in a few sentences.",
+    "Why is my SQL query slow when I add ORDER BY on a large table?",
+    "Review this function:\n```python\ndef total(items):\n    s = 0\n    for i in range(len(items)):\n        s = s + items[i]['price'] * items[i]['qty']\n    return s\n```",
+    "Translate 'the build failed because a dependency was missing' into French.",
+    "Write a regex that matches ISO 8601 dates.",
+]
+FOLLOW_UPS = ["Can you give an example?", "Why?", "Make it shorter.", "What are the trade-offs?"]
+
+
+def synthetic_sessions(count: int, turns: int, seed: int) -> List[Session]:
+    rng = random.Random(seed)
+    return [
+        (rng.choice("1234"), [rng.choice(QUESTIONS)] + [rng.choice(FOLLOW_UPS) for _ in range(turns - 1)])
+        for _ in range(count)
+    ]
+
+
+def load_sessions(path: str) -> List[Session]:
+    sessions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                sessions.append((str(record.get("role", "1")), list(record["turns"])))
+    return sessions
+
+
+def recorded_sessions(db_path: str, limit: int) -> List[Session]:
+    """User messages of the most recent saved sessions, split into one session per role"""
+    from src.sessions import SessionStore
+
+    store = SessionStore(db_path)
+    sessions = []
+    for info in store.list_sessions(limit):
+        by_role: Dict[str, List[str]] = {}
+        for role_number, content in store.user_turns(info["id"]):
+            by_role.setdefault(role_number, []).append(content)
+        sessions.extend((role_number, turns) for role_number, turns in by_role.items() if role_number != "5")
+    return sessions
+
+
+def start_mock(mock_args: List[str]) -> Tuple[subprocess.Popen, str]:
+    """Start mock_groq.py on a free port; returns (process, completions URL)"""
+    command = [sys.executable, os.path.join(ROOT, "benchmarks", "mock_groq.py"), "--port", "0", *mock_args]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    url = process.stdout.readline().strip()
+    if not url:
+        process.wait()
+        raise RuntimeError("mock server did not start")
+    return process, url
+
+
+def server_stats(url: str) -> Optional[Dict]:
+    """Counters from the mock server's /stats (None for other servers)"""
+    parts = urlsplit(url)
+    try:
+        with urllib.request.urlopen(f"{parts.scheme}://{parts.netloc}/stats", timeout=5) as response:
+            return json.load(response)
+    except (OSError, ValueError):
+        return None
+
+
+def replay_chatbot(sessions: List[Session], concurrency: int, stream: bool) -> List[Dict]:
+    from src.chatbot import Chatbot
+    from src.config import ROLES
+
+    def run(session: Session) -> List[Dict]:
+        role_number, turns = session
+        chatbot = Chatbot(ROLES[role_number])
+        results = []
+        for message in turns:
+            start = time.perf_counter()
+            ttft = None
+            if stream:
+                parts = []
+                for delta in chatbot.stream_response(message):
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    parts.append(delta)
+                answer = "".join(parts)
+            else:
+                answer = chatbot.get_response(message)
+            results.append({
+                "latency": time.perf_counter() - start,
+                "ttft": ttft,
+                "chars": len(answer),
+                "error": answer.strip() if answer.startswith("\nError:") else None,
+            })
+        return results
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return [turn for results in pool.map(run, sessions) for turn in results]
+
+
+def replay_inline(sessions: List[Session], concurrency: int, stream: bool) -> List[Dict]:
+    """One main.py process per turn, at most concurrency at a time"""
+    turns = [(role_number, message) for role_number, messages in sessions for message in messages]
+    options = ["--no-daemon", "--no-cache"] + ([] if stream else ["--no-stream"])
+
+    def run(turn: Tuple[str, str]) -> Dict:
+        role_number, message = turn
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "main.py", *options, f"{role_number}#{message}"],
+            cwd=ROOT, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        )
+        output = process.stdout.read()
+        process.stdout.close()
+        _, status, usage = os.wait4(process.pid, 0)  # Unlike wait(), also returns the child's peak RSS
+        process.returncode = os.waitstatus_to_exitcode(status)
+        failed = process.returncode != 0 or b"Error:" in output
+        return {
+            "latency": time.perf_counter() - start,
+            "ttft": None,
+            "chars": len(output),
+            "error": output.decode("utf-8", errors="replace").strip()[-200:] if failed else None,
+            "max_rss_kb": usage.ru_maxrss,
+        }
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(run, turns))
+
+
+def report(results: List[Dict], elapsed: float, memory: Dict, stats: Optional[Dict]) -> Dict:
+    from src.metrics import percentile
+
+    ok = [result for result in results if result["error"] is None]
+    summary = {
+        "turns": len(results),
+        "errors": len(results) - len(ok),
+        "seconds": round(elapsed, 3),
+        "turns_per_second": round(len(ok) / elapsed, 2) if elapsed else None,
+        "chars_per_second": round(sum(result["chars"] for result in ok) / elapsed) if elapsed else None,
+        **memory,
+    }
+    for name in ("latency", "ttft"):
+        values = [result[name] for result in ok if result[name] is not None]
+        if values:
+            for quantile in (0.5, 0.9, 0.99):
+                summary[f"{name}_p{round(quantile * 100)}"] = round(percentile(values, quantile), 4)
+            summary[f"{name}_max"] = round(max(values), 4)
+    if stats:
+        summary["server"] = stats
+
+    print(f"Turns:       {summary['turns']} ({summary['errors']} failed) in {summary['seconds']:.2f} s")
+    print(f"Throughput:  {summary['turns_per_second']} turns/s, {summary['chars_per_second']} answer chars/s")
+    for name, label in (("latency", "Latency"), ("ttft", "First token")):
+        if f"{name}_p50" in summary:
+            print(f"{label + ':':<12} p50 {summary[f'{name}_p50'] * 1000:.0f} ms, p90 "
+                  f"{summary[f'{name}_p90'] * 1000:.0f} ms, p99 {summary[f'{name}_p99'] * 1000:.0f} ms, "
+                  f"max {summary[f'{name}_max'] * 1000:.0f} ms")
+    if "peak_rss_mb" in memory:
+        print(f"Memory:      peak RSS {memory['peak_rss_mb']} MB ({memory['rss_before_mb']} MB before the replay)")
+    else:
+        print(f"Memory:      peak RSS per process p50 {memory['process_rss_p50_mb']} MB, "
+              f"max {memory['process_rss_max_mb']} MB")
+    if stats:
+        print(f"Server:      {stats['requests']} requests, {stats['429']} x 429, {stats['5xx']} x 5xx, "
+              f"{stats['disconnected']} disconnected, at most {stats['max_in_flight']} in flight")
+    errors = Counter(result["error"].splitlines()[-1][:100] for result in results if result["error"])
+    for error, count in errors.most_common(5):
+        print(f"  {count} x {error}")
+    return summary
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay chat sessions against a mock Groq server")
+    parser.add_argument("--target", choices=["chatbot", "inline"], default="chatbot")
+    parser.add_argument("--concurrency", type=int, default=8, help="Sessions (chatbot) or processes (inline) at once")
+    parser.add_argument("--sessions", type=int, default=32, help="Synthetic sessions, or recorded ones to load")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per synthetic session")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--input", metavar="JSONL", help='Sessions to replay: {"role": "1", "turns": [...]} per line')
+    parser.add_argument("--from-db", metavar="SESSIONS_DB", help="Replay the user turns of saved sessions")
+    parser.add_argument("--no-stream", action="store_true", help="Request whole answers instead of streams")
+    parser.add_argument("--url", help="Use this server instead of starting mock_groq.py")
+    parser.add_argument("--mock-args", default="", help='Options for mock_groq.py, e.g. "--latency 0.5 --rate-5xx 0.02"')
+    parser.add_argument("--client-rpm", type=float, help="Starting rate of the client's limiter (default: its maximum)")
+    parser.add_argument("--json", metavar="PATH", help="Also write the summary as JSON")
+    args = parser.parse_args()
+
+    mock = None
+    url = args.url
+    if url is None:
+        mock, url = start_mock(shlex.split(args.mock_args))
+    cache_dir = tempfile.mkdtemp(prefix="chatbot-replay-")
+    # Set before src is imported, so config and inline child processes pick them up
+    os.environ.update({
+        "CHATBOT_CACHE_DIR": cache_dir,
+        "GROQ_API_URL": url,
+        "GROQ_API_KEY": os.environ.get("GROQ_API_KEY", "replay"),
+    })
+    try:
+        from src import config
+        from src.ratelimit import get_limiter
+
+        config.RESPONSE_CACHE = False  # Replayed questions repeat; measure requests, not cache hits
+        # Start the shared limiter (its state file is read by inline processes too) at full rate
+        config.RATE_LIMIT_RPM = args.client_rpm or config.RATE_LIMIT_MAX_RPM
+        get_limiter().update(200, {})
+
+        if args.from_db:
+            sessions = recorded_sessions(args.from_db, args.sessions)
+        elif args.input:
+            sessions = load_sessions(args.input)
+        else:
+            sessions = synthetic_sessions(args.sessions, args.turns, args.seed)
+        if not sessions:
+            print("❌ No sessions to replay")
+            return 1
+
+        turns = sum(len(messages) for _, messages in sessions)
+        print(f"Replaying {len(sessions)} sessions ({turns} turns) via {args.target}, "
+              f"{args.concurrency} at a time, against {url}\n", flush=True)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        if args.target == "chatbot":
+            results = replay_chatbot(sessions, args.concurrency, stream=not args.no_stream)
+        else:
+            results = replay_inline(sessions, args.concurrency, stream=not args.no_stream)
+        elapsed = time.perf_counter() - start
+
+        if args.target == "chatbot":
+            memory = {
+                "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                "rss_before_mb": round(rss_before / 1024, 1),
+            }
+        else:
+            peaks = sorted(result["max_rss_kb"] for result in results)
+            memory = {
+                "process_rss_p50_mb": round(peaks[len(peaks) // 2] / 1024, 1),
+                "process_rss_max_mb": round(peaks[-1] / 1024, 1),
+            }
+        summary = report(results, elapsed, memory, server_stats(url))
+        summary.update(target=args.target, concurrency=args.concurrency, stream=not args.no_stream)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+        return 0
+    finally:
+        if mock is not None:
+            mock.terminate()
+            mock.wait()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
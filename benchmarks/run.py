@@ -0,0 +1,335 @@
+"""Microbenchmarks for the local hot paths (no network access needed).
+
+Usage:
+    python benchmarks/run.py                        # Run everything and print timings
+    python benchmarks/run.py -k markdown            # Only benchmarks whose name contains 'markdown'
+    python benchmarks/run.py --save                 # Record the results as the baseline
+    python benchmarks/run.py --compare              # Exit 1 if anything is slower than the baseline
+    python benchmarks/run.py --compare --threshold 0.1
+
+Timings are the best of several repeats (seconds per call), which is the
+most stable figure on a busy machine. Baselines are machine specific: save
+and compare on the same host.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("GROQ_API_KEY", "benchmark")  # Nothing here calls the API
+
+from src import config  # noqa: E402
+
+config.RESPONSE_CACHE = False
+config.METRICS = False
+config.PAGER = False
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# name -> factory returning the function to time (setup happens in the factory)
+BENCHMARKS: Dict[str, Callable[[], Callable[[], object]]] = {}
+# Undo steps factories register for what they create (temporary files); run after each benchmark
+CLEANUPS: List[Callable[[], None]] = []
+
+
+def benchmark(name: str):
+    def register(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return register
+
+
+def _answer(blocks: int) -> str:
+    """A long model answer alternating prose and code blocks"""
+    parts = []
+    for i in range(blocks):
+        parts.append(f"Step {i}: explain what the next function does and why it matters.\n")
+        parts.append(f"```python\ndef handler_{i}(event):\n    value = event['n'] * {i}\n    return value\n```\n")
+    return "\n".join(parts)
+
+
+@benchmark("process_message")
+def _process_message():
+    from main import process_message
+    messages = ["1#explain this function", "show me all files", "5#xóa màn hình", "what is # in python"]
+
+    def run():
+        for message in messages:
+            process_message(message)
+    return run
+
+
+def _cli_chatbot(resolver: bool):
+    from src.chatbot import Chatbot
+
+    chatbot = Chatbot(config.ROLES["5"])
+    chatbot.get_response = lambda content: "COMMAND: ls"  # Measure the local matching, not the API
+    messages = ["hiển thị các file trong thư mục", "please explain how virtual memory works", "show disk usage"]
+
+    config.INTENT_RESOLVER = resolver  # Restored after the benchmark
+
+    def run():
+        for message in messages:
+            chatbot.get_cli_response(message, "linux")
+    return run
+
+
+@benchmark("get_cli_response.indicators")
+def _cli_indicators():
+    return _cli_chatbot(resolver=False)
+
+
+@benchmark("get_cli_response.local_intent")
+def _cli_local_intent():
+    return _cli_chatbot(resolver=True)
+
+
+def _input_file(size: int, suffix: str = ".py") -> str:
+    """A temporary source file of about size characters (gzip-compressed for a .gz suffix)"""
+    import gzip
+
+    line = "def compute(values):  # A representative line of source code\n"
+    text = (line * max(1, size // len(line))).encode("utf-8")
+    handle = tempfile.NamedTemporaryFile("wb", suffix=suffix, delete=False)
+    CLEANUPS.append(lambda: os.unlink(handle.name))
+    with handle:
+        handle.write(gzip.compress(text) if suffix.endswith(".gz") else text)
+    return handle.name
+
+
+def _attach_benchmark(size: int):
+    def factory():
+        from src.chatbot import Chatbot
+        from src.ingest import attach_files
+
+        path = _input_file(size)
+        chatbot = Chatbot(config.ROLES["1"])
+        return lambda: attach_files(chatbot, "", [path], progress=lambda text: None)
+    return factory
+
+
+# Inputs that fit in one request are attached inline
+for _label, _size in (("1KB", 1024), ("64KB", 64 * 1024)):
+    benchmark(f"ingest.attach_files.{_label}")(_attach_benchmark(_size))
+
+
+def _chunks_benchmark(suffix: str):
+    def factory():
+        from src.history import CHARS_PER_TOKEN
+        from src.ingest import iter_chunks
+
+        path = _input_file(1_000_000, suffix)
+        chunk_chars = config.INGEST_CHUNK_TOKENS * CHARS_PER_TOKEN
+        return lambda: sum(1 for _ in iter_chunks(path, chunk_chars))
+    return factory
+
+
+# Larger ones are read in chunks for the map requests (timed without the requests)
+benchmark("ingest.iter_chunks.1MB")(_chunks_benchmark(".py"))
+benchmark("ingest.iter_chunks.1MB_gz")(_chunks_benchmark(".log.gz"))
+
+
+@benchmark("extract_code_blocks.500_blocks")
+def _extract_code_blocks():
+    from src.utils import extract_code_blocks
+    text = _answer(500)
+    return lambda: extract_code_blocks(text)
+
+
+@benchmark("copy_content.c-N_x10")
+def _copy_blocks():
+    import pyperclip
+    from src.utils import copy_content
+
+    pyperclip.copy = lambda text: None  # Time the lookup, not the system clipboard
+    text = _answer(500)
+    command = " ".join(f"c-{n}" for n in range(1, 500, 50))
+    return lambda: copy_content(text, command)
+
+
+@benchmark("parsed_response.stream_feed")
+def _stream_feed():
+    from src.response import ParsedResponse
+    text = _answer(500)
+    chunks = [text[i:i + 16] for i in range(0, len(text), 16)]  # Token-sized deltas
+
+    def run():
+        response = ParsedResponse()
+        for chunk in chunks:
+            response.feed(chunk)
+        response.finish()
+    return run
+
+
+def _markdown_benchmark(blocks: int):
+    def factory():
+        from rich.console import Console
+        from src import display
+
+        display.console = Console(file=io.StringIO(), width=100, force_terminal=True, color_system="truecolor")
+        text = _answer(blocks)
+
+        def run():
+            display.display_markdown(text)
+            display.console.file = io.StringIO()
+        return run
+    return factory
+
+
+benchmark("display_markdown.10_blocks")(_markdown_benchmark(10))
+benchmark("display_markdown.200_blocks")(_markdown_benchmark(200))
+
+
+@benchmark("prepare_payload.long_history")
+def _prepare_payload():
+    from src.chatbot import Chatbot
+
+    chatbot = Chatbot(config.ROLES["1"])
+    answer = _answer(5)
+    while chatbot.history.evicted_turns == 0:  # Fill the history up to its token budget
+        chatbot.history.append("user", "How do I make this faster?")
+        chatbot.history.append("assistant", answer)
+
+    def run():
+        payload = chatbot._prepare_payload("And what about memory use?", stream=True)
+        chatbot._encoder.encode(payload)  # The request body, as _send builds it
+        chatbot.history.append("assistant", answer)
+    return run
+
+
+def _growing_history(turns: int) -> List[Dict]:
+    answer = _answer(2)
+    messages = [{"role": "system", "content": config.ROLES["1"]}]
+    for _ in range(turns):
+        messages.append({"role": "user", "content": "How do I make this faster?"})
+        messages.append({"role": "assistant", "content": answer})
+    return messages
+
+
+def _growth_benchmark(turns: int, incremental: bool):
+    """Encode the body for one more turn on top of a turns-long conversation"""
+    def factory():
+        from src.payload import BodyEncoder
+
+        messages = _growing_history(turns)
+        encoder = BodyEncoder()
+        payload = {"messages": messages, "model": config.MODEL, "stream": True}
+
+        def run():
+            messages.append({"role": "user", "content": "And what about memory use?"})
+            if incremental:
+                encoder.encode(payload)
+            else:
+                json.dumps(payload).encode("utf-8")  # What requests does with json=payload
+            messages.pop()
+        return run
+    return factory
+
+
+# Per-turn cost as the conversation grows: incremental encoding should stay
+# nearly flat (a copy of the prefix) while a full json.dumps grows with history.
+for _turns in (10, 100, 1000):
+    benchmark(f"encode_payload.history_{_turns}")(_growth_benchmark(_turns, incremental=True))
+    benchmark(f"json_dumps.history_{_turns}")(_growth_benchmark(_turns, incremental=False))
+
+
+def measure(function: Callable[[], object], repeat: int) -> Tuple[float, int]:
+    """Return (best seconds per call, calls per repeat)"""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()  # Enough calls for about 0.2 s per repeat
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    return best, number
+
+
+def run(names: List[str], repeat: int) -> Dict[str, Dict]:
+    results = {}
+    width = max(len(name) for name in names)
+    for name in names:
+        # Settings a benchmark changes must not leak into the next one
+        saved = {key: value for key, value in vars(config).items() if key.isupper()}
+        try:
+            seconds, number = measure(BENCHMARKS[name](), repeat)
+        finally:
+            for key, value in saved.items():
+                setattr(config, key, value)
+            while CLEANUPS:
+                CLEANUPS.pop()()
+        results[name] = {"seconds": seconds, "number": number}
+        print(f"{name:<{width}}  {seconds * 1e6:12.1f} µs/call  ({number} calls x {repeat})")
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> int:
+    """Print the change against baseline and return 1 if any benchmark regressed past threshold"""
+    failed = 0
+    print(f"\nCompared with the baseline (fail above +{threshold:.0%}):")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"  {name}: no baseline")
+            continue
+        change = result["seconds"] / baseline[name]["seconds"] - 1
+        regressed = change > threshold
+        failed |= regressed
+        print(f"  {'❌' if regressed else '✓'} {name}: {change:+.1%}")
+    return int(failed)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the chatbot's local hot paths")
+    parser.add_argument("-k", dest="pattern", help="Only run benchmarks whose name contains this", default="")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeats per benchmark (the best is kept)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="Save the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="Fail if slower than the baseline")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="Allowed slowdown before --compare fails (0.2 = 20%%)"
+    )
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if args.pattern in name]
+    if not names:
+        print(f"❌ No benchmark matches '{args.pattern}'")
+        return 1
+    results = run(names, args.repeat)
+
+    status = 0
+    if args.compare:
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)["results"]
+        except (OSError, ValueError, KeyError):
+            print(f"❌ No baseline at {args.baseline} (create one with --save)")
+            return 1
+        status = compare(results, baseline, args.threshold)
+
+    if args.save:
+        # Keep baseline entries for benchmarks that were not run this time
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                saved = json.load(f)["results"]
+        except (OSError, ValueError, KeyError):
+            saved = {}
+        saved.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "results": saved,
+                },
+                f,
+                indent=2,
+            )
+        print(f"\n✓ Baseline saved to {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,11 @@
 import sys
 import argparse
-from prompt_toolkit import PromptSession
-from prompt_toolkit.key_binding import KeyBindings
-from prompt_toolkit.keys import Keys
 import platform
 import os
+from contextlib import nullcontext
 
-from src.chatbot import Chatbot
-from src.config import ROLES, DEFAULT_INLINE_ROLE
-from src.display import (
-    select_role,
-    select_role_inline,
-    show_instructions,
-    display_markdown,
-)
-from src.utils import copy_content, execute_command, confirm_execution
+from src import config
+from src.config import ROLES, DEFAULT_INLINE_ROLE, STREAM_RESPONSES
 
 def process_message(message: str, current_role: str = DEFAULT_INLINE_ROLE) -> tuple[str, str]:
     """Process message to extract role and clean message. Returns (clean_message, role_description)"""
@@ -27,92 +18,356 @@ def process_message(message: str, current_role: str = DEFAULT_INLINE_ROLE) -> tu
                 return parts[1].strip(), ROLES[role_num]
     return message, ROLES[current_role]
 
-def main():
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="CLI Chatbot")
     parser.add_argument(
         "content", nargs="?", help="Input content", default=None
     )  # Positional argument
-    parser.add_argument("--file", type=str, help="Path to input file", default=None)
+    parser.add_argument(
+        "--file",
+        action="append",
+        help="Input file, directory or glob (repeatable; large inputs are summarized in parts)",
+        default=None,
+    )
     parser.add_argument(
         "--content",
         dest="content_flag",
         help="Input content (alternative way)",
         default=None,
     )  # Renamed to avoid conflict
-    args = parser.parse_args()
+    parser.add_argument(
+        "--no-stream",
+        action="store_true",
+        help="Wait for the full answer instead of streaming it",
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Show connection and cache details for each request",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Answer repeated requests from the on-disk response cache",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Bypass the on-disk response cache (when RESPONSE_CACHE is on)",
+    )
+    parser.add_argument(
+        "--context",
+        action="store_true",
+        help="Attach relevant code from the working directory's project (Programming Expert role)",
+    )
+    parser.add_argument(
+        "--no-context",
+        action="store_true",
+        help="Do not attach relevant code from the working directory (when RETRIEVAL is on)",
+    )
+    parser.add_argument(
+        "--cache-stats",
+        action="store_true",
+        help="Show response cache hits, misses and time saved, then exit",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Show request latency percentiles and token throughput per role and model, then exit",
+    )
+    parser.add_argument(
+        "--resume",
+        nargs="?",
+        const="last",
+        metavar="SESSION_ID",
+        help="Continue a saved session (default: the most recent one)",
+        default=None,
+    )
+    parser.add_argument(
+        "--sessions",
+        action="store_true",
+        help="List saved sessions, then exit",
+    )
+    parser.add_argument(
+        "--search",
+        metavar="QUERY",
+        help="Search past answers in saved sessions, then exit",
+        default=None,
+    )
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help='Analyze piped lines as they arrive, e.g. tail -f app.log | main.py --follow "3#flag anomalies"',
+    )
+    parser.add_argument(
+        "--follow-file",
+        metavar="PATH",
+        help="Tail a file and analyze new lines as they are written",
+        default=None,
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="INPUT_JSONL",
+        help='Run prompts from a JSONL file ({"role": "1", "message": "...", "file": "..."} per line)',
+        default=None,
+    )
+    parser.add_argument(
+        "--output",
+        help="Batch results file (default: <input>.results.jsonl)",
+        default=None,
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Concurrent requests in batch mode",
+        default=None,
+    )
+    parser.add_argument(
+        "--order",
+        choices=["input", "completion"],
+        help="Write batch results in input order (default) or as they complete",
+        default="input",
+    )
+    parser.add_argument(
+        "--startup-profile",
+        nargs="?",
+        type=float,
+        const=config.STARTUP_THRESHOLD_MS,
+        metavar="THRESHOLD_MS",
+        help="Report inline-mode import time (python -X importtime) and fail above the threshold",
+        default=None,
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile each inline run or interactive turn (cProfile and tracemalloc reports in the cache directory)",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Run a background server that keeps chatbots and connections warm for inline queries",
+    )
+    parser.add_argument(
+        "--stop-daemon",
+        action="store_true",
+        help="Stop a running daemon",
+    )
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Handle this query in-process even if a daemon is running",
+    )
+    return parser
+
+def main():
+    args = build_parser().parse_args()
+    if args.startup_profile is not None:
+        from src.startup import profile_startup
+        sys.exit(profile_startup(args.startup_profile))
+    if args.verbose:
+        config.VERBOSE = True
+    if args.cache:
+        config.RESPONSE_CACHE = True
+    if args.no_cache:
+        config.RESPONSE_CACHE = False
+    if args.context:
+        config.RETRIEVAL = True
+    if args.no_context:
+        config.RETRIEVAL = False
+
+    if args.daemon or args.stop_daemon:
+        from src import daemon
+        if args.stop_daemon:
+            print(daemon.stop())
+        else:
+            daemon.serve(build_parser, process_message)
+        return
+
+    from src import transport
+    from src.chatbot import Chatbot
+    from src.display import (
+        display_markdown,
+        display_markdown_stream,
+        show_request_info,
+        show_cache_stats,
+    )
+    from src.utils import copy_content, execute_command
+
+    if args.cache_stats:
+        from src.cache import ResponseCache
+        show_cache_stats(ResponseCache().stats())
+        return
+
+    if args.stats:
+        from src.display import show_stats
+        from src.metrics import load_recent, summarize
+        show_stats(summarize(load_recent()))
+        return
+
+    # Saved sessions
+    store = session_id = None
+    if args.sessions or args.search or args.resume:
+        from src.sessions import SessionStore, bind
+        store = SessionStore()
+    if args.sessions:
+        from src.display import show_sessions
+        show_sessions(store.list_sessions())
+        return
+    if args.search:
+        from src.display import show_search_results
+        show_search_results(store.search(args.search))
+        return
+    if args.resume:
+        if args.resume == "last":
+            session_id = store.latest()
+        elif args.resume.isdigit() and store.exists(int(args.resume)):
+            session_id = int(args.resume)
+        if session_id is None:
+            print(f"❌ Session not found: {args.resume}")
+            return
+
+    # Batch mode
+    if args.batch:
+        from src.batch import run_batch
+        output_path = args.output or f"{os.path.splitext(args.batch)[0]}.results.jsonl"
+        try:
+            completed, failed, skipped = run_batch(
+                args.batch, output_path, args.workers, ordered=args.order == "input"
+            )
+        except FileNotFoundError:
+            print(f"❌ Batch file not found: {args.batch}")
+            return
+        print(f"✓ Batch finished: {completed} completed, {failed} failed, {skipped} skipped (already done)")
+        print(f"Results written to {output_path}")
+        return
 
     # Use either positional content or --content flag
     content = args.content or args.content_flag
+    stream = STREAM_RESPONSES and not args.no_stream
+
+    # Follow mode: analyze a stream of lines in batches
+    if args.follow or args.follow_file:
+        from src.follow import follow_file, follow_stdin
+        request, role_desc = process_message(content or config.FOLLOW_DEFAULT_REQUEST, config.FOLLOW_DEFAULT_ROLE)
+        render = display_markdown_stream if stream else (lambda chunks: display_markdown("".join(chunks)))
+        try:
+            if args.follow_file:
+                follow_file(args.follow_file, request, role_desc, render, stream)
+            else:
+                follow_stdin(request, role_desc, render, stream)
+        except KeyboardInterrupt:
+            print("\nStopped following")
+        return
+
+    profiler = None
+    if args.profile:
+        from src.profiler import TurnProfiler
+        profiler = TurnProfiler()
 
     # Inline mode (content specified)
     if content:
-        # Split content into message and copy commands
-        parts = content.strip().split(" | ")
-        message = parts[0]
-        copy_command = parts[1] if len(parts) > 1 else None
-
-        # Process message to get role and clean message first
-        message, role_desc = process_message(message)
-        role_number = next(key for key, desc in ROLES.items() if desc == role_desc)
-        chatbot = Chatbot(role_desc)
-
-        # Handle file mode
-        if args.file:
-            file_content = chatbot.process_file_input("", args.file)
-            message = f"{message}\n\n{file_content}" if message else file_content
-
-        if message:
-            # Only allow command execution in CLI Assistant role
-            if role_number == "5":
-                # Handle direct command execution with ! prefix
-                if not args.file and message.startswith("!"):
-                    cmd = message[1:].strip()
-                    if cmd.lower() == "help":
-                        result, _ = execute_command("help")
-                    else:
-                        result, success = execute_command(cmd)
-                        if not success:
-                            print("\nTry '!help' for command examples")
-                    print(result)
-                    return
+        with profiler.turn(content) if profiler else nullcontext():
+            # Split content into message and copy commands
+            parts = content.strip().split(" | ")
+            message = parts[0]
+            copy_command = parts[1] if len(parts) > 1 else None
 
-                # Use specialized CLI response method
-                response_text = chatbot.get_cli_response(message, platform.system().lower())
-                
-                if "COMMAND:" in response_text:
-                    parts = response_text.split("COMMAND:")
-                    if len(parts) > 1 and parts[1].strip():
-                        cmd = parts[1].split("\n")[0].strip()
-                        # Remove any OS-specific comments in parentheses
-                        cmd = cmd.split("(")[0].strip()
-                        if confirm_execution(cmd):
-                            result, success = execute_command(cmd)
-                            print(result)
+            # Process message to get role and clean message first
+            message, role_desc = process_message(message)
+            role_number = next(key for key, desc in ROLES.items() if desc == role_desc)
+            chatbot = Chatbot(role_desc)
+            if session_id is not None:
+                bind(chatbot, store, session_id, role_number)
+            if config.RETRIEVAL and role_number in config.RETRIEVAL_ROLES and not args.file:
+                from src.retrieval import index_for
+                chatbot.retriever = index_for(os.getcwd())
+
+            # Handle file mode
+            if args.file:
+                from src.ingest import attach_files
+                message = attach_files(chatbot, message, args.file)
+
+            if message:
+                # Only allow command execution in CLI Assistant role
+                if role_number == "5":
+                    # Handle direct command execution with ! prefix
+                    if not args.file and message.startswith("!"):
+                        cmd = message[1:].strip()
+                        if cmd.lower() == "help":
+                            result, _ = execute_command("help")
+                        else:
+                            result, success = execute_command(cmd, echo=True)
                             if not success:
                                 print("\nTry '!help' for command examples")
-                            return
-            else:
-                # Ignore command-like inputs for non-CLI roles
-                if message.startswith("!"):
-                    print("❌ Command execution is only available in CLI Assistant role (5)")
-                    return
-                
-                # For all other roles, get normal response
-                response_text = chatbot.get_response(message)
+                        print(result)
+                        return
 
-        display_markdown(response_text)
+                    # Suggested commands run here; their output goes back to the model when it asks
+                    from src.agent import run_agent
+                    response_text = run_agent(
+                        chatbot, message, platform.system().lower(), display_markdown, remember=not args.file
+                    )
+                    if response_text:
+                        display_markdown(response_text)
+                    else:
+                        response_text = chatbot.messages[-1]["content"]  # The commands it suggested, for '| cp'
+                else:
+                    # Ignore command-like inputs for non-CLI roles
+                    if message.startswith("!"):
+                        print("❌ Command execution is only available in CLI Assistant role (5)")
+                        return
+                
+                    # For all other roles, get normal response
+                    if stream:
+                        response_text = display_markdown_stream(chatbot.stream_response(message))
+                    else:
+                        response_text = chatbot.get_response(message)
+                        display_markdown(response_text)
+                show_request_info(chatbot.last_request_info)
 
-        # Process copy command if present
-        if copy_command:
-            result = copy_content(response_text, copy_command)
-            print(result)
+            # Process copy command if present
+            if copy_command:
+                result = copy_content(response_text, copy_command)
+                print(result)
         return
 
-    # Interactive chat mode
-    role_number = select_role(ROLES)  # This one clears screen and returns role number
+    # Interactive chat mode (its UI modules are only imported here)
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.key_binding import KeyBindings
+    from src.display import select_role, show_instructions, show_jobs
+    from src.engine import get_engine
+    from src.response import parse as parse_response
+
+    if store is None and config.SESSION_STORE:
+        from src.sessions import SessionStore, bind
+        store = SessionStore()
+
+    transport.prewarm(config.API_URL)  # Connect while the user picks a role
+    role_number = store.last_role(session_id) if session_id is not None else None
+    if role_number not in ROLES:
+        role_number = select_role(ROLES)  # This one clears screen and returns role number
     system_role = ROLES[role_number]  # Get the role description
-    chatbot = Chatbot(system_role)
+    if store and session_id is None:
+        session_id = store.create()
+
+    # One chatbot per role so each role keeps its history across role switches
+    chatbots = {}
+
+    def get_chatbot(number: str) -> Chatbot:
+        if number not in chatbots:
+            chatbots[number] = Chatbot(ROLES[number])
+            if store:
+                bind(chatbots[number], store, session_id, number)
+        if config.RETRIEVAL and number in config.RETRIEVAL_ROLES:
+            from src.retrieval import index_for
+            # Follow the working directory, which '!cd' can change
+            chatbots[number].retriever = index_for(os.getcwd(), chatbots[number].retriever)
+        return chatbots[number]
+
+    chatbot = get_chatbot(role_number)
     show_instructions()
+    if args.resume:
+        print(f"Resumed session {session_id} ({len(chatbot.messages) - 1} messages loaded)\n")
 
     kb = KeyBindings()
     last_response = ""  # Store last response for copy command
@@ -130,11 +385,27 @@ def main():
         event.current_buffer.newline()
 
     session = PromptSession()
+    engine = get_engine()  # Requests run here, so Ctrl+C can cancel them and '&' can background them
+
+    def background_status() -> str:
+        return "Background: " + ", ".join(f"[{job.id}] {job.elapsed():.0f}s" for job in engine.running())
 
     while True:
         try:
+            if profiler:
+                profiler.stop()  # The previous turn ends when the prompt returns
+            for job in engine.jobs.values():
+                if job.done and not job.seen:
+                    job.seen = True
+                    if job.status == "done":
+                        print(f"✓ Background answer [{job.id}] is ready (type 'show {job.id}')")
+
             # Use current directory as prompt for CLI Assistant role
             prompt_text = f"{os.getcwd()}> " if role_number == "5" else "You: "
+            transport.refresh(config.API_URL)  # Reconnect while the user types if the connection went idle
+            # prompt() keeps the previous toolbar when passed None, so set it on the session
+            session.bottom_toolbar = background_status if engine.running() else None
+            session.refresh_interval = 1 if engine.running() else 0
             user_input = session.prompt(
                 prompt_text,
                 multiline=True,
@@ -151,6 +422,53 @@ def main():
             if user_input.lower() == "exit":
                 break
 
+            # Per-turn profiling
+            if user_input.lower() in ("profile", "profile on", "profile off"):
+                if user_input.lower() == "profile on" and profiler is None:
+                    from src.profiler import TurnProfiler
+                    profiler = TurnProfiler()
+                elif user_input.lower() == "profile off" and profiler is not None:
+                    print(f"✓ Profiling off ({profiler.turns} turn(s) in {profiler.directory})")
+                    profiler = None
+                    continue
+                if profiler:
+                    print(f"✓ Profiling each turn into {profiler.directory} (type 'profile off' to stop)")
+                else:
+                    print("Profiling is off (type 'profile on' to profile each turn)")
+                continue
+
+            # Background requests
+            if user_input.lower() == "jobs":
+                show_jobs(engine.jobs.values())
+                continue
+            command, _, job_id = user_input.lower().partition(" ")
+            if command in ("show", "cancel") and (job_id.isdigit() or (command == "cancel" and not job_id)):
+                if command == "cancel" and not job_id:
+                    engine.cancel_all()
+                    print("✓ Cancelled all background requests")
+                    continue
+                job = engine.jobs.get(int(job_id))
+                if job is None:
+                    print(f"❌ No background request [{job_id}]")
+                elif command == "cancel":
+                    job.cancel()
+                    print(f"✓ Cancelled [{job.id}]")
+                else:
+                    job.seen = True
+                    print(f"\nAssistant [{job.id}]:", flush=True)
+                    try:
+                        last_response = display_markdown_stream(job.deltas())
+                    except KeyboardInterrupt:
+                        print(f"\n[{job.id}] is still running (type 'show {job.id}' to follow it again)")
+                    print()
+                continue
+
+            if user_input.lower() == "stats":
+                from src.display import show_stats
+                from src.metrics import load_recent, summarize
+                show_stats(summarize(load_recent()))
+                continue
+
             # Handle copy command
             if user_input.lower() in ["cp"] or user_input.lower().startswith("c-"):
                 if last_response:
@@ -161,57 +479,83 @@ def main():
                     print("❌ No previous response to copy")
                     continue
 
+            # A trailing '&' runs the request in the background
+            background = user_input.endswith("&") and len(user_input) > 1
+            if background:
+                user_input = user_input[:-1].rstrip()
+
             # Process message to get role and clean message
             clean_message, role_desc = process_message(user_input, role_number)
             if role_desc != system_role:
                 system_role = role_desc
                 role_number = next(key for key, desc in ROLES.items() if desc == role_desc)
-                chatbot = Chatbot(system_role)
+            chatbot = get_chatbot(role_number)
             
             # Use clean_message for all further processing
             if clean_message:
                 # Only allow command execution in CLI Assistant role
                 if role_number == "5":
+                    if background:
+                        print("❌ Background requests are not available in CLI Assistant role (5)")
+                        continue
+
                     # Handle direct command execution with ! prefix
                     if clean_message.startswith("!"):
                         cmd = clean_message[1:].strip()
                         if cmd.lower() == "help":
                             result, _ = execute_command("help")
                         else:
-                            result, success = execute_command(cmd)
+                            result, success = execute_command(cmd, echo=True)
                             if not success:
                                 print("\nTry '!help' for command examples")
                         print(result)
                         continue
 
-                    # Use specialized CLI response method
-                    response_text = chatbot.get_cli_response(clean_message, platform.system().lower())
-                    
-                    if "COMMAND:" in response_text:
-                        parts = response_text.split("COMMAND:")
-                        if len(parts) > 1 and parts[1].strip():
-                            cmd = parts[1].split("\n")[0].strip()
-                            # Remove any OS-specific comments in parentheses
-                            cmd = cmd.split("(")[0].strip()
-                            if confirm_execution(cmd):
-                                result, success = execute_command(cmd)
-                                print(result)
-                                if not success:
-                                    print("\nTry '!help' for command examples")
-                                continue
+                    # Suggested commands run here; their output goes back to the model when it asks
+                    from src.agent import run_agent
+                    if profiler:
+                        profiler.start(user_input)  # Only turns that send a request are profiled
+                    response_text = run_agent(chatbot, clean_message, platform.system().lower(), display_markdown)
+                    if not response_text:
+                        continue
                 else:
                     # Ignore command-like inputs for non-CLI roles
                     if clean_message.startswith("!"):
                         print("❌ Command execution is only available in CLI Assistant role (5)")
                         continue
                     
-                    # For all other roles, get normal response
-                    response_text = chatbot.get_response(clean_message)
+                    # For all other roles, get normal response (queued behind this role's background requests)
+                    waiting = [job.id for job in engine.running() if job.chatbot is chatbot]
+                    # A background request outlives its turn, so only foreground ones are profiled
+                    profile = None
+                    if profiler and not background:
+                        profiler.start(user_input)
+                        profile = profiler.current
+                    job = engine.submit(chatbot, clean_message, stream, label=role_number, profile=profile)
+                    if background:
+                        print(f"[{job.id}] Running in the background (type 'jobs' to list, 'show {job.id}' to view)")
+                        continue
+                    job.seen = True
+                    if waiting:
+                        print(f"Waiting for background request(s) {waiting} in this role first...")
+                    try:
+                        if stream:
+                            print("\nAssistant:", flush=True)
+                            last_response = display_markdown_stream(job.deltas())
+                            show_request_info(chatbot.last_request_info)
+                            print()
+                            continue
+                        response_text = job.result()
+                    except KeyboardInterrupt:
+                        job.cancel()  # Closes the connection at once instead of waiting for the answer
+                        print("\n❌ Request cancelled")
+                        continue
     
                 # Display response
                 print("\nAssistant:", flush=True)
-                last_response = response_text
-                display_markdown(response_text)
+                last_response = parse_response(response_text)  # Indexed once for later c-N copies
+                display_markdown(last_response)
+                show_request_info(chatbot.last_request_info)
                 print()
 
         except KeyboardInterrupt:
@@ -219,5 +563,17 @@ def main():
         except EOFError:
             break
 
+    if profiler:
+        profiler.stop()
+        print(f"Profiles of {profiler.turns} turn(s) are in {profiler.directory}")
+    if engine.running():
+        print(f"Cancelling {len(engine.running())} background request(s)")
+        engine.cancel_all()
+    if store and any(len(bot.messages) > 1 for bot in chatbots.values()):
+        print(f"Session {session_id} saved (continue with --resume {session_id})")
+
 if __name__ == "__main__":
-    main()
+    # Inline queries go to a running daemon first, before anything heavy is imported
+    from src.client import forward_to_daemon
+    if not forward_to_daemon(sys.argv[1:]):
+        main()
@@ -0,0 +1,276 @@
+import platform
+import shlex
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+from . import config
+from .utils import (
+    _format_result,
+    captured_output,
+    confirm_execution,
+    execute_and_capture,
+    parse_command,
+    run_command,
+)
+
+if TYPE_CHECKING:
+    from .chatbot import Chatbot
+
+# A line the model adds when it wants to see the output of its commands
+CONTINUE_MARKER = "CONTINUE"
+
+# Shell syntax that could write, chain or substitute; pipes are checked stage by stage
+UNSAFE_SYNTAX = (";", "&", ">", "<", "`", "$(", "\n")
+
+
+def parse_commands(response_text: str) -> List[str]:
+    """Every command in a response, one per 'COMMAND:' line, in order"""
+    commands = []
+    for line in response_text.splitlines():
+        if "COMMAND:" in line:
+            command = parse_command(line)
+            if command and command not in commands:
+                commands.append(command)
+    return commands
+
+
+def wants_output(response_text: str) -> bool:
+    return any(line.strip() == CONTINUE_MARKER for line in response_text.splitlines())
+
+
+def _prose(response_text: str) -> str:
+    """The response without its COMMAND: and CONTINUE lines"""
+    lines = [
+        line for line in response_text.splitlines()
+        if "COMMAND:" not in line and line.strip() != CONTINUE_MARKER
+    ]
+    return "\n".join(lines).strip()
+
+
+def _argument_allowed(arg: str, rule: tuple) -> bool:
+    short, long, arguments = rule
+    if arg.startswith("-") or arg.startswith("/"):
+        name = arg.split("=")[0] if arg.startswith("-") else arg.split(":")[0]
+        if (long == "*" and arg.startswith("-")) or (long != "*" and name.lower() in long):
+            return True
+        if arg.startswith("--"):
+            return False
+        if arg.startswith("-") and len(arg) > 1:
+            # Short options may be combined (ls -la) or carry a value (tail -n5)
+            return short == "*" or all(c in short or c.isdigit() or c in ",." for c in arg[1:])
+    if arguments is True or arguments is False:
+        return arguments
+    return arg.startswith(arguments)
+
+
+def is_read_only(command: str) -> bool:
+    """Whether a command only reads, so it can run without confirmation.
+
+    Every stage of a pipeline must be a program in config.READ_ONLY_COMMANDS,
+    given only the options and arguments its rule allows (and a read-only
+    subcommand where config.READ_ONLY_SUBCOMMANDS lists them). Redirection,
+    chaining and command substitution always need confirmation.
+    """
+    if any(token in command for token in UNSAFE_SYNTAX):
+        return False
+    for stage in command.split("|"):
+        try:
+            args = shlex.split(stage)
+        except ValueError:
+            return False
+        if not args:
+            return False
+        program, options = args[0], args[1:]
+        name = program
+        subcommands = config.READ_ONLY_SUBCOMMANDS.get(program)
+        if subcommands is not None:
+            subcommand = next((arg for arg in options if not arg.startswith("-")), None)
+            if subcommand not in subcommands:
+                return False
+            options.remove(subcommand)
+            name = f"{program} {subcommand}"
+        rule = config.READ_ONLY_COMMANDS.get(name) or config.READ_ONLY_COMMANDS.get(program)
+        if rule is None:
+            return False
+        if not all(_argument_allowed(arg, rule) for arg in options):
+            return False
+        required = config.READ_ONLY_REQUIRED_OPTIONS.get(name, ())
+        if not all(option in options for option in required):
+            return False
+    return True
+
+
+def _shell_args(command: str, os_type: str) -> list:
+    if os_type == "windows":
+        return ["cmd", "/c", command]
+    return ["/bin/sh", "-c", command]
+
+
+def _clip(output: str, limit: int) -> str:
+    """Keep the beginning and the end of long output, where errors and totals usually are"""
+    if len(output) <= limit:
+        return output
+    head = limit * 2 // 3
+    tail = limit - head
+    return f"{output[:head]}\n[... {len(output) - limit} characters omitted ...]\n{output[-tail:]}"
+
+
+def _outcome(result: tuple) -> str:
+    code, _, _, status = result
+    if status == "timeout":
+        return f"timed out after {config.AGENT_COMMAND_TIMEOUT} seconds"
+    if status == "cancelled":
+        return "cancelled"
+    return f"exit code {code}"
+
+
+def _shell_environment(os_type: str) -> Optional[dict]:
+    """What the persistent shell has exported, so read-only commands see what confirmed ones set"""
+    if not config.PERSISTENT_SHELL or os_type == "windows":
+        return None
+    from .shell import get_shell
+    return get_shell().environment()
+
+
+def run_read_only(commands: List[str], os_type: str) -> List[Dict]:
+    """Run read-only commands side by side and print their results in order.
+
+    They run in subprocesses of their own, not in the persistent shell (which
+    runs one command at a time), with its working directory and exported
+    variables; its aliases and functions do not apply.
+    """
+    env = _shell_environment(os_type)
+    if len(commands) > 1:
+        print(f"\nRunning {len(commands)} read-only commands at once: {', '.join(commands)}")
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=min(len(commands), config.AGENT_MAX_PARALLEL)) as pool:
+        futures = [
+            pool.submit(run_command, _shell_args(command, os_type), config.AGENT_COMMAND_TIMEOUT, False, stop, env)
+            for command in commands
+        ]
+        try:
+            for future in futures:
+                future.exception()  # Waits; Ctrl+C lands here, in the main thread
+        except KeyboardInterrupt:
+            stop.set()  # Every running command is stopped; queued ones return at once
+            for future in futures:
+                future.exception()
+            print("❌ Commands cancelled")
+            raise
+
+    results = []
+    for command, future in zip(commands, futures):
+        try:
+            result = future.result()
+        except OSError as e:
+            result = (None, "", str(e), "exited")
+        if result[3] == "timeout":
+            message, success = f"❌ Command timed out after {config.AGENT_COMMAND_TIMEOUT} seconds", False
+        else:
+            message, success = _format_result(result, os_type, echo=False)
+        print(f"\n$ {command}\n{message}")
+        results.append({
+            "command": command,
+            "outcome": _outcome(result),
+            "output": captured_output(result),
+            "success": success,
+            "ran": True,
+        })
+    return results
+
+
+def run_confirmed(command: str) -> Dict:
+    """Run a command that may change the system, once the user confirms it"""
+    if not confirm_execution(command):
+        return {"command": command, "outcome": "declined by the user", "output": "", "success": False, "ran": False}
+    message, success, output = execute_and_capture(command, echo=True)
+    print(message)
+    return {
+        "command": command,
+        "outcome": "succeeded" if success else message.split("\n")[0].lstrip("❌ "),
+        "output": output,
+        "success": success,
+        "ran": True,
+    }
+
+
+def run_commands(commands: List[str], os_type: str) -> List[Dict]:
+    """Run commands in the order given.
+
+    Consecutive read-only commands run together on a worker pool; any other
+    command waits for everything before it and is confirmed on its own, so a
+    later read (ls after mkdir) always sees an earlier change.
+    """
+    results = []
+    for read_only, group in groupby(commands, key=is_read_only):
+        group = list(group)
+        if read_only:
+            results.extend(run_read_only(group, os_type))
+        else:
+            results.extend(run_confirmed(command) for command in group)
+    return results
+
+
+def follow_up(results: List[Dict]) -> str:
+    """The message that returns command output to the model"""
+    sections = []
+    for result in results:
+        section = f"$ {result['command']}\n({result['outcome']})"
+        output = result["output"].strip()
+        if output:
+            section += f"\n```text\n{_clip(output, config.AGENT_OUTPUT_MAX_CHARS)}\n```"
+        sections.append(section)
+    return (
+        "Output of the commands:\n\n" + "\n\n".join(sections) + "\n\n"
+        f"Continue the task: reply with more COMMAND: lines (and {CONTINUE_MARKER}) if you need them, "
+        "or with your answer."
+    )
+
+
+def run_agent(
+    chatbot: "Chatbot",
+    message: str,
+    os_type: Optional[str] = None,
+    show: Callable[[str], None] = print,
+    response_text: Optional[str] = None,
+    remember: bool = True,
+) -> str:
+    """Answer a CLI Assistant request, running the commands the model suggests.
+
+    When the model asks for their output (a CONTINUE line), it goes back in
+    one follow-up request, up to config.AGENT_MAX_STEPS times. response_text
+    is the answer to message when it was already requested (by the daemon).
+    Returns the text still to display, or "" when running the commands was
+    the answer.
+    """
+    os_type = os_type or platform.system().lower()
+    if response_text is None:
+        response_text = chatbot.get_cli_response(message, os_type)
+
+    for step in range(config.AGENT_MAX_STEPS + 1):
+        commands = parse_commands(response_text)
+        if not commands or response_text.startswith("\nError:"):
+            return response_text
+        prose = _prose(response_text)
+        if prose:
+            show(prose)
+
+        results = run_commands(commands, os_type)
+        if not any(result["ran"] for result in results):
+            return "" if prose else response_text  # Everything was declined; the suggestion stays visible
+        # Only a one-shot answer can stand in for the model; a CONTINUE round is half a diagnosis
+        one_shot = not wants_output(response_text)
+        if step == 0 and remember and one_shot and len(results) == 1 and results[0]["success"]:
+            from .intents import get_resolver
+            get_resolver().remember(message, commands[0], os_type)
+
+        if one_shot:
+            if not results[-1]["success"] and results[-1]["ran"]:
+                print("\nTry '!help' for command examples")
+            return ""
+        if step == config.AGENT_MAX_STEPS:
+            print(f"\n❌ Stopped after {config.AGENT_MAX_STEPS} follow-up requests")
+            return ""
+        response_text = chatbot.get_response(follow_up(results))
+    return response_text
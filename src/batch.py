@@ -0,0 +1,143 @@
+import json
+import os
+import platform
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterator, Optional, Set
+from . import config
+from .chatbot import Chatbot
+from .ingest import attach_files
+
+
+def _read_jobs(input_path: str) -> Iterator[tuple[int, Dict]]:
+    """Yield (line number, job) for each non-empty line of the input file"""
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                job = {"error": f"Invalid JSON: {str(e)}"}
+            yield line_number, job
+
+
+def _completed_lines(output_path: str) -> Set[int]:
+    """Line numbers already written by a previous run (for resume)"""
+    done = set()
+    try:
+        with open(output_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by a crash is simply run again
+                if "line" in record and "error" not in record:
+                    done.add(record["line"])  # Failed lines are retried
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def run_job(line_number: int, job: Dict) -> Dict:
+    """Run one batch line with its own Chatbot history"""
+    if "error" in job:
+        return {"line": line_number, "error": job["error"]}
+    record = {"line": line_number, "role": str(job.get("role", config.DEFAULT_INLINE_ROLE))}
+    if "id" in job:
+        record["id"] = job["id"]
+
+    role = record["role"]
+    if role not in config.ROLES:
+        record["error"] = f"Unknown role: {role}"
+        return record
+
+    chatbot = Chatbot(config.ROLES[role])
+    message = job.get("message", "")
+    if job.get("file"):
+        files = job["file"] if isinstance(job["file"], list) else [job["file"]]
+        message = attach_files(chatbot, message, files, progress=lambda _: None)
+    if not message:
+        record["error"] = "Empty message"
+        return record
+
+    # Commands are never executed in batch mode; role 5 only suggests them
+    if role == "5":
+        response_text = chatbot.get_cli_response(message, platform.system().lower())
+    else:
+        response_text = chatbot.get_response(message)
+
+    if response_text.startswith("\nError:"):
+        record["error"] = response_text.strip()
+    else:
+        record["response"] = response_text
+    return record
+
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    workers: Optional[int] = None,
+    ordered: bool = True,
+) -> tuple[int, int, int]:
+    """Run a JSONL file of prompts on a bounded worker pool.
+
+    Each input line is {"role": "1", "message": "...", "file": "optional"}; "file"
+    may also be a list of files, directories or globs.
+    Results are appended to output_path as JSONL, in input order or as they
+    complete. Lines already answered in output_path are skipped, so a crashed
+    run can be resumed. Returns (completed, failed, skipped).
+    """
+    workers = workers or config.BATCH_WORKERS
+    done = _completed_lines(output_path)
+    completed = failed = skipped = 0
+
+    # Ordered output holds finished records until every earlier line is written
+    pending: Dict[int, Dict] = {}
+    order = deque()
+    futures = {}
+    limit = workers * 4  # Jobs in flight or waiting to be written
+
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+
+        def write(record: Dict):
+            nonlocal completed, failed
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()  # Flushed per line so a crash loses at most the lines in flight
+            if "error" in record:
+                failed += 1
+            else:
+                completed += 1
+
+        def drain():
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                line_number = futures.pop(future)
+                try:
+                    record = future.result()
+                except Exception as e:
+                    record = {"line": line_number, "error": str(e)}
+                if ordered:
+                    pending[line_number] = record
+                else:
+                    write(record)
+            while ordered and order and order[0] in pending:
+                write(pending.pop(order.popleft()))
+
+        # Jobs are submitted lazily so large inputs are never fully in memory
+        for line_number, job in _read_jobs(input_path):
+            if line_number in done:
+                skipped += 1
+                continue
+            order.append(line_number)
+            futures[pool.submit(run_job, line_number, job)] = line_number
+            while len(futures) + len(pending) >= limit:
+                drain()
+        while futures:
+            drain()
+
+    return completed, failed, skipped
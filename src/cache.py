@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from . import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    latency REAL NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+def cache_key(payload: Dict, messages_digest: Optional[str] = None) -> str:
+    """Hash of everything that determines the answer: model, sampling and messages.
+
+    messages_digest (from payload.BodyEncoder.digest) saves re-encoding a long history.
+    """
+    if messages_digest is None:
+        from .payload import BodyEncoder
+        messages_digest = BodyEncoder().digest(payload["messages"])
+    material = json.dumps(
+        {
+            "model": payload["model"],
+            "temperature": payload["temperature"],
+            "max_tokens": payload["max_tokens"],
+            "messages": messages_digest,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite response cache with a TTL and LRU eviction by entry count and size.
+
+    Cache problems (locked or read-only database) are treated as misses so they
+    never break a request.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(config.CACHE_DIR, "responses.sqlite")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open the database for one transaction (safe across threads and processes)"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            conn.executescript(SCHEMA)
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection, name: str, amount: float = 1):
+        conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def get(self, key: str) -> Optional[tuple[str, float]]:
+        """Return (response, original latency in seconds) or None on a miss"""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT response, latency FROM responses WHERE key = ? AND created_at > ?",
+                    (key, now - config.CACHE_TTL),
+                ).fetchone()
+                if row is None:
+                    self._bump(conn, "misses")
+                    return None
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                self._bump(conn, "hits")
+                self._bump(conn, "saved_seconds", row[1])
+                return row[0], row[1]
+        except sqlite3.Error:
+            return None
+
+    def put(self, key: str, response: str, latency: float):
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, response, len(response.encode("utf-8")), latency, now, now),
+                )
+                self._evict(conn, now)
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def _evict(conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then least recently used ones over the limits"""
+        conn.execute("DELETE FROM responses WHERE created_at <= ?", (now - config.CACHE_TTL,))
+        count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= config.CACHE_MAX_ENTRIES and size <= config.CACHE_MAX_BYTES:
+            return
+        for key, entry_size in conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access"
+        ).fetchall():
+            if count <= config.CACHE_MAX_ENTRIES and size <= config.CACHE_MAX_BYTES:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            count -= 1
+            size -= entry_size
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and the current cache size"""
+        try:
+            with self._connect() as conn:
+                stats = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+                count, size = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()
+        except sqlite3.Error:
+            stats, count, size = {}, 0, 0
+        return {
+            "hits": int(stats.get("hits", 0)),
+            "misses": int(stats.get("misses", 0)),
+            "saved_seconds": stats.get("saved_seconds", 0.0),
+            "entries": count,
+            "bytes": size,
+        }
@@ -1,57 +1,153 @@
 import json
-import requests
-from typing import Generator, Dict
-from . import config
+import threading
+import time
+from typing import TYPE_CHECKING, Generator, Dict, List, Optional, Set
+from . import config, transport
+from .history import ConversationHistory
+from .payload import BodyEncoder
+from .ratelimit import RateLimitError, send_with_retry
+
+if TYPE_CHECKING:
+    import requests
+    from .hedge import Attempt
+
+
+class RequestCancelled(Exception):
+    """Raised inside a request that Chatbot.cancel() stopped"""
 
 
 class Chatbot:
     def __init__(self, system_role: str):
-        self.messages = [{"role": "system", "content": system_role}]
-        self.headers = {
+        self.history = ConversationHistory(system_role)
+        self.last_request_info = {}  # Details about the most recent request
+        self.retriever = None  # Optional CodeIndex that adds relevant snippets to each request
+        self.model = config.MODEL  # Model of the latest request (chosen per turn when routing is on)
+        self._connection_timings: Dict[str, float] = {}  # DNS/connect/TLS of the last request
+        self._responses: Set["requests.Response"] = set()  # In flight, for cancel()
+        self._hedge: Dict = {}  # Hedging outcome of the last request
+        self._encoder = BodyEncoder()  # Keeps the already-sent part of the history encoded
+        self._cancelled = threading.Event()
+        self.cache = None
+        if config.RESPONSE_CACHE:
+            from .cache import ResponseCache
+            self.cache = ResponseCache()
+
+    @property
+    def messages(self) -> List[Dict]:
+        return self.history.messages
+
+    @property
+    def headers(self) -> Dict:
+        # Built per request so paths that never call the API do not need the key
+        return {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {config.GROQ_API_KEY}",
         }
 
-    def _prepare_payload(self, content: str) -> Dict:
-        self.messages.append({"role": "user", "content": content})
+    def _prepare_payload(self, content: str, stream: bool = False) -> Dict:
+        self.history.append("user", content)
+        messages = self.messages
+        if self.retriever:
+            # Snippets go into this request only, so history does not grow with them
+            context = self.retriever.context_for(content)
+            if context:
+                messages = messages[:-1] + [{"role": "user", "content": f"{context}\n\n{content}"}]
+        self.model = self._route(content)
         return {
-            "model": config.MODEL,
+            "model": self.model,
             "temperature": config.TEMPERATURE,
             "max_tokens": config.MAX_TOKENS,
-            "stream": False,  # Streaming disabled by default
-            "messages": self.messages,
+            "stream": stream,
+            "messages": messages,
         }
 
-    def process_file_input(self, content: str, file_path: str) -> str:
-        if not file_path:
-            return content
+    def _route(self, content: str) -> str:
+        """Model for this turn: a small one for simple turns, avoiding degraded models"""
+        if not config.ROUTING:
+            return config.MODEL
+        from .metrics import role_of
+        from .router import get_router
 
-        try:
-            # Read file in chunks to handle large files safely
-            with open(file_path, "r", encoding="utf-8") as f:
-                chunks = []
-                while chunk := f.read(8192):  # 8KB chunks
-                    chunks.append(chunk)
-                    if len("".join(chunks)) > 1_000_000:  # 1MB limit
-                        raise ValueError("File too large (max 1MB)")
-                file_content = "".join(chunks)
-                
-            file_ext = file_path.split(".")[-1].lower()
-            return f"{content}\n```{file_ext}\n{file_content}\n```"
-            
-        except UnicodeDecodeError:
-            return f"{content}\n(Error: File appears to be binary)"
-        except FileNotFoundError:
-            return f"{content}\n(Error: File not found: {file_path})"
-        except PermissionError:
-            return f"{content}\n(Error: Permission denied accessing {file_path})"
-        except ValueError as e:
-            return f"{content}\n(Error: {str(e)})"
-        except Exception as e:
-            return f"{content}\n(Error reading file: {str(e)})"
+        model, _ = get_router().choose(role_of(self.messages[0]["content"]), content, self.history.total_tokens)
+        return model
+
+    def _observe(self, latency: float, error: Optional[Exception], stream: bool):
+        """Report a request's outcome to the router (which steers traffic away from failing
+        models) and to the hedge deadlines"""
+        if isinstance(error, RequestCancelled):
+            return
+        status = getattr(getattr(error, "response", None), "status_code", None)
+        if status is not None and status < 500 and status != 429:
+            return  # The request was at fault, not the model
+        if config.ROUTING:
+            from .router import get_router
+            # The latency budgets are for the first token: a whole non-streamed answer
+            # (role 5, batch, map-reduce) only counts towards the error rate
+            get_router().observe(self.model, latency if error is None and stream else None, error is not None)
+        if config.HEDGING and error is None and not self._hedge.get("hedged"):
+            from .hedge import get_tracker
+            get_tracker().observe(self.model, stream, latency)
+
+    @staticmethod
+    def _iter_stream(response: "requests.Response", usage: Dict) -> Generator[str, None, None]:
+        """Yield content deltas from a server-sent events response.
+
+        Token usage sent with the final chunk is copied into usage.
+        """
+        for line in response.iter_lines():
+            line = line.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue  # Skip keep-alives and comments
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                continue  # Read to the end so the connection goes back to the pool
+            chunk = json.loads(data)
+            if "error" in chunk:
+                raise ValueError(chunk["error"].get("message", "Stream error"))
+            # Groq reports usage in x_groq; OpenAI-style servers in usage
+            usage.update(chunk.get("usage") or chunk.get("x_groq", {}).get("usage") or {})
+            choices = chunk.get("choices") or []
+            if choices:
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
+    @staticmethod
+    def _error_message(error: Exception) -> str:
+        """Map a request exception to a user-facing error message"""
+        import requests
+
+        if isinstance(error, RequestCancelled):
+            return "\nError: Request cancelled"
+        if isinstance(error, RateLimitError):
+            return f"\nError: {str(error)}"
+        if isinstance(error, requests.Timeout):
+            return "\nError: Request timed out. Please try again."
+        if isinstance(error, requests.ConnectionError):
+            return "\nError: Connection failed. Please check your internet connection."
+        if isinstance(error, requests.HTTPError):
+            if error.response.status_code == 401:
+                return "\nError: Invalid API key"
+            if error.response.status_code == 429:
+                return "\nError: Rate limit exceeded. Please try again later."
+            return f"\nError: HTTP {error.response.status_code} - {error.response.text}"
+        return f"\nError: {str(error)}"
 
     def get_cli_response(self, content: str, os_type: str) -> str:
         """Special method for CLI Assistant role that checks for commands"""
+        # Known requests are answered locally without a round trip
+        if config.INTENT_RESOLVER:
+            from .intents import get_resolver
+
+            resolved = get_resolver().resolve(content, os_type, config.INTENT_MIN_CONFIDENCE)
+            if resolved and resolved[1] >= config.INTENT_MIN_CONFIDENCE:
+                command, confidence = resolved
+                response_text = f"COMMAND: {command}"
+                self.history.append("user", content)
+                self.history.append("assistant", response_text)
+                self._set_request_info(local_intent=True, intent_confidence=confidence)
+                return response_text
+
         # Check if the content appears to be asking for a command
         command_indicators = [
             "how to", "làm sao", "làm thế nào",  # How to indicators
@@ -85,36 +181,247 @@ class Chatbot:
             
         return self.get_response(modified_content)
 
+    def _set_request_info(self, **info):
+        self.last_request_info = {
+            "history_tokens": self.history.total_tokens,
+            "evicted_turns": self.history.evicted_turns,
+            **info,
+        }
+
+    def _post(self, payload: Dict, cancelled: Optional[threading.Event] = None) -> tuple["requests.Response", bool]:
+        """Send payload through the shared rate limiter, retrying transient failures.
+
+        Returns (response, connection_reused) for the last attempt. Connection
+        setup times of that attempt are kept for the request's metrics.
+        cancelled stops this copy alone (a hedged request has two).
+        """
+        reused = False
+
+        def stopped() -> bool:
+            return self._cancelled.is_set() or (cancelled is not None and cancelled.is_set())
+
+        def send() -> "requests.Response":
+            nonlocal reused
+            if stopped():
+                raise RequestCancelled()  # Do not retry a cancelled request
+            response, reused = self._send(config.API_URL, self.headers, payload)
+            self._connection_timings = transport.connection_timings(response)
+            if stopped():
+                transport.abort(response)  # Cancelled while waiting for the headers
+                raise RequestCancelled()
+            return response
+
+        self._connection_timings = {}
+        response = send_with_retry(send, self.history.total_tokens)
+        return response, reused
+
+    def _send(self, url: str, headers: Dict, payload: Dict) -> tuple["requests.Response", bool]:
+        """POST payload once, gzip-compressed if enabled and url has not refused it"""
+        compress = config.COMPRESS_REQUESTS and transport.accepts_compression(url)
+        body, encoding = self._encoder.encode(payload, compress)
+        if encoding:
+            headers = {**headers, "Content-Encoding": encoding}
+        response, reused = transport.post(url, headers=headers, data=body, timeout=config.REQUEST_TIMEOUT)
+        self._responses.add(response)
+        if encoding and response.status_code in (400, 415):
+            # Possibly refused because of the encoding: try once more without it
+            response.close()
+            body, _ = self._encoder.encode(payload)
+            headers = {key: value for key, value in headers.items() if key != "Content-Encoding"}
+            response, reused = transport.post(url, headers=headers, data=body, timeout=config.REQUEST_TIMEOUT)
+            self._responses.add(response)
+            if response.status_code < 400:
+                transport.refuse_compression(url)
+        return response, reused
+
+    def _post_backup(self, target: Dict, payload: Dict, cancelled: threading.Event) -> tuple["requests.Response", bool]:
+        """Send the hedge copy of a request to target, once (it only matters if it is fast)"""
+        from .hedge import target_headers
+
+        response, reused = self._send(target.get("url", config.API_URL), target_headers(target), payload)
+        if cancelled.is_set() or self._cancelled.is_set():
+            transport.abort(response)
+            raise RequestCancelled()
+        return response, reused
+
+    def _open(self, payload: Dict, stream: bool) -> "Attempt":
+        """Send payload and wait until its answer starts, hedging slow requests when enabled.
+
+        The returned attempt's error is set if the request failed.
+        """
+        from .hedge import Attempt, backup_for, get_tracker, race
+
+        primary = Attempt(self.model, lambda cancelled: self._post(payload, cancelled), stream)
+        target = backup_for(self.model) if config.HEDGING else None
+        if target is None:
+            primary.run()
+            self._hedge = {}
+            return primary
+
+        backup_payload = {**payload, "model": target["model"]}
+        backup = Attempt(
+            target["model"], lambda cancelled: self._post_backup(target, backup_payload, cancelled), stream
+        )
+        winner, self._hedge = race(primary, backup, get_tracker().deadline(self.model, stream))
+        if winner is backup:
+            self.model = backup.model
+            self._connection_timings = {}  # Those recorded were the primary's
+        return winner
+
+    def cancel(self):
+        """Stop the request in flight (or the next one, if none has started), from any thread.
+
+        Its connection is closed at once, even mid-stream, and its answer is
+        not added to history.
+        """
+        self._cancelled.set()
+        for response in list(self._responses):
+            transport.abort(response)
+
+    def _finished(self, error: Exception) -> Exception:
+        """The exception to report for a failed request (RequestCancelled if it was cancelled)"""
+        return RequestCancelled() if self._cancelled.is_set() else error
+
+    def _record_metrics(
+        self,
+        start: float,
+        response: Optional["requests.Response"] = None,
+        usage: Optional[Dict] = None,
+        ttft: Optional[float] = None,
+        error: Optional[Exception] = None,
+        stream: bool = False,
+    ):
+        """Log timings and token counts for one request (see metrics.py)"""
+        total = time.monotonic() - start
+        if response is not None or error is not None:  # Cache hits say nothing about the model
+            self._observe(ttft or total, error, stream)
+        if not config.METRICS:
+            return
+        from . import metrics
+
+        usage = usage or {}
+        timings = self._connection_timings if response is not None else {}
+        entry = {
+            "role": metrics.role_of(self.messages[0]["content"]),
+            "model": self.model,
+            "stream": stream,
+            "cache_hit": response is None and error is None,
+            "connection_reused": self.last_request_info.get("connection_reused") if response is not None else None,
+            "total": round(total, 4),
+            "ttfb": round(response.elapsed.total_seconds(), 4) if response is not None else None,
+            "ttft": round(ttft, 4) if ttft is not None else None,
+            **{phase: round(seconds, 4) for phase, seconds in timings.items()},
+            **(self._hedge if response is not None else {}),
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "completion_tokens": usage.get("completion_tokens"),
+        }
+        # Server-side generation time when Groq reports it, otherwise time after the first byte
+        generation = usage.get("completion_time") or (total - (ttft or entry["ttfb"] or 0))
+        if entry["completion_tokens"] and generation > 0:
+            entry["tokens_per_second"] = round(entry["completion_tokens"] / generation, 1)
+        if error is not None:
+            status = getattr(getattr(error, "response", None), "status_code", None)
+            entry["error"] = f"HTTP {status}" if status else type(error).__name__
+        metrics.record(entry)
+
+    def _cache_lookup(self, payload: Dict) -> tuple[Optional[str], Optional[str]]:
+        """Return (cache key, cached answer). The answer is None on a miss"""
+        if not self.cache:
+            return None, None
+        from .cache import cache_key
+
+        key = cache_key(payload, self._encoder.digest(payload["messages"]))
+        cached = self.cache.get(key)
+        if cached is None:
+            return key, None
+        response_content, saved = cached
+        self.history.append("assistant", response_content)
+        self._set_request_info(cache_hit=True, saved_seconds=saved)
+        return key, response_content
+
     def get_response(self, content: str) -> str:
         """Get a normal response without command checking"""
+        start = time.monotonic()
+        response = None
         try:
             payload = self._prepare_payload(content)
+            key, cached = self._cache_lookup(payload)
+            if cached is not None:
+                self._record_metrics(start)
+                return cached
             
             # Make request with timeout
-            response = requests.post(
-                config.API_URL,
-                headers=self.headers,
-                json=payload,
-                timeout=30  # 30 second timeout
+            start = time.monotonic()
+            attempt = self._open(payload, stream=False)
+            response = attempt.response
+            self._set_request_info(
+                connection_reused=attempt.reused, cache_hit=False if key else None, model=self.model, **self._hedge
             )
-            response.raise_for_status()
+            if attempt.error is not None:
+                raise attempt.error
 
-            response_content = response.json()["choices"][0]["message"]["content"]
-            self.messages.append({"role": "assistant", "content": response_content})
+            data = attempt.data
+            response_content = data["choices"][0]["message"]["content"]
+            if self._cancelled.is_set():
+                raise RequestCancelled()
+            self.history.append("assistant", response_content)
+            if key:
+                self.cache.put(key, response_content, time.monotonic() - start)
+            self._record_metrics(start, response, data.get("usage") or data.get("x_groq", {}).get("usage"))
             return response_content
 
-        except requests.Timeout:
-            error_msg = "\nError: Request timed out. Please try again."
-        except requests.ConnectionError:
-            error_msg = "\nError: Connection failed. Please check your internet connection."
-        except requests.HTTPError as e:
-            if e.response.status_code == 401:
-                error_msg = "\nError: Invalid API key"
-            elif e.response.status_code == 429:
-                error_msg = "\nError: Rate limit exceeded. Please try again later."
-            else:
-                error_msg = f"\nError: HTTP {e.response.status_code} - {e.response.text}"
         except Exception as e:
-            error_msg = f"\nError: {str(e)}"
-        
-        return error_msg
+            e = self._finished(e)
+            self._record_metrics(start, response, error=e)
+            return self._error_message(e)
+        finally:
+            self._responses.clear()
+            self._cancelled.clear()
+
+    def stream_response(self, content: str) -> Generator[str, None, None]:
+        """Stream a response as text chunks; the full text is kept in history"""
+        parts = []
+        start = time.monotonic()
+        response = None
+        try:
+            payload = self._prepare_payload(content, stream=True)
+            key, cached = self._cache_lookup(payload)
+            if cached is not None:
+                self._record_metrics(start, stream=True)
+                yield cached
+                return
+
+            # The timeout applies to connecting and to each read between chunks
+            start = time.monotonic()
+            attempt = self._open(payload, stream=True)
+            response = attempt.response
+            self._set_request_info(
+                connection_reused=attempt.reused, cache_hit=False if key else None, model=self.model, **self._hedge
+            )
+            if attempt.error is not None:
+                if response is not None:
+                    response.close()
+                raise attempt.error
+            with response:
+                for delta in attempt.deltas:
+                    parts.append(delta)
+                    yield delta
+            usage = attempt.usage
+            ttft = attempt.first_token - start
+
+            if self._cancelled.is_set():
+                raise RequestCancelled()
+            response_content = "".join(parts)
+            self.history.append("assistant", response_content)
+            if key:
+                self.cache.put(key, response_content, time.monotonic() - start)
+            self._record_metrics(start, response, usage, ttft=ttft, stream=True)
+
+        except Exception as e:
+            e = self._finished(e)
+            self._record_metrics(start, response, error=e, stream=True)
+            if not isinstance(e, RequestCancelled):
+                yield self._error_message(e)
+        finally:
+            self._responses.clear()
+            self._cancelled.clear()
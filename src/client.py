@@ -0,0 +1,102 @@
+import json
+import os
+import platform
+import shutil
+import socket
+import sys
+from typing import List, Optional
+from . import config
+
+# Options that need a full local process (or start the daemon itself)
+LOCAL_OPTIONS = {
+    "--daemon", "--stop-daemon", "--no-daemon", "--batch", "--cache-stats",
+    "--startup-profile", "--verbose", "--resume", "--sessions", "--search", "--stats",
+    "--follow", "--follow-file", "--profile", "-h", "--help",
+}
+
+
+def _color_system() -> Optional[str]:
+    if not sys.stdout.isatty():
+        return None
+    if os.getenv("COLORTERM") in ("truecolor", "24bit"):
+        return "truecolor"
+    return "256"
+
+
+def forward_to_daemon(argv: List[str]) -> bool:
+    """Send an inline query to a running daemon and print its answer.
+
+    Returns False when there is no daemon or it cannot handle the query,
+    in which case the caller runs the query itself. Only the standard library
+    is imported here so forwarding starts as fast as the interpreter does.
+    """
+    if not argv or any(arg.split("=")[0] in LOCAL_OPTIONS for arg in argv):
+        return False
+    if not hasattr(socket, "AF_UNIX") or os.getenv("CHATBOT_NO_DAEMON") == "1":
+        return False
+    if not os.path.exists(config.DAEMON_SOCKET):
+        return False
+
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(config.DAEMON_SOCKET)
+    except OSError:
+        return False  # Stale socket; the daemon is not running
+
+    request = {
+        "argv": argv,
+        "cwd": os.getcwd(),
+        "width": shutil.get_terminal_size().columns,
+        "color_system": _color_system(),
+        "os_type": platform.system().lower(),
+    }
+    with sock, sock.makefile("r", encoding="utf-8") as replies:
+        sock.sendall((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+        final = None
+        printed = False
+        for line in replies:
+            message = json.loads(line)
+            if message.get("fallback"):
+                return False
+            if "output" in message:
+                sys.stdout.write(message["output"])
+                sys.stdout.flush()
+                printed = True
+            if message.get("done"):
+                final = message
+                break
+
+    if final is None:
+        print("\nError: The daemon closed the connection")
+        return True
+
+    response_text = final["text"]
+    if "rendered" in final:
+        # CLI Assistant answers may suggest commands to run here; any follow-up
+        # requests they need are made from this process, which has their output
+        from .agent import parse_commands
+
+        if parse_commands(response_text) and not response_text.startswith("\nError:"):
+            from .agent import run_agent
+            from .chatbot import Chatbot
+            from .display import display_markdown
+
+            chatbot = Chatbot(config.ROLES["5"])
+            chatbot.history.append("user", final.get("prompt") or final.get("message") or "")
+            chatbot.history.append("assistant", response_text)
+            answer = run_agent(
+                chatbot, final.get("message") or "", request["os_type"], display_markdown,
+                response_text=response_text, remember=bool(final.get("message")),
+            )
+            if answer:
+                display_markdown(answer)
+                response_text = answer  # What '| cp' copies
+        else:
+            sys.stdout.write(final["rendered"])
+    elif not printed:
+        print(response_text)  # Errors raised before any output
+
+    if final.get("copy"):
+        from .utils import copy_content
+        print(copy_content(response_text, final["copy"]))
+    return True
@@ -1,18 +1,34 @@
 import os
 import sys
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
 
-# API Configuration
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-if not GROQ_API_KEY:
-    print("Error: GROQ_API_KEY environment variable is not set")
-    print("Please set it in your .env file or environment variables")
-    sys.exit(1)
+def _load_api_key() -> str:
+    """Read GROQ_API_KEY, loading the .env file only if the environment lacks it"""
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        # Load environment variables from .env file
+        from dotenv import load_dotenv
+        load_dotenv()
+        api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        print("Error: GROQ_API_KEY environment variable is not set")
+        print("Please set it in your .env file or environment variables")
+        sys.exit(1)
+    return api_key
+
+
+def __getattr__(name: str):
+    # GROQ_API_KEY is resolved on first use so paths that never call the API
+    # (local commands, cache stats) start without reading .env
+    if name == "GROQ_API_KEY":
+        globals()[name] = _load_api_key()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-API_URL = "https://api.groq.com/openai/v1/chat/completions"
+
+# API Configuration
+# GROQ_API_URL points the client at another OpenAI-compatible server (e.g. benchmarks/mock_groq.py)
+API_URL = os.getenv("GROQ_API_URL") or "https://api.groq.com/openai/v1/chat/completions"
 MODEL = "llama-3.3-70b-versatile"
 
 # Model Parameters
@@ -21,6 +37,260 @@ MAX_TOKENS = 8192
 
 # Request Configuration
 REQUEST_TIMEOUT = 30  # seconds
+STREAM_RESPONSES = True  # Show answers token by token (disable with --no-stream)
+
+# Display
+PAGER = True  # Show long answers in $PAGER (less) instead of flooding the terminal
+PAGER_MIN_LINES = 200  # Answers longer than this (and than the terminal) are paged
+
+# Conversation History
+HISTORY_TOKEN_BUDGET = 32000  # Oldest turns are dropped beyond this estimate (system role is kept)
+
+# Response Cache (off by default, as repeated prompts would replay earlier answers; enable with --cache)
+CACHE_DIR = os.getenv("CHATBOT_CACHE_DIR") or os.path.join(
+    os.getenv("LOCALAPPDATA") or os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "chatbot-cli",
+)
+RESPONSE_CACHE = False  # Answer repeated requests (same model, history and settings) from disk
+CACHE_TTL = 24 * 60 * 60  # seconds
+CACHE_MAX_ENTRIES = 1000  # Least recently used entries are evicted beyond this
+CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# Code Retrieval (Programming Expert role; enable per query with --context, disable with --no-context)
+RETRIEVAL = False  # Attach the most relevant snippets of the current project to each message
+RETRIEVAL_ROLES = ("1",)
+# The project is the nearest directory up from the working directory holding one of these
+# (never the home directory itself); outside a project nothing is indexed or sent
+RETRIEVAL_PROJECT_MARKERS = (".git", "pyproject.toml", "setup.py", "package.json", "Cargo.toml", "go.mod", "pom.xml")
+RETRIEVAL_TOP_K = 5
+RETRIEVAL_MIN_MATCH = 0.5  # A snippet is only sent if it holds more than this share of the message's terms
+RETRIEVAL_REFRESH = 30  # seconds; the tree is re-checked sooner only when a directory changed
+# Files never indexed or sent (matched against the lowercase file name); dotfiles are skipped too
+RETRIEVAL_EXCLUDE = (
+    "*secret*", "*credential*", "*password*", "*token*", "*.pem", "*.key", "*.p12", "*.pfx", "*.jks",
+    "*.keystore", "id_rsa*", "id_ed25519*", "id_ecdsa*", "*.env", "*.tfstate", "*.tfvars",
+)
+RETRIEVAL_SNIPPET_LINES = 40
+RETRIEVAL_MAX_FILES = 5000  # Larger trees are only partly indexed
+RETRIEVAL_MAX_FILE_BYTES = 512 * 1024  # Larger files are skipped
+RETRIEVAL_MAX_TOTAL_BYTES = 64 * 1024 * 1024  # Larger trees are only partly indexed
+
+# Sessions (interactive conversations are saved; continue one with --resume)
+SESSION_STORE = True
+SESSION_DB = os.getenv("CHATBOT_SESSION_DB") or os.path.join(CACHE_DIR, "sessions.sqlite")
+
+# Local Intent Resolver (CLI Assistant role)
+INTENT_RESOLVER = True  # Answer known command requests without calling the API
+INTENT_MIN_CONFIDENCE = 0.8  # Lower-confidence matches still go to the model
+
+# Command Execution (CLI Assistant role)
+COMMAND_TIMEOUT = None  # seconds; None lets commands run until they exit (Ctrl+C stops them)
+COMMAND_OUTPUT_MAX_CHARS = 256 * 1024  # Newest output kept per stream for the result
+PERSISTENT_SHELL = True  # Run commands in one long-lived shell per session (not on Windows)
+
+# CLI Assistant Agent Loop (command output goes back to the model when it asks; see src/agent.py)
+AGENT_MAX_STEPS = 5  # Follow-up requests per message
+AGENT_MAX_PARALLEL = 4  # Read-only commands run at once
+AGENT_COMMAND_TIMEOUT = 30  # seconds per read-only command (they run without confirmation)
+AGENT_OUTPUT_MAX_CHARS = 4000  # Per command in the follow-up request (beginning and end are kept)
+# Programs that only read, so they run without confirmation (with no redirection or chaining).
+# Each maps to (short option letters, long options, arguments): only the options listed may be
+# given ("*" allows them all; digits and ",." may follow short options as values), and arguments
+# is True (any), False (none) or a prefix they must start with. Windows "/x" switches count as
+# long options. Anything else needs confirmation.
+_ALL = ("*", "*", True)
+_GIT = ("npsbuvqz", (
+    "--oneline", "--stat", "--shortstat", "--numstat", "--summary", "--name-only", "--name-status",
+    "--graph", "--all", "--cached", "--staged", "--short", "--branch", "--porcelain", "--decorate",
+    "--since", "--until", "--after", "--before", "--author", "--grep", "--format", "--pretty",
+    "--date", "--abbrev-ref", "--abbrev-commit", "--show-toplevel", "--is-inside-work-tree",
+    "--max-count", "--patch", "--no-patch", "--reverse", "--merges", "--no-merges",
+    "--first-parent", "--follow", "--word-diff", "--color", "--no-color", "--relative", "--unified",
+    "--untracked-files", "--ignored", "--others", "--modified", "--deleted", "--tags", "--long",
+    "--always", "--dirty", "--verify", "--no-pager",
+), True)
+READ_ONLY_COMMANDS = {
+    "ls": _ALL, "cat": _ALL, "head": _ALL, "wc": _ALL, "df": _ALL, "du": _ALL, "uname": _ALL,
+    "pwd": _ALL, "whoami": _ALL, "id": _ALL, "uptime": _ALL, "ps": _ALL, "which": _ALL,
+    "stat": _ALL, "grep": _ALL, "cut": _ALL, "diff": _ALL, "lsblk": _ALL, "nproc": _ALL,
+    "sw_vers": _ALL, "md5sum": _ALL, "sha256sum": _ALL, "echo": _ALL,
+    "tail": ("cnqvz", ("--bytes", "--lines", "--quiet", "--silent", "--verbose", "--zero-terminated"), True),
+    "free": ("bkmgthlwv", (
+        "--bytes", "--kilo", "--mega", "--giga", "--tera", "--kibi", "--mebi", "--gibi", "--tebi",
+        "--human", "--si", "--lohi", "--total", "--wide",
+    ), False),
+    "date": ("uRId", ("--utc", "--universal", "--rfc-email", "--rfc-2822", "--rfc-3339", "--iso-8601", "--date"), "+"),
+    "hostname": ("AadfIisy", (
+        "--all-fqdns", "--alias", "--domain", "--fqdn", "--long", "--all-ip-addresses", "--ip-address",
+        "--short", "--yp", "--nis",
+    ), False),
+    "file": ("bhiLzkN", (
+        "--brief", "--mime", "--mime-type", "--mime-encoding", "--dereference", "--no-dereference",
+        "--uncompress", "--keep-going",
+    ), True),
+    "sort": ("bdfghiMnRrsuVktz", (
+        "--reverse", "--numeric-sort", "--human-numeric-sort", "--general-numeric-sort", "--month-sort",
+        "--version-sort", "--random-sort", "--unique", "--key", "--field-separator", "--ignore-case",
+        "--ignore-leading-blanks", "--dictionary-order", "--stable", "--zero-terminated", "--check",
+    ), True),
+    "find": ("HLP", (
+        "-name", "-iname", "-path", "-ipath", "-wholename", "-iwholename", "-regex", "-iregex",
+        "-lname", "-ilname", "-type", "-size", "-empty", "-mtime", "-mmin", "-atime", "-amin",
+        "-ctime", "-cmin", "-newer", "-daystart", "-maxdepth", "-mindepth", "-depth", "-xdev",
+        "-mount", "-follow", "-user", "-group", "-uid", "-gid", "-nouser", "-nogroup", "-perm",
+        "-readable", "-writable", "-executable", "-links", "-inum", "-samefile", "-fstype",
+        "-print", "-print0", "-printf", "-ls", "-prune", "-quit", "-not", "-and", "-or", "-a",
+        "-o", "-true", "-false",
+    ), True),
+    "tree": ("adfilpsughDFrtvxLPIJnC", ("--du", "--dirsfirst", "--noreport", "--charset", "--prune", "--filelimit", "--gitignore", "--sort"), True),
+    "ss": ("tulnapseomirHxw046", (
+        "--tcp", "--udp", "--raw", "--unix", "--listening", "--numeric", "--all", "--processes",
+        "--summary", "--extended", "--options", "--memory", "--info", "--resolve", "--no-header",
+        "--ipv4", "--ipv6", "--oneline",
+    ), True),
+    "netstat": ("tulnapsreiWgox46", (
+        "--tcp", "--udp", "--listening", "--numeric", "--all", "--program", "--statistics", "--route",
+        "--extend", "--interfaces", "--wide", "--groups", "--timers",
+    ), True),
+    "vm_stat": ("", (), False),  # An interval argument repeats forever
+    "git": _GIT,
+    "docker ps": ("aqsn", ("--all", "--quiet", "--size", "--format", "--filter", "--last", "--latest", "--no-trunc"), True),
+    "docker images": ("aq", ("--all", "--quiet", "--format", "--filter", "--digests", "--no-trunc"), True),
+    "docker logs": ("nt", ("--tail", "--since", "--until", "--timestamps", "--details"), True),
+    "docker inspect": ("fs", ("--format", "--size", "--type"), True),
+    "docker version": ("f", ("--format",), False),
+    "docker info": ("f", ("--format",), False),
+    "docker stats": ("a", ("--no-stream", "--all", "--format", "--no-trunc"), True),
+    "systemctl": ("alnpqt", (
+        "--all", "--lines", "--no-pager", "--full", "--type", "--state", "--property", "--value",
+        "--user", "--system", "--plain", "--no-legend",
+    ), True),
+    "journalctl": ("abeknopqruxgSU", (
+        "--all", "--boot", "--pager-end", "--dmesg", "--lines", "--no-pager", "--output", "--priority",
+        "--quiet", "--reverse", "--unit", "--user-unit", "--identifier", "--grep", "--since", "--until",
+        "--utc", "--catalog", "--no-hostname", "--list-boots", "--disk-usage", "--system", "--user",
+        "--directory", "--file",
+    ), True),
+    "pip": ("v", ("--outdated", "--uptodate", "--format", "--not-required", "--user", "--local", "--files", "--verbose"), True),
+    "npm": ("gl", ("--depth", "--all", "--global", "--json", "--long", "--parseable", "--prod", "--production", "--dev"), True),
+    "kubectl": ("noAlcLp", (
+        "--namespace", "--output", "--all-namespaces", "--selector", "--field-selector", "--show-labels",
+        "--label-columns", "--sort-by", "--container", "--all-containers", "--tail", "--since",
+        "--timestamps", "--previous", "--context",
+    ), True),
+    "dir": _ALL, "type": _ALL, "where": _ALL, "systeminfo": _ALL, "tasklist": _ALL, "ver": _ALL,
+    "findstr": _ALL,
+    "ipconfig": ("", ("/all", "/displaydns", "/showclassid", "/showclassid6"), False),
+}
+# For these, only the listed subcommands count as read-only ("program subcommand" rules above
+# take precedence over the program's own)
+READ_ONLY_SUBCOMMANDS = {
+    "git": ("status", "log", "diff", "show", "blame", "ls-files", "rev-parse", "describe"),
+    "docker": ("ps", "images", "logs", "inspect", "version", "info", "stats"),
+    "systemctl": ("status", "is-active", "is-enabled", "is-failed", "list-units", "show"),
+    "pip": ("list", "show", "freeze"),
+    "npm": ("ls", "list", "view", "outdated"),
+    "kubectl": ("get", "describe", "logs", "top", "version"),
+}
+# Options without which a command would not exit on its own
+READ_ONLY_REQUIRED_OPTIONS = {
+    "docker stats": ("--no-stream",),
+}
+
+# Model Routing (simple turns go to a small, fast model; see src/router.py)
+ROUTING = True  # False sends every request to MODEL
+ROUTER_MODELS = {  # Preference order per kind of turn; later models take over when earlier ones degrade
+    "simple": ["llama-3.1-8b-instant", MODEL],
+    "complex": [MODEL, "llama-3.1-8b-instant"],
+}
+ROUTER_COMPLEX_ROLES = ("1",)  # Roles whose turns always count as complex
+ROUTER_SIMPLE_MAX_CHARS = 300  # Longer messages (or any with code fences) are complex
+ROUTER_SIMPLE_MAX_HISTORY_TOKENS = 4000  # Follow-ups in longer conversations are complex
+ROUTER_LATENCY_BUDGET = {"simple": 2.0, "complex": 10.0}  # seconds (median to first token of streamed turns) before a model counts as degraded
+ROUTER_MAX_ERROR_RATE = 0.5  # Failed share of recent requests before a model counts as degraded
+ROUTER_MIN_SAMPLES = 3  # Recent requests needed before a model can count as degraded
+ROUTER_WINDOW = 5 * 60  # seconds of history considered (degraded models are retried after this)
+ROUTER_MAX_SAMPLES = 50  # Per model
+
+# Request Bodies
+COMPRESS_REQUESTS = False  # gzip large request bodies (only for endpoints that accept Content-Encoding: gzip)
+COMPRESS_MIN_BYTES = 32 * 1024  # Smaller bodies are sent as is
+COMPRESS_LEVEL = 1  # zlib level: fast, and JSON history compresses well even at 1
+
+# Hedged Requests (opt-in: a slow request gets a second copy and the first answer wins)
+HEDGING = False  # Can cost up to one extra request per slow turn
+HEDGE_TARGETS = [  # Backup for a slow request: the first entry that differs from the primary
+    {"model": "llama-3.1-8b-instant"},
+    {"model": "llama-3.3-70b-versatile"},
+    # Any OpenAI-compatible endpoint works too:
+    # {"url": "https://api.openai.com/v1/chat/completions", "model": "gpt-4o-mini", "api_key_env": "OPENAI_API_KEY"},
+]
+HEDGE_QUANTILE = 0.95  # Hedge once the primary is slower than this share of its recent requests
+HEDGE_MIN_SAMPLES = 20  # Recent requests needed before the quantile is used
+HEDGE_DEFAULT_DELAY = 3.0  # seconds, until then
+HEDGE_MIN_DELAY = 0.5  # seconds; never hedge sooner
+HEDGE_WINDOW = 200  # Recent latencies kept per model
+
+# Interactive Requests (Ctrl+C cancels; a trailing '&' runs a message in the background)
+ENGINE_MAX_CONCURRENT = 4  # Requests in flight at once, across roles
+
+# Batch Mode (--batch)
+BATCH_WORKERS = 4  # Concurrent requests
+
+# Follow Mode (--follow reads piped lines, --follow-file tails a file)
+FOLLOW_DEFAULT_ROLE = "3"  # Used when the request has no 'N#' role prefix
+FOLLOW_DEFAULT_REQUEST = "Flag errors, anomalies and unusual patterns"
+FOLLOW_DEBOUNCE = 2.0  # seconds without new lines before a batch is sent
+FOLLOW_MAX_DELAY = 10.0  # seconds a line may wait when lines never stop coming
+FOLLOW_WINDOW_LINES = 2000  # Pending lines kept between batches; older ones are dropped
+FOLLOW_WINDOW_CHARS = 32000  # A full window is sent at once (about 8k tokens)
+FOLLOW_MAX_LINE_CHARS = 1000  # Longer lines are cut
+FOLLOW_MAX_LINE_BYTES = 64 * 1024  # Read limit per line
+FOLLOW_SUMMARY_WORDS = 150  # Rolling summary of earlier batches sent with each one
+FOLLOW_POLL_INTERVAL = 0.25  # seconds between checks of a followed file
+
+# File Input (--file accepts files, directories and globs)
+INGEST_CHUNK_TOKENS = 24000  # Larger inputs are split into chunks of this size and summarized
+INGEST_MAX_CHUNKS = 200  # Input beyond this many chunks is truncated (with a note of how much)
+INGEST_WORKERS = 4  # Concurrent chunk requests
+
+# Rate Limiting and Retries (state is shared by all processes via CACHE_DIR)
+RATE_LIMIT_RPM = 30  # Starting request rate; adapts to 429s and x-ratelimit-* headers
+RATE_LIMIT_MAX_RPM = 1000
+RATE_LIMIT_RECOVERY_RPM = 10  # After a 429 the rate grows back by this much per minute of successes
+RATE_LIMIT_BURST = 5  # Requests that may be sent back to back
+RATE_LIMIT_MAX_WAIT = 120  # seconds; longer waits fail with a rate limit error
+MAX_RETRIES = 3  # For 429, 5xx, timeouts and connection errors
+RETRY_BASE_DELAY = 1.0  # seconds, doubled per attempt (with jitter)
+RETRY_MAX_DELAY = 30.0
+
+# Startup Profiling (--startup-profile)
+STARTUP_THRESHOLD_MS = 300  # Inline-mode import time above this is reported as a regression
+
+# Turn Profiling (--profile, or 'profile on' in interactive mode)
+PROFILE_DIR = os.path.join(CACHE_DIR, "profiles")  # One subdirectory per run
+PROFILE_TOP = 15  # Functions and allocation sites listed per turn in summary.txt
+
+# Daemon (--daemon); inline queries are forwarded to it while it runs
+DAEMON_SOCKET = os.getenv("CHATBOT_DAEMON_SOCKET") or os.path.join(CACHE_DIR, "daemon.sock")
+DAEMON_IDLE_TIMEOUT = 60 * 60  # seconds without queries before the daemon exits
+DAEMON_MAX_CONVERSATIONS = 32  # (directory, role) histories kept in memory
+
+# Connection Pool (shared by all Chatbot instances)
+POOL_CONNECTIONS = 4  # Number of hosts to keep pools for
+POOL_MAXSIZE = 8  # Keep-alive connections per host
+POOL_IDLE_REFRESH = 60  # seconds idle after which the server may have closed the connection (reconnect ahead)
+
+# Diagnostics
+VERBOSE = os.getenv("CHATBOT_VERBOSE") == "1"  # Also enabled with --verbose
+
+# Request Metrics (timings and token counts per request; see 'stats' / --stats)
+METRICS = True
+METRICS_FILE = os.path.join(CACHE_DIR, "metrics.jsonl")
+METRICS_MAX_BYTES = 5 * 1024 * 1024  # Rotated to metrics.jsonl.1 beyond this
+METRICS_BACKUPS = 3
+METRICS_WINDOW = 1000  # Most recent requests summarized by stats and the Prometheus file
+METRICS_PROMETHEUS_FILE = os.getenv("CHATBOT_PROMETHEUS_FILE")  # node_exporter textfile; unset to disable
 
 # Role Definitions
 ROLES = {
@@ -70,6 +340,16 @@ Examples for Unix:
 
 Important: Provide only the command for the current OS, don't list alternatives.
 
+When a task needs several commands, put each on its own COMMAND: line; they run in the order given. \
+Read-only commands (ls, cat, df, ps, git status, ...) run at once, side by side, without asking; \
+anything that changes the system runs only after the user confirms it.
+
+When you need to see the output to finish the task (diagnosing a problem, answering a question \
+about this system), add a line containing only CONTINUE after the commands. The output of every \
+command is then sent back to you in one message, and you reply with more COMMAND: lines (and \
+CONTINUE) or with your final answer. Gather what you need in as few steps as possible: suggest \
+all the read-only commands you need at once.
+
 For non-command requests, respond normally without the COMMAND: prefix.
 
 You understand system commands, file operations, and process management across different platforms."""
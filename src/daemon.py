@@ -0,0 +1,217 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator
+from . import config, transport
+from .chatbot import Chatbot
+from .display import render_markdown, render_markdown_blocks
+from .ingest import attach_files
+from .retrieval import index_for
+
+# Options the daemon can serve; anything else is handled by a normal process
+UNSUPPORTED_OPTIONS = (
+    "verbose", "cache_stats", "batch", "startup_profile", "daemon", "stop_daemon", "no_daemon",
+    "resume", "sessions", "search", "stats", "follow", "follow_file", "profile",
+)
+
+
+class ChatDaemon:
+    """Keeps Chatbot instances warm per (working directory, role) between inline queries"""
+
+    def __init__(self, build_parser: Callable, process_message: Callable):
+        self.parser = build_parser()
+        self.process_message = process_message
+        self.conversations: "OrderedDict[tuple[str, str], tuple[Chatbot, threading.Lock]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.last_activity = time.monotonic()
+
+    def _conversation(self, cwd: str, role_number: str) -> tuple[Chatbot, threading.Lock]:
+        """Return the chatbot for this directory and role, evicting the least recently used"""
+        with self.lock:
+            key = (cwd, role_number)
+            if key not in self.conversations:
+                chatbot = Chatbot(config.ROLES[role_number])
+                if config.RETRIEVAL and role_number in config.RETRIEVAL_ROLES:
+                    chatbot.retriever = index_for(cwd)
+                self.conversations[key] = (chatbot, threading.Lock())
+                while len(self.conversations) > config.DAEMON_MAX_CONVERSATIONS:
+                    self.conversations.popitem(last=False)
+            self.conversations.move_to_end(key)
+            return self.conversations[key]
+
+    def handle(self, request: Dict) -> Iterator[Dict]:
+        """Answer one forwarded invocation as a sequence of protocol messages.
+
+        Messages are {"fallback": true} (run the query locally instead),
+        {"output": "..."} (rendered text to print) and a final
+        {"done": true, "text": ..., "copy": ...}. CLI Assistant answers also
+        carry "rendered", "message" and "prompt" so the client can run the
+        suggested commands in its own directory and continue from there.
+        """
+        try:
+            args = self.parser.parse_args(request["argv"])
+        except SystemExit:
+            yield {"fallback": True}
+            return
+        content = args.content or args.content_flag
+        if not content or any(getattr(args, option) for option in UNSUPPORTED_OPTIONS):
+            yield {"fallback": True}
+            return
+
+        parts = content.strip().split(" | ")
+        copy_command = parts[1] if len(parts) > 1 else None
+        message, role_desc = self.process_message(parts[0])
+        role_number = next(key for key, desc in config.ROLES.items() if desc == role_desc)
+        if message.startswith("!") and not args.file:
+            yield {"fallback": True}  # Commands run in the client's own process
+            return
+
+        cwd = request["cwd"]
+        width = request.get("width", 80)
+        color_system = request.get("color_system")
+        chatbot, lock = self._conversation(cwd, role_number)
+
+        with lock:
+            cache, retriever = chatbot.cache, chatbot.retriever
+            if args.no_cache:
+                chatbot.cache = None
+            elif args.cache and cache is None:
+                from .cache import ResponseCache
+                chatbot.cache = ResponseCache()
+            if args.no_context or args.file:
+                chatbot.retriever = None
+            elif args.context and role_number in config.RETRIEVAL_ROLES:
+                chatbot.retriever = retriever or index_for(cwd)
+            try:
+                if args.file:
+                    # Relative paths are relative to the client, not the daemon
+                    message = attach_files(chatbot, message, args.file, base_dir=cwd, progress=lambda _: None)
+
+                if role_number == "5":
+                    response_text = chatbot.get_cli_response(message, request.get("os_type", "linux"))
+                    yield {
+                        "done": True,
+                        "text": response_text,
+                        "rendered": render_markdown(response_text, width, color_system),
+                        "message": None if args.file else message,
+                        "prompt": message,
+                        "copy": copy_command,
+                    }
+                    return
+
+                if args.no_stream or not config.STREAM_RESPONSES:
+                    chunks = iter([chatbot.get_response(message)])
+                else:
+                    chunks = chatbot.stream_response(message)
+                parts = []
+
+                def collect():
+                    for chunk in chunks:
+                        parts.append(chunk)
+                        yield chunk
+
+                for output in render_markdown_blocks(collect(), width, color_system):
+                    yield {"output": output}
+                yield {"done": True, "text": "".join(parts), "copy": copy_command}
+            finally:
+                chatbot.cache, chatbot.retriever = cache, retriever
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        server.chat_daemon.last_activity = time.monotonic()
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        if request.get("shutdown"):
+            self._send({"done": True, "text": "✓ Daemon stopped"})
+            threading.Thread(target=server.shutdown, daemon=True).start()
+            return
+        messages = server.chat_daemon.handle(request)
+        try:
+            for message in messages:
+                self._send(message)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client went away (e.g. Ctrl+C); drop the rest of the answer
+        except Exception as e:
+            self._send({"done": True, "text": f"\nError: {str(e)}"})
+        finally:
+            messages.close()  # Releases the conversation lock if the answer was cut short
+            server.chat_daemon.last_activity = time.monotonic()
+
+    def _send(self, message: Dict):
+        self.wfile.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _connect(path: str) -> socket.socket:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    return sock
+
+
+def serve(build_parser: Callable, process_message: Callable):
+    """Run the daemon in the foreground until it is stopped or idle for too long"""
+    if not hasattr(socket, "AF_UNIX"):
+        print("❌ The daemon needs Unix domain sockets, which this platform does not support")
+        return
+    path = config.DAEMON_SOCKET
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        try:
+            _connect(path).close()
+            print(f"❌ A daemon is already running on {path}")
+            return
+        except OSError:
+            os.unlink(path)  # Stale socket from a daemon that did not exit cleanly
+
+    # The socket gives access to the API key, so only the owner may connect
+    old_umask = os.umask(0o077)
+    try:
+        server = _Server(path, _Handler)
+    finally:
+        os.umask(old_umask)
+    server.chat_daemon = ChatDaemon(build_parser, process_message)
+    config.GROQ_API_KEY  # Fail now, not inside a request, if the key is missing
+
+    def watch_idle():
+        while True:
+            time.sleep(min(60, config.DAEMON_IDLE_TIMEOUT))
+            if time.monotonic() - server.chat_daemon.last_activity > config.DAEMON_IDLE_TIMEOUT:
+                server.shutdown()
+                return
+
+    threading.Thread(target=watch_idle, daemon=True).start()
+    transport.prewarm(config.API_URL)
+    print(f"✓ Daemon listening on {path} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def stop() -> str:
+    """Ask a running daemon to shut down"""
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(config.DAEMON_SOCKET):
+        return "❌ No daemon is running"
+    try:
+        with _connect(config.DAEMON_SOCKET) as sock:
+            sock.sendall(b'{"shutdown": true}\n')
+            reply = sock.makefile("r", encoding="utf-8").readline()
+        return json.loads(reply)["text"]
+    except (OSError, ValueError, KeyError):
+        return "❌ No daemon is running"
@@ -1,18 +1,35 @@
+import io
 import os
+import time
+from typing import Iterable, Iterator, Optional
 from rich.console import Console
-from rich.markdown import Markdown
-from rich.prompt import Prompt
-from rich.panel import Panel
-from rich import print as rprint
+from rich.markdown import CodeBlock, Markdown as RichMarkdown
+from rich.syntax import Syntax
+from . import config
+from .response import ParsedResponse, get_lexer
 
 console = Console()
 
 
+class _CodeBlock(CodeBlock):
+    """Code block that reuses one lexer per language instead of looking it up per block"""
+
+    def __rich_console__(self, console, options):
+        code = str(self.text).rstrip()
+        yield Syntax(code, get_lexer(self.lexer_name) or "text", theme=self.theme, word_wrap=True, padding=1)
+
+
+class Markdown(RichMarkdown):
+    elements = {**RichMarkdown.elements, "fence": _CodeBlock, "code_block": _CodeBlock}
+
+
 def clear_screen():
     os.system("cls" if os.name == "nt" else "clear")
 
 
 def select_role(roles: dict) -> str:
+    from rich.prompt import Prompt
+
     clear_screen()
     console.print("Select a role:", style="bold blue")
     for key, role in roles.items():
@@ -26,6 +43,8 @@ def select_role(roles: dict) -> str:
 
 def select_role_inline(roles: dict) -> str:
     """Version of select_role that doesn't clear screen - for inline mode"""
+    from rich.prompt import Prompt
+
     console.print("Select a role:", style="bold blue")
     for key, role in roles.items():
         console.print(f"[yellow]{key}[/yellow]: {role[:100]}...")
@@ -37,6 +56,9 @@ def select_role_inline(roles: dict) -> str:
 
 
 def show_instructions():
+    from rich import print as rprint
+    from rich.panel import Panel
+
     instructions = """
     Instructions:
     Basic Commands:
@@ -44,6 +66,14 @@ def show_instructions():
     - Press Enter to send message
     - Press Ctrl+J to insert a new line in message
 
+    - Type 'stats' to show request latency and token throughput
+    - Type 'profile on' / 'profile off' to profile each turn (CPU and memory)
+    - Press Ctrl+C while an answer is coming to cancel it
+
+    Background Requests:
+    - End a message with '&' to run it in the background
+    - 'jobs' - List requests, 'show 2' - View answer 2, 'cancel 2' - Stop it
+
     Copy Commands:
     - 'cp' - Copy the entire response
     - 'c-1', 'c-2', etc. - Copy specific code blocks
@@ -64,17 +94,364 @@ def show_instructions():
        - "limpia la pantalla"
     
     Note:
-    - All commands require confirmation (Y/N)
-    - 30-second timeout for safety
+    - Commands that change the system require confirmation (Y/N);
+      read-only ones (ls, df, git status, ...) run at once, side by side
+    - The assistant can read the output and suggest next steps
+    - Output is shown as the command runs; Ctrl+C stops it
     - OS-specific command handling
     """
     rprint(Panel(instructions, title="How to use", border_style="blue"))
 
 
-def display_markdown(text: str):
+def show_request_info(info: dict):
+    """Print per-request diagnostics when verbose output is enabled"""
+    if not config.VERBOSE or not info:
+        return
+    details = []
+    if info.get("local_intent"):
+        details.append(f"resolved locally, confidence {info['intent_confidence']:.2f}")
+    if info.get("cache_hit"):
+        details.append(f"cache hit, saved ~{info['saved_seconds']:.2f}s")
+    elif info.get("cache_hit") is False:
+        details.append("cache miss")
+    if info.get("model"):
+        details.append(info["model"])
+    if info.get("hedged"):
+        details.append(f"hedged after {info['hedge_delay']:.1f}s, {'backup' if info['hedge_won'] else 'primary'} answered")
+    if "connection_reused" in info:
+        details.append("connection reused" if info["connection_reused"] else "new connection")
+    if "history_tokens" in info:
+        details.append(f"~{info['history_tokens']} history tokens")
+    if info.get("evicted_turns"):
+        details.append(f"{info['evicted_turns']} old turns dropped")
+    if details:
+        console.print(f"[dim]({', '.join(details)})[/dim]")
+
+
+def show_cache_stats(stats: dict):
+    """Print response cache counters"""
+    lookups = stats["hits"] + stats["misses"]
+    hit_rate = stats["hits"] / lookups * 100 if lookups else 0
+    console.print(
+        f"Cache: {stats['hits']} hits, {stats['misses']} misses ({hit_rate:.0f}% hit rate), "
+        f"~{stats['saved_seconds']:.1f}s saved, {stats['entries']} entries ({stats['bytes'] / 1024:.0f} KB)"
+    )
+
+
+def _segments(text: str, min_lines: int = 100) -> Iterator[str]:
+    """Split Markdown into pieces of at least min_lines, cut between blocks"""
+    start = 0
+    pos = 0
+    lines = 0
+    in_fence = False
+    while (end := text.find("\n", pos)) != -1:
+        line = text[pos:end].strip()
+        lines += 1
+        if line.startswith("```"):
+            in_fence = not in_fence
+        elif not line and not in_fence and lines >= min_lines:
+            yield text[start:end + 1]
+            start = end + 1
+            lines = 0
+        pos = end + 1
+    if text[start:].strip():
+        yield text[start:]
+
+
+def _page(text: str) -> bool:
+    """Show rendered text in the pager as it renders, so the first screen appears at once.
+
+    Returns False if no pager could be started.
+    """
+    import shlex
+    import subprocess
+
+    command = os.environ.get("PAGER") or ("less" if os.name != "nt" else "")
+    if not command:
+        return False
+    env = dict(os.environ, LESS=os.environ.get("LESS", "FRX"))  # Keep colors; exit if it fits
+    try:
+        pager = subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE, env=env)
+    except OSError:
+        return False
+    try:
+        for index, segment in enumerate(_segments(text)):
+            rendered = render_markdown(segment, console.width, console.color_system)
+            pager.stdin.write((("\n" if index else "") + rendered).encode("utf-8"))
+        pager.stdin.close()
+    except (BrokenPipeError, OSError):
+        pass  # The pager was closed before the end; stop rendering
+    except KeyboardInterrupt:
+        pager.terminate()
+    pager.wait()
+    return True
+
+
+def show_stats(summary: list):
+    """Print request latency percentiles and throughput per role and model"""
+    from rich.table import Table
+
+    if not summary:
+        console.print("No requests recorded yet", style="dim")
+        return
+
+    def ms(row: dict, field: str) -> str:
+        value = row.get(field)
+        return f"{value * 1000:.0f}" if value is not None else "-"
+
+    table = Table(
+        title=f"Recent requests (last {config.METRICS_WINDOW}; times in ms as p50/p95)", title_style="bold blue"
+    )
+    for column in ("Role", "Model", "Sent", "Cached", "Errors", "TTFB", "1st token", "Total", "Tok/s"):
+        table.add_column(column, justify="left" if column in ("Role", "Model") else "right")
+    for row in summary:
+        rate = row.get("tokens_per_second_p50")
+        table.add_row(
+            row["role"],
+            row["model"],
+            str(row["requests"]),
+            str(row["cache_hits"]),
+            str(row["errors"]),
+            f"{ms(row, 'ttfb_p50')}/{ms(row, 'ttfb_p95')}",
+            f"{ms(row, 'ttft_p50')}/{ms(row, 'ttft_p95')}",
+            f"{ms(row, 'total_p50')}/{ms(row, 'total_p95')}",
+            f"{rate:.0f}" if rate else "-",
+        )
+    console.print(table)
+
+    hedged = sum(row["hedged"] for row in summary)
+    if hedged:
+        sent = sum(row["requests"] for row in summary)
+        console.print(
+            f"Hedged {hedged} of {sent} requests ({hedged / max(sent, 1):.1%}); the backup answered first "
+            f"{sum(row['hedge_wins'] for row in summary)} times, saving ~{sum(row['hedge_saved'] for row in summary):.1f}s",
+            style="dim",
+        )
+
+
+def display_markdown(text: "str | ParsedResponse"):
+    """Render an answer. Long answers are rendered in pieces, in a pager on terminals"""
+    text = str(text)
     try:
-        md = Markdown(text)
-        console.print(md)
+        if (
+            config.PAGER
+            and console.is_terminal
+            and text.count("\n") > max(config.PAGER_MIN_LINES, console.height)
+            and _page(text)
+        ):
+            return
+        for index, segment in enumerate(_segments(text)):
+            if index:
+                console.print()
+            console.print(Markdown(segment))
     except Exception as e:
         print(f"\nError rendering markdown: {str(e)}")
         print(text)  # Fallback to plain text
+
+
+class _Blocks:
+    """Cut streamed Markdown into finished pieces, scanning each line once.
+
+    A piece ends at a blank line outside a code fence. A code fence that keeps
+    growing is let out every fence_lines lines as code of its own, so a long
+    code block is never held back (and re-rendered) whole. Pieces are
+    (renderable, joined) pairs; joined pieces continue the one before them
+    without a blank line.
+    """
+
+    def __init__(self, fence_lines: int = 40):
+        self.tail = ""
+        self.fence_lines = fence_lines
+        self._pos = 0  # Start of the first line of tail not scanned yet
+        self._done = 0  # End of the finished blocks in tail
+        self._lang = None  # Language of the open code fence ("" when it has none)
+        self._fence = 0  # Offset of the open fence's opening line in tail
+        self._code = 0  # Offset of its first code line
+        self._lines = 0  # Code lines in tail from there
+        self._split = False  # Whether part of the open fence was already let out
+
+    def _syntax(self, code: str, top: int, bottom: int) -> Syntax:
+        return Syntax(
+            code, get_lexer(self._lang) or "text", theme="monokai", word_wrap=True, padding=(top, 1, bottom, 1)
+        )
+
+    def _cut(self, offset: int):
+        self.tail = self.tail[offset:]
+        self._pos -= offset
+        self._done = max(self._done - offset, 0)
+        self._fence = max(self._fence - offset, 0)
+        self._code = max(self._code - offset, 0)
+
+    def _flush(self, pieces: list, offset: int):
+        """Let out the finished blocks before offset as one piece"""
+        if self.tail[:offset].strip():
+            pieces.append((Markdown(self.tail[:offset]), False))
+        self._cut(offset)
+
+    def feed(self, chunk: str) -> list:
+        self.tail += chunk
+        pieces = []
+        while (end := self.tail.find("\n", self._pos)) != -1:
+            line = self.tail[self._pos:end].strip()
+            if line.startswith("```") and self._lang is None:
+                self._lang, self._fence, self._code = line[3:].strip(), self._pos, end + 1
+                self._lines, self._split = 0, False
+            elif line.startswith("```"):
+                if self._split:  # The rest of the code closes the block the earlier pieces opened
+                    pieces.append((self._syntax(self.tail[:self._pos].rstrip(), 0, 1), True))
+                    self._pos = end + 1
+                    self._cut(self._pos)
+                    self._lang, self._split = None, False
+                    continue
+                self._lang = None
+            elif self._lang is not None:
+                self._lines += 1
+                if self._lines > self.fence_lines:
+                    # Let out the finished code but this line, so the last piece is never empty
+                    length = end + 1 - self._pos
+                    if not self._split:
+                        self._flush(pieces, self._fence)  # Text before the fence
+                    pieces.append((self._syntax(self.tail[self._code:self._pos - 1], 0 if self._split else 1, 0),
+                                   self._split))
+                    self._cut(self._pos)
+                    self._pos = length
+                    self._lines, self._split = 1, True
+                    continue
+            elif not line:
+                self._done = end + 1
+            self._pos = end + 1
+        self._flush(pieces, self._done)
+        return pieces
+
+    def rest(self):
+        """The unfinished tail as one renderable and whether it is joined (None when empty)"""
+        if self._split:
+            return self._syntax(self.tail.rstrip(), 0, 1), True
+        if self.tail.strip():
+            return Markdown(self.tail), False
+        return None
+
+
+def display_markdown_stream(chunks: Iterable[str]) -> ParsedResponse:
+    """Render streamed Markdown live and return the parsed answer.
+
+    Finished blocks (and the finished lines of a long code block) are printed
+    once; only the unfinished tail is re-rendered.
+    Code blocks are indexed as the text arrives.
+    """
+    from rich.live import Live
+
+    response = ParsedResponse()
+    blocks = _Blocks()
+    printed = False
+    last_update = 0.0
+    try:
+        with Live(console=console, refresh_per_second=12, transient=True) as live:
+            for chunk in chunks:
+                response.feed(chunk)
+
+                # Move finished blocks above the live region
+                for renderable, joined in blocks.feed(chunk):
+                    if printed and not joined:
+                        live.console.print()  # Keep the blank line between blocks
+                    live.console.print(renderable)
+                    printed = True
+                    last_update = 0.0
+
+                # Parsing the tail is cheap, but there is no point doing it faster than the refresh rate
+                now = time.monotonic()
+                if now - last_update >= 1 / 12:
+                    rest = blocks.rest()
+                    live.update(rest[0] if rest else "")
+                    last_update = now
+        rest = blocks.rest()
+        if rest:
+            if printed and not rest[1]:
+                console.print()
+            console.print(rest[0])
+    except Exception as e:
+        print(f"\nError rendering markdown: {str(e)}")
+        print(blocks.tail)  # Fallback to plain text
+    return response.finish()
+
+
+def _render(renderable, width: int, color_system: Optional[str]) -> str:
+    buffer = io.StringIO()
+    Console(
+        file=buffer,
+        width=width,
+        force_terminal=color_system is not None,
+        color_system=color_system,
+    ).print(renderable)
+    return buffer.getvalue()
+
+
+def render_markdown(text: str, width: int, color_system: Optional[str]) -> str:
+    """Render Markdown to a string (with ANSI colors unless color_system is None)"""
+    return _render(Markdown(text), width, color_system)
+
+
+def render_markdown_blocks(chunks: Iterable[str], width: int, color_system: Optional[str]) -> Iterator[str]:
+    """Render streamed Markdown block by block, for output that is not a live terminal"""
+    blocks = _Blocks()
+    printed = False
+    for chunk in chunks:
+        for renderable, joined in blocks.feed(chunk):
+            yield ("\n" if printed and not joined else "") + _render(renderable, width, color_system)
+            printed = True
+    rest = blocks.rest()
+    if rest:
+        yield ("\n" if printed and not rest[1] else "") + _render(rest[0], width, color_system)
+
+
+def show_sessions(sessions: list):
+    """Print saved sessions, most recent first"""
+    from rich.markup import escape
+
+    if not sessions:
+        console.print("No saved sessions", style="dim")
+        return
+    console.print("Saved sessions:", style="bold blue")
+    for session in sessions:
+        updated = time.strftime("%Y-%m-%d %H:%M", time.localtime(session["updated_at"]))
+        console.print(
+            f"[yellow]{session['id']:>5}[/yellow]  {updated}  {session['messages']:>4} messages  "
+            f"{escape(session['title'])}",
+            highlight=False,
+        )
+    console.print("Continue one with --resume <id>", style="dim")
+
+
+def show_jobs(jobs: Iterable):
+    """Print requests started in the interactive session, newest last"""
+    from rich.markup import escape
+
+    jobs = list(jobs)
+    if not jobs:
+        console.print("No requests yet (end a message with '&' to run it in the background)", style="dim")
+        return
+    colors = {"queued": "yellow", "running": "cyan", "done": "green", "cancelled": "red"}
+    for job in jobs:
+        message = job.message.splitlines()[0] if job.message else ""
+        console.print(
+            f"[yellow]{job.id:>4}[/yellow]  role {job.label or '?'}  "
+            f"[{colors[job.status]}]{job.status:<9}[/{colors[job.status]}] {job.elapsed():6.1f}s  "
+            f"{escape(message[:60])}",
+            highlight=False,
+        )
+    console.print("'show <id>' views an answer, 'cancel <id>' stops a request", style="dim")
+
+
+def show_search_results(results: list):
+    """Print session search results with the matched words highlighted"""
+    from rich.markup import escape
+    from .sessions import MATCH_END, MATCH_START
+
+    if not results:
+        console.print("No matching answers", style="dim")
+        return
+    for result in results:
+        when = time.strftime("%Y-%m-%d", time.localtime(result["created_at"]))
+        snippet = escape(result["snippet"]).replace(MATCH_START, "[bold yellow]").replace(MATCH_END, "[/bold yellow]")
+        console.print(f"[yellow]session {result['session']}[/yellow] [dim](role {result['role']}, {when})[/dim]")
+        console.print(f"  {snippet}", highlight=False)
@@ -0,0 +1,200 @@
+import asyncio
+import contextlib
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+from . import config
+from .chatbot import Chatbot
+
+if TYPE_CHECKING:
+    from .profiler import Turn
+
+
+class Job:
+    """One request run by the engine. Its text can be followed while it streams.
+
+    status is "queued" (waiting for its conversation or a free slot),
+    "running", "done" or "cancelled".
+    """
+
+    def __init__(
+        self,
+        job_id: int,
+        chatbot: Chatbot,
+        message: str,
+        stream: bool,
+        label: str = "",
+        profile: Optional["Turn"] = None,
+    ):
+        self.id = job_id
+        self.chatbot = chatbot
+        self.message = message
+        self.stream = stream
+        self.label = label  # Shown by 'jobs', e.g. the role number
+        self.status = "queued"
+        self.parts: List[str] = []
+        self.created = time.monotonic()
+        self.finished: Optional[float] = None
+        self.seen = False  # Whether the user has been told it finished
+        self.profile = profile  # Profiled turn the request belongs to (--profile)
+        self.error: Optional[Exception] = None  # What the request raised, if it failed that way
+        self._changed = threading.Condition()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "cancelled")
+
+    def _append(self, delta: str):
+        with self._changed:
+            if self.status == "cancelled":
+                return  # The user has moved on
+            self.parts.append(delta)
+            self._changed.notify_all()
+
+    def _set_status(self, status: str):
+        with self._changed:
+            self.status = status
+            if self.done:
+                self.finished = time.monotonic()
+            self._changed.notify_all()
+
+    def _produce(self):
+        """Run the request (in an executor thread), collecting its text"""
+        with self.profile.thread() if self.profile else contextlib.nullcontext():
+            if self.stream:
+                for delta in self.chatbot.stream_response(self.message):
+                    self._append(delta)
+            else:
+                self._append(self.chatbot.get_response(self.message))
+
+    def deltas(self) -> Iterator[str]:
+        """Yield the answer's text from the start, blocking until more arrives or the job ends"""
+        index = 0
+        while True:
+            with self._changed:
+                while index == len(self.parts) and not self.done:
+                    self._changed.wait(0.1)  # Short waits keep Ctrl+C responsive
+                parts = self.parts[index:]
+                finished = self.done
+            index += len(parts)
+            yield from parts
+            if finished and index == len(self.parts):
+                return
+
+    def result(self) -> str:
+        """Wait for the job and return its full text"""
+        for _ in self.deltas():
+            pass
+        return self.text
+
+    def cancel(self):
+        """Cancel the job: a queued one never starts, a running one stops at once"""
+        if self._loop is not None:
+            # On the loop thread, so the job cannot start or finish halfway through
+            self._loop.call_soon_threadsafe(self._cancel)
+
+    def _cancel(self):
+        if self.done:
+            return
+        if self.status == "running":
+            self.chatbot.cancel()  # Closes the connection; the executor thread unwinds by itself
+        self._set_status("cancelled")
+        self._task.cancel()
+
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.created
+
+
+class RequestEngine:
+    """Runs chatbot requests on an asyncio event loop in a background thread.
+
+    The (synchronous) interactive loop submits jobs and follows or cancels
+    them, so it never blocks on the network itself. Jobs for the same Chatbot
+    run one after another, in submission order, which keeps each
+    conversation's history consistent; jobs for different chatbots run
+    concurrently, up to config.ENGINE_MAX_CONCURRENT.
+    """
+
+    def __init__(self, max_concurrent: Optional[int] = None):
+        max_concurrent = max_concurrent or config.ENGINE_MAX_CONCURRENT
+        self.loop = asyncio.new_event_loop()
+        # requests is blocking, so each request's I/O runs on one of these threads
+        self.executor = ThreadPoolExecutor(max_concurrent, thread_name_prefix="request")
+        self.jobs: Dict[int, Job] = {}
+        self._ids = itertools.count(1)
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._conversations: Dict[int, asyncio.Lock] = {}
+        threading.Thread(target=self.loop.run_forever, name="request-engine", daemon=True).start()
+
+    def submit(
+        self,
+        chatbot: Chatbot,
+        message: str,
+        stream: bool = True,
+        label: str = "",
+        profile: Optional["Turn"] = None,
+    ) -> Job:
+        """Queue message for chatbot and return its job at once"""
+        job = Job(next(self._ids), chatbot, message, stream, label, profile)
+        job._loop = self.loop
+        self.jobs[job.id] = job
+
+        def start():
+            job._task = self.loop.create_task(self._run(job))
+
+        self.loop.call_soon_threadsafe(start)
+        return job
+
+    async def _run(self, job: Job):
+        # Created on the loop thread, so no lock is needed around the dict
+        conversation = self._conversations.setdefault(id(job.chatbot), asyncio.Lock())
+        try:
+            async with conversation, self._slots:
+                if job.done:
+                    return
+                job._set_status("running")
+                request = self.loop.run_in_executor(self.executor, job._produce)
+                try:
+                    await asyncio.shield(request)
+                except asyncio.CancelledError:
+                    # Keep the conversation until the aborted request has unwound,
+                    # so the next job does not start on top of it
+                    await asyncio.wait([request])
+                    # The request may have ended before it saw the cancellation
+                    job.chatbot._cancelled.clear()
+                    return
+                except Exception as e:
+                    # Shown like the errors the chatbot returns as text
+                    job.error = e
+                    job._append(f"\nError: {str(e)}")
+            job._set_status("done")
+        except asyncio.CancelledError:
+            pass  # Cancelled while queued
+        finally:
+            if not job.done:
+                job._set_status("done")  # Never leave deltas() waiting
+
+    def running(self) -> List[Job]:
+        return [job for job in self.jobs.values() if not job.done]
+
+    def cancel_all(self):
+        for job in self.running():
+            job.cancel()
+
+
+_engine: Optional[RequestEngine] = None
+
+
+def get_engine() -> RequestEngine:
+    global _engine
+    if _engine is None:
+        _engine = RequestEngine()
+    return _engine
@@ -0,0 +1,231 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, Iterable, Iterator, List, Optional
+from . import config
+from .chatbot import Chatbot
+
+BATCH_PROMPT = """You are watching a live stream of lines ({source}) as they arrive.
+
+Task: {request}
+
+Summary of the stream so far:
+{summary}
+
+New lines ({count}{skipped}):
+```text
+{lines}
+```
+
+Report only findings in the new lines that matter for the task, briefly; \
+say "Nothing notable." if there are none. Then, on a line of its own, write \
+"{marker}" followed by an updated summary of the whole stream so far in at \
+most {summary_words} words (it replaces the summary above)."""
+
+SUMMARY_MARKER = "SUMMARY:"
+
+
+class LineWindow:
+    """Lines waiting for the next batch, bounded in count and characters.
+
+    When lines arrive faster than batches are sent the oldest pending ones
+    are dropped (and counted), so memory stays bounded at any line rate.
+    Consecutive identical lines are collapsed into one with a repeat count.
+    """
+
+    def __init__(self, max_lines: int, max_chars: int, max_line_chars: int):
+        self.max_lines = max_lines
+        self.max_chars = max_chars
+        self.max_line_chars = max_line_chars
+        self.lines: deque = deque()  # [text, repeats]
+        self.chars = 0
+        self.dropped = 0
+        self.first_arrival: Optional[float] = None
+        self.last_arrival = 0.0
+        self.closed = False
+        self.changed = threading.Condition()
+
+    def add(self, line: str):
+        line = line.rstrip("\r\n")
+        if len(line) > self.max_line_chars:
+            line = line[:self.max_line_chars] + " …"
+        with self.changed:
+            now = time.monotonic()
+            if self.first_arrival is None:
+                self.first_arrival = now
+            self.last_arrival = now
+            if self.lines and self.lines[-1][0] == line:
+                self.lines[-1][1] += 1
+            else:
+                self.lines.append([line, 1])
+                self.chars += len(line) + 1
+                while len(self.lines) > self.max_lines or (self.chars > self.max_chars and len(self.lines) > 1):
+                    text, repeats = self.lines.popleft()
+                    self.chars -= len(text) + 1
+                    self.dropped += repeats
+            self.changed.notify()
+
+    def close(self):
+        with self.changed:
+            self.closed = True
+            self.changed.notify()
+
+    def _ready(self, debounce: float, max_delay: float) -> Optional[float]:
+        """0 if a batch should go now, else seconds until it might (None: wait for lines)"""
+        if not self.lines:
+            return 0 if self.closed else None
+        now = time.monotonic()
+        if self.closed or self.chars >= self.max_chars or len(self.lines) >= self.max_lines:
+            return 0
+        wait = min(self.last_arrival + debounce, self.first_arrival + max_delay) - now
+        return max(0, wait)
+
+    def next_batch(self, debounce: float, max_delay: float) -> Optional[tuple[List[str], int, int]]:
+        """Block until a batch is due: after debounce seconds without new lines, max_delay after
+        its first line, or when the window is full.
+
+        Returns (lines, lines received, lines dropped) or None at the end.
+        """
+        with self.changed:
+            while (wait := self._ready(debounce, max_delay)) != 0:
+                self.changed.wait(wait)
+            if not self.lines:
+                return None
+            lines = [text if repeats == 1 else f"{text}  [repeated {repeats} times]" for text, repeats in self.lines]
+            received = sum(repeats for _, repeats in self.lines)
+            dropped = self.dropped
+            self.lines.clear()
+            self.chars = self.dropped = 0
+            self.first_arrival = None
+            return lines, received, dropped
+
+
+def read_stream(stream) -> Iterator[str]:
+    """Lines of a binary stream (e.g. stdin), decoded leniently"""
+    while line := stream.readline(config.FOLLOW_MAX_LINE_BYTES):
+        yield line.decode("utf-8", errors="replace")
+
+
+def tail_file(path: str, stop: threading.Event) -> Iterator[str]:
+    """Lines appended to path from now on, like tail -F (follows truncation and rotation)"""
+    f = open(path, "rb")
+    try:
+        f.seek(0, os.SEEK_END)
+        partial = b""
+        while not stop.is_set():
+            data = f.readline(config.FOLLOW_MAX_LINE_BYTES)
+            if data:
+                partial += data
+                if partial.endswith(b"\n") or len(partial) >= config.FOLLOW_MAX_LINE_BYTES:
+                    yield partial.decode("utf-8", errors="replace")
+                    partial = b""
+                continue
+            time.sleep(config.FOLLOW_POLL_INTERVAL)
+            try:
+                current = os.stat(path)
+            except FileNotFoundError:
+                continue  # Being rotated; wait for the new file
+            if current.st_ino != os.fstat(f.fileno()).st_ino:
+                f.close()
+                f = open(path, "rb")  # Rotated: read the new file from its start
+            elif current.st_size < f.tell():
+                f.seek(0)  # Truncated
+    finally:
+        f.close()
+
+
+def _split_summary(chunks: Iterable[str], summary: List[str]) -> Iterator[str]:
+    """Yield the findings part of a streamed answer; what follows the marker goes into summary"""
+    pending = ""
+    found = False
+    for chunk in chunks:
+        if found:
+            summary.append(chunk)
+            continue
+        pending += chunk
+        index = pending.find(SUMMARY_MARKER)
+        if index != -1:
+            found = True
+            yield pending[:index]
+            summary.append(pending[index + len(SUMMARY_MARKER):])
+            continue
+        # Hold back what could be the start of the marker
+        safe = len(pending) - len(SUMMARY_MARKER) + 1
+        if safe > 0:
+            yield pending[:safe]
+            pending = pending[safe:]
+    if not found:
+        yield pending
+
+
+def follow(
+    lines: Iterable[str],
+    request: str,
+    system_role: str,
+    source: str,
+    render: Callable[[Iterable[str]], object],
+    stream: bool = True,
+):
+    """Analyze lines as they arrive, sending debounced batches with a rolling summary.
+
+    Reading happens on a separate thread, so lines keep being collected (up to
+    the window's limits) while a batch is being analyzed. Returns when lines
+    run out (EOF on a pipe) and the last batch has been analyzed.
+    """
+    window = LineWindow(config.FOLLOW_WINDOW_LINES, config.FOLLOW_WINDOW_CHARS, config.FOLLOW_MAX_LINE_CHARS)
+
+    def read():
+        try:
+            for line in lines:
+                window.add(line)
+        finally:
+            window.close()
+
+    threading.Thread(target=read, daemon=True).start()
+
+    summary = "(nothing yet)"
+    seen = 0
+    while batch := window.next_batch(config.FOLLOW_DEBOUNCE, config.FOLLOW_MAX_DELAY):
+        batch_lines, received, dropped = batch
+        first, seen = seen + dropped + 1, seen + dropped + received
+        skipped = f", {dropped} earlier lines skipped while busy" if dropped else ""
+        message = BATCH_PROMPT.format(
+            source=source,
+            request=request,
+            summary=summary,
+            count=len(batch_lines),
+            skipped=skipped,
+            lines="\n".join(batch_lines),
+            marker=SUMMARY_MARKER,
+            summary_words=config.FOLLOW_SUMMARY_WORDS,
+        )
+        print(f"\n── {time.strftime('%H:%M:%S')} · lines {first}-{seen}{skipped} ──", flush=True)
+
+        chatbot = Chatbot(system_role)  # Each batch stands alone; the summary carries the context
+        answer = chatbot.stream_response(message) if stream else [chatbot.get_response(message)]
+        new_summary: List[str] = []
+        render(_split_summary(answer, new_summary))
+        if new_summary:
+            # Capped (about 10 characters a word) so a runaway summary cannot grow every prompt
+            summary = "".join(new_summary).strip()[:config.FOLLOW_SUMMARY_WORDS * 10] or summary
+
+
+def follow_stdin(request: str, system_role: str, render, stream: bool = True):
+    if sys.stdin.isatty():
+        print("❌ --follow reads piped input, e.g.: tail -f app.log | python main.py --follow \"3#flag anomalies\"")
+        return
+    follow(read_stream(sys.stdin.buffer), request, system_role, "standard input", render, stream)
+
+
+def follow_file(path: str, request: str, system_role: str, render, stream: bool = True):
+    if not os.path.isfile(path):
+        print(f"❌ File not found: {path}")
+        return
+    print(f"Following {path} (Ctrl+C to stop)")
+    stop = threading.Event()
+    try:
+        follow(tail_file(path, stop), request, system_role, os.path.basename(path), render, stream)
+    finally:
+        stop.set()
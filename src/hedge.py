@@ -0,0 +1,170 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from typing import TYPE_CHECKING, Callable, Deque, Dict, Iterator, Optional, Tuple
+from . import config, transport
+from .metrics import load_recent, percentile
+
+if TYPE_CHECKING:
+    import requests
+
+
+class Attempt:
+    """One copy of a request, sent and read up to the start of the answer.
+
+    For a stream that is the first content delta (deltas then yields the
+    whole answer, that delta included); otherwise the whole JSON body.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        send: Callable[[threading.Event], Tuple["requests.Response", bool]],
+        stream: bool,
+    ):
+        self.model = model
+        self.send = send
+        self.stream = stream
+        self.response: Optional["requests.Response"] = None
+        self.reused = False
+        self.usage: Dict = {}
+        self.deltas: Optional[Iterator[str]] = None
+        self.data: Optional[Dict] = None
+        self.error: Optional[Exception] = None
+        self.started = time.monotonic()
+        self.first_token: Optional[float] = None  # When the answer started arriving
+        self.cancelled = threading.Event()
+
+    def run(self, done: Optional[queue.Queue] = None):
+        from .chatbot import Chatbot
+
+        self.started = time.monotonic()
+        try:
+            self.response, self.reused = self.send(self.cancelled)
+            self.response.raise_for_status()
+            if self.stream:
+                deltas = Chatbot._iter_stream(self.response, self.usage)
+                first = next(deltas, None)
+                self.deltas = itertools.chain([first] if first is not None else [], deltas)
+            else:
+                self.data = self.response.json()
+            self.first_token = time.monotonic()
+        except Exception as e:
+            self.error = e
+        if done is not None:
+            done.put(self)
+
+    def cancel(self):
+        """Stop this copy; a thread still waiting for its response drops it on arrival"""
+        self.cancelled.set()
+        if self.response is not None:
+            transport.abort(self.response)
+
+
+def race(primary: Attempt, backup: Attempt, deadline: float) -> Tuple[Attempt, Dict]:
+    """Run primary; if its answer has not started after deadline seconds, also run backup.
+
+    The first copy whose answer starts wins and the other is cancelled. A
+    copy that fails leaves the race to the other; if both fail the primary's
+    error is returned. Returns (winner, hedge info for metrics).
+    """
+    done: queue.Queue = queue.Queue()
+    threading.Thread(target=primary.run, args=(done,), daemon=True).start()
+    try:
+        first = done.get(timeout=deadline)
+        return first, {"hedged": False}
+    except queue.Empty:
+        pass
+
+    threading.Thread(target=backup.run, args=(done,), daemon=True).start()
+    winner = None
+    for _ in range(2):
+        attempt = done.get()
+        if attempt.error is None:
+            winner = attempt
+            break
+    for attempt in (primary, backup):
+        if attempt is not winner and attempt.error is None:
+            attempt.cancel()
+
+    info = {"hedged": True, "hedge_won": winner is backup, "hedge_delay": round(deadline, 3)}
+    if winner is backup:
+        # The primary was cancelled, so what it would have taken is estimated from its slow tail
+        expected = get_tracker().tail_mean(primary.model, primary.stream)
+        if expected is not None:
+            info["hedge_saved"] = round(max(0.0, expected - (backup.first_token - primary.started)), 3)
+    return winner or primary, info
+
+
+def backup_for(model: str) -> Optional[Dict]:
+    """First configured hedge target that is not the primary itself"""
+    for target in config.HEDGE_TARGETS:
+        url = target.get("url", config.API_URL)
+        if target["model"] != model or url != config.API_URL:
+            return target
+    return None
+
+
+def target_headers(target: Dict) -> Dict:
+    key_name = target.get("api_key_env")
+    key = os.getenv(key_name) if key_name else config.GROQ_API_KEY
+    return {"Content-Type": "application/json", "Authorization": f"Bearer {key}"}
+
+
+class LatencyTracker:
+    """Recent time-to-answer samples per (model, stream), for hedge deadlines.
+
+    Seeded from the metrics log so one-shot inline runs start with a deadline.
+    """
+
+    def __init__(self):
+        self.samples: Dict[Tuple[str, bool], Deque[float]] = defaultdict(
+            lambda: deque(maxlen=config.HEDGE_WINDOW)
+        )
+        self.lock = threading.Lock()
+        if config.METRICS:
+            for entry in load_recent():
+                if entry.get("cache_hit") or entry.get("error") or entry.get("hedged"):
+                    continue
+                latency = entry.get("ttft") if entry.get("stream") else entry.get("total")
+                if latency is not None and entry.get("model"):
+                    self.samples[(entry["model"], bool(entry.get("stream")))].append(latency)
+
+    def observe(self, model: str, stream: bool, latency: float):
+        with self.lock:
+            self.samples[(model, stream)].append(latency)
+
+    def _values(self, model: str, stream: bool) -> list:
+        with self.lock:
+            return list(self.samples[(model, stream)])
+
+    def deadline(self, model: str, stream: bool) -> float:
+        """Seconds to wait before hedging: the primary's recent p95, within sensible bounds"""
+        values = self._values(model, stream)
+        if len(values) < config.HEDGE_MIN_SAMPLES:
+            return config.HEDGE_DEFAULT_DELAY
+        return max(config.HEDGE_MIN_DELAY, percentile(values, config.HEDGE_QUANTILE))
+
+    def tail_mean(self, model: str, stream: bool) -> Optional[float]:
+        """Average of the samples beyond the hedge quantile (how long slow requests take)"""
+        values = self._values(model, stream)
+        if len(values) < config.HEDGE_MIN_SAMPLES:
+            return None
+        cutoff = percentile(values, config.HEDGE_QUANTILE)
+        tail = [value for value in values if value >= cutoff]
+        return sum(tail) / len(tail)
+
+
+_tracker: Optional[LatencyTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_tracker() -> LatencyTracker:
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = LatencyTracker()
+    return _tracker
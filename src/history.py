@@ -0,0 +1,64 @@
+from typing import Callable, Dict, Iterable, List, Optional
+from . import config
+
+CHARS_PER_TOKEN = 4  # Rough average for English text and code
+MESSAGE_OVERHEAD = 4  # Tokens used by the role and message framing
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate that does not need a tokenizer"""
+    return len(text) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD
+
+
+class ConversationHistory:
+    """Message list with a running token estimate, trimmed to a token budget.
+
+    The system message is always kept. When the budget is exceeded, the oldest
+    turns (a user message and the replies that follow it) are evicted first.
+    """
+
+    def __init__(self, system_role: str, budget: Optional[int] = None):
+        self.budget = budget or config.HISTORY_TOKEN_BUDGET
+        self.messages: List[Dict] = []
+        self._tokens: List[int] = []  # Estimate per message, same order as messages
+        self.total_tokens = 0
+        self.evicted_turns = 0
+        # Called with (role, content) for each new message, e.g. to persist it
+        self.listener: Optional[Callable[[str, str], None]] = None
+        self.append("system", system_role)
+
+    def append(self, role: str, content: str):
+        self._add(role, content)
+        if self.listener:
+            self.listener(role, content)
+        if role == "user":
+            self.trim()  # Trim just before a request is sent
+
+    def extend(self, messages: Iterable[Dict]):
+        """Restore earlier messages (e.g. a resumed session) without notifying the listener"""
+        for message in messages:
+            self._add(message["role"], message["content"])
+        self.trim()
+
+    def _add(self, role: str, content: str):
+        tokens = estimate_tokens(content)
+        self.messages.append({"role": role, "content": content})
+        self._tokens.append(tokens)
+        self.total_tokens += tokens
+
+    def _pop(self, index: int):
+        self.messages.pop(index)
+        self.total_tokens -= self._tokens.pop(index)
+
+    def trim(self):
+        """Evict the oldest turns until the history fits the budget"""
+        # Never evict the system message or the newest message
+        while self.total_tokens > self.budget and len(self.messages) > 2:
+            self._pop(1)
+            # Drop the rest of that turn so history never starts with a reply
+            while len(self.messages) > 2 and self.messages[1]["role"] != "user":
+                self._pop(1)
+            self.evicted_turns += 1
+
+    def __len__(self) -> int:
+        return len(self.messages)
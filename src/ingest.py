@@ -0,0 +1,331 @@
+import codecs
+import glob
+import gzip
+import lzma
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional
+from . import config
+from .chatbot import Chatbot
+from .history import CHARS_PER_TOKEN
+
+# Directories never worth sending to the model
+SKIP_DIRS = {".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", ".tox", ".mypy_cache"}
+
+COMPRESSED = {".gz": gzip.open, ".xz": lzma.open, ".lzma": lzma.open}
+
+SNIFF_BYTES = 8192
+READ_BLOCK = 1024 * 1024
+
+MAP_PROMPT = """You are reading part {part} of {total} of a larger input ({source}).
+Extract everything in this part that is relevant to the request below. Be concise; \
+your notes will be combined with notes from the other parts.
+
+Request: {request}
+
+{content}"""
+
+REDUCE_PROMPT = """{request}
+
+The input was too large to send at once ({files}, {total} parts). \
+These are notes taken from each part, in order:
+
+{notes}"""
+
+
+def expand_paths(patterns: List[str], base_dir: Optional[str] = None) -> List[str]:
+    """Expand files, directories (recursively) and glob patterns into a sorted file list"""
+    paths = []
+    for pattern in patterns:
+        pattern = os.path.expanduser(pattern)
+        if base_dir and not os.path.isabs(pattern):
+            pattern = os.path.join(base_dir, pattern)
+        if os.path.isdir(pattern):
+            for root, dirs, files in os.walk(pattern):
+                dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS and not d.startswith("."))
+                paths.extend(os.path.join(root, name) for name in sorted(files))
+        elif glob.has_magic(pattern):
+            paths.extend(p for p in sorted(glob.glob(pattern, recursive=True)) if os.path.isfile(p))
+        else:
+            paths.append(pattern)  # Missing files are reported when read
+    return list(dict.fromkeys(paths))  # Keep order, drop duplicates
+
+
+def is_binary(sample: bytes) -> bool:
+    """Cheap binary check on the first block: NUL bytes or mostly control characters"""
+    if b"\0" in sample:
+        return True
+    if not sample:
+        return False
+    control = sum(1 for byte in sample if byte < 32 and byte not in (9, 10, 12, 13, 27))
+    return control / len(sample) > 0.3
+
+
+def _iter_blocks(path: str) -> Iterator[bytes]:
+    """Yield raw blocks of a file: decompressed for .gz/.xz, memory-mapped otherwise"""
+    opener = COMPRESSED.get(os.path.splitext(path)[1].lower())
+    if opener:
+        with opener(path, "rb") as f:
+            while block := f.read(READ_BLOCK):
+                yield block
+        return
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for offset in range(0, size, READ_BLOCK):
+                yield mm[offset:offset + READ_BLOCK]
+
+
+def iter_text(path: str) -> Iterator[str]:
+    """Yield a text file's contents in blocks without loading it all.
+
+    Raises ValueError for binary files and UnicodeDecodeError for invalid UTF-8.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    first = True
+    for block in _iter_blocks(path):
+        if first and is_binary(block[:SNIFF_BYTES]):
+            raise ValueError("File appears to be binary")
+        first = False
+        text = decoder.decode(block)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_chunks(path: str, chunk_chars: int) -> Iterator[str]:
+    """Split a file into chunks of at most chunk_chars, preferring line boundaries"""
+    buffer = ""
+    for text in iter_text(path):
+        buffer += text
+        while len(buffer) >= chunk_chars:
+            cut = buffer.rfind("\n", 0, chunk_chars)
+            cut = chunk_chars if cut <= 0 else cut + 1
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    if buffer:
+        yield buffer
+
+
+def _fence(path: str, text: str) -> str:
+    name = path[:-len(os.path.splitext(path)[1])] if os.path.splitext(path)[1].lower() in COMPRESSED else path
+    file_ext = name.split(".")[-1].lower()
+    return f"{path}:\n```{file_ext}\n{text}\n```"
+
+
+def _sniff(path: str) -> bytes:
+    """The first bytes of a file's content (decompressed), for is_binary"""
+    blocks = _iter_blocks(path)
+    try:
+        return next(blocks, b"")[:SNIFF_BYTES]
+    finally:
+        blocks.close()
+
+
+def _estimated_size(path: str) -> int:
+    """Uncompressed size estimate in characters (compressed logs expand 10x or far more, so it can be low)"""
+    size = os.path.getsize(path)
+    return size * 10 if os.path.splitext(path)[1].lower() in COMPRESSED else size
+
+
+def _read_at_most(path: str, limit: int) -> str:
+    """A file's text, read only until it is longer than limit characters"""
+    parts = []
+    length = 0
+    texts = iter_text(path)
+    try:
+        for text in texts:
+            parts.append(text)
+            length += len(text)
+            if length > limit:
+                break
+    finally:
+        texts.close()
+    return "".join(parts)
+
+
+def attach_files(
+    chatbot: Chatbot,
+    message: str,
+    patterns: List[str],
+    base_dir: Optional[str] = None,
+    progress: Callable[[str], None] = print,
+) -> str:
+    """Build the message for a request about one or more files.
+
+    Small inputs are attached inline. Larger inputs are split into token-sized
+    chunks that are summarized by concurrent map requests; the returned message
+    asks the model to answer from those notes (the reduce step).
+    """
+    paths = expand_paths(patterns, base_dir)
+    if not paths:
+        return f"{message}\n(Error: No files match {' '.join(patterns)})"
+
+    errors = []
+    readable = []
+    sizes = {}
+    for path in paths:
+        try:
+            # Binary files are dropped before sizing, so they cannot make a small input look large
+            if is_binary(_sniff(path)):
+                errors.append(f"(Error: {path} appears to be binary)")
+                continue
+            sizes[path] = _estimated_size(path)
+            readable.append(path)
+        except FileNotFoundError:
+            errors.append(f"(Error: File not found: {path})")
+        except PermissionError:
+            errors.append(f"(Error: Permission denied accessing {path})")
+        except (OSError, EOFError, lzma.LZMAError) as e:
+            errors.append(f"(Error reading file {path}: {str(e)})")
+
+    chunk_chars = config.INGEST_CHUNK_TOKENS * CHARS_PER_TOKEN
+    total_chars = sum(sizes.values())
+
+    # Everything fits in one request. Compressed sizes are only estimates, so the
+    # text is read up to the limit and a larger input goes on to the chunked path.
+    underestimated = False
+    if total_chars <= chunk_chars:
+        sections = []
+        notes = []
+        room = chunk_chars
+        for path in readable:
+            try:
+                text = _read_at_most(path, room)
+            except (ValueError, UnicodeDecodeError):
+                notes.append(f"(Error: {path} appears to be binary)")
+                continue
+            except OSError as e:
+                notes.append(f"(Error reading file {path}: {str(e)})")
+                continue
+            if len(text) > room:
+                underestimated = True
+                break
+            room -= len(text)
+            sections.append(_fence(path, text))
+        else:
+            return "\n\n".join(part for part in [message, *sections, *errors, *notes] if part)
+
+    # Map: summarize chunks concurrently, a bounded number at a time
+    request = message or "Summarize the input."
+    source = f"{len(readable)} file(s)"
+
+    def chunks() -> Iterator[tuple[str, str]]:
+        count = 0
+        read = 0
+        for index, path in enumerate(readable):
+            try:
+                for chunk in iter_chunks(path, chunk_chars):
+                    count += 1
+                    if count > config.INGEST_MAX_CHUNKS:
+                        dropped = total_chars - read
+                        skipped = len(readable) - index - 1
+                        amount = (
+                            f"~{dropped // CHARS_PER_TOKEN:,} tokens (~{100 * dropped // total_chars}%)"
+                            if dropped > 0 and not underestimated else "the rest of the input (size unknown)"
+                        )
+                        note = (
+                            f"Input truncated after {config.INGEST_MAX_CHUNKS} parts (INGEST_MAX_CHUNKS): "
+                            f"{amount} not analyzed, from the rest of {path}"
+                            + (f" and {skipped} more file(s)" if skipped else "")
+                        )
+                        progress(f"⚠️ {note}")
+                        errors.append(f"({note})")
+                        return
+                    read += len(chunk)
+                    yield path, chunk
+            except (ValueError, UnicodeDecodeError):
+                errors.append(f"(Error: {path} appears to be binary)")
+            except OSError as e:
+                errors.append(f"(Error reading file {path}: {str(e)})")
+
+    if underestimated:
+        total = "several"  # Compressed input larger than its estimate; its real size is not known yet
+        progress(f"Input is large (over ~{chunk_chars // CHARS_PER_TOKEN:,} tokens); analyzing it in parts...")
+    else:
+        expected = min(config.INGEST_MAX_CHUNKS, -(-total_chars // chunk_chars))
+        total = f"~{expected}"
+        progress(f"Input is large (~{total_chars // CHARS_PER_TOKEN:,} tokens); analyzing ~{expected} parts...")
+    system_role = chatbot.messages[0]["content"]
+
+    def map_chunk(part: int, path: str, chunk: str) -> str:
+        prompt = MAP_PROMPT.format(
+            part=part, total=total, source=source, request=request, content=_fence(path, chunk)
+        )
+        return Chatbot(system_role).get_response(prompt)
+
+    failures = []  # Errors returned instead of notes
+
+    def merge(group: List[str]) -> str:
+        prompt = REDUCE_PROMPT.format(
+            request=f"Merge these notes, keeping everything relevant to: {request}",
+            files=source,
+            total=len(group),
+            notes="\n\n".join(group),
+        )
+        merged = Chatbot(system_role).get_response(prompt)
+        if merged.startswith("\nError:"):
+            failures.append(merged.strip())
+            return "\n\n".join(group)  # Keep the notes unmerged rather than lose them
+        return f"[Combined notes]\n{merged.strip()}"
+
+    def collect(part: int, path: str, future):
+        text = future.result()
+        if text.startswith("\nError:"):
+            failures.append(text.strip())
+        else:
+            notes.append(_note(part, path, text))
+
+    notes = []
+    parts = 0
+    with ThreadPoolExecutor(max_workers=config.INGEST_WORKERS) as pool:
+        pending = []
+        for part, (path, chunk) in enumerate(chunks(), start=1):
+            parts = part
+            pending.append((part, path, pool.submit(map_chunk, part, path, chunk)))
+            # Bound memory: wait for the oldest part before reading far ahead
+            while len(pending) >= config.INGEST_WORKERS * 2:
+                collect(*pending.pop(0))
+        for item in pending:
+            collect(*item)
+    if failures:
+        note = f"{len(failures)} of {parts} parts could not be analyzed ({failures[0]})"
+        progress(f"❌ {note}")
+        errors.append(f"({note})")
+    if not notes:
+        return "\n\n".join(part for part in [message, *errors] if part)
+    failed = len(failures)
+
+    # Reduce: combine notes in groups until they fit in one request
+    while len(notes) > 1 and sum(map(len, notes)) > chunk_chars:
+        groups, group, size = [], [], 0
+        for note in notes:
+            if group and size + len(note) > chunk_chars:
+                groups.append(group)
+                group, size = [], 0
+            group.append(note)
+            size += len(note)
+        groups.append(group)
+        if len(groups) == len(notes):
+            break  # Each note is already too large to pair up; send them as they are
+        progress(f"Combining {len(notes)} notes in {len(groups)} groups...")
+        with ThreadPoolExecutor(max_workers=config.INGEST_WORKERS) as pool:
+            notes = list(pool.map(merge, groups))
+    if len(failures) > failed:
+        note = f"{len(failures) - failed} note merge(s) failed; their notes were sent unmerged"
+        progress(f"❌ {note}")
+        errors.append(f"({note})")
+
+    return "\n\n".join(
+        [REDUCE_PROMPT.format(request=request, files=source, total=len(notes), notes="\n\n".join(notes)), *errors]
+    )
+
+
+def _note(part: int, path: str, text: str) -> str:
+    return f"[Part {part} - {path}]\n{text.strip()}"
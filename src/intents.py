@@ -0,0 +1,290 @@
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import defaultdict, deque
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Dict, List, Optional
+from . import config
+from .utils import OS_COMMANDS
+
+# Phrases for the commands in OS_COMMANDS (English and Vietnamese).
+# Commands that need an argument, like file_content, are left to the model.
+INTENT_PHRASES = {
+    "file_list": [
+        "list files", "list all files", "list the files", "show files", "show all files",
+        "show me all files", "show me the files here", "what files are here",
+        "list directory", "list directory contents", "list folder contents",
+        "hiển thị các file", "hiển thị danh sách file", "hiển thị tất cả file",
+        "liệt kê file", "liệt kê các file", "liệt kê thư mục", "xem các file",
+        "danh sách file", "xem danh sách tệp", "liệt kê tệp",
+    ],
+    "pwd": [
+        "current directory", "what is my current directory", "what's my current directory",
+        "where am i", "print working directory", "show current directory", "current folder",
+        "thư mục hiện tại", "đang ở thư mục nào", "xem thư mục hiện tại",
+    ],
+    "sysinfo": [
+        "system info", "system information", "show system info", "show system information",
+        "thông tin hệ thống", "xem thông tin hệ thống", "hiển thị thông tin hệ thống",
+    ],
+    "memory": [
+        "check memory", "memory usage", "show memory", "show memory usage", "ram usage",
+        "how much memory", "kiểm tra bộ nhớ", "xem bộ nhớ", "kiểm tra ram", "bộ nhớ",
+        "dung lượng bộ nhớ",
+    ],
+    "disk": [
+        "disk space", "check disk space", "disk usage", "free disk space", "show disk space",
+        "kiểm tra ổ đĩa", "dung lượng ổ đĩa", "dung lượng đĩa", "xem ổ đĩa",
+    ],
+    "clear": [
+        "clear screen", "clear the screen", "clear terminal", "clear the terminal",
+        "xóa màn hình", "làm sạch màn hình",
+    ],
+}
+
+# Words that do not change which command is meant
+FILLER_WORDS = {
+    "please", "me", "the", "can", "you", "could", "i", "want", "to", "my", "a", "now", "here",
+    "hay", "giup", "toi", "cho", "minh", "xin", "vui", "long", "di", "nhe", "o", "day",
+}
+
+# How alike two words must be to count as the same word (so typos like 'spce' still match)
+WORD_SIMILARITY = 0.75
+
+# "User: "..." -> COMMAND: ..." lines in the CLI Assistant role prompt
+EXAMPLE_PATTERN = re.compile(r'User: "(.+?)" -> COMMAND: (.+)')
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents (so 'xóa' and 'xoa' match) and collapse punctuation"""
+    text = unicodedata.normalize("NFD", text.lower().replace("đ", "d"))
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return " ".join(re.findall(r"[a-z0-9']+", text))
+
+
+@lru_cache(maxsize=4096)
+def _same_word(word: str, other: str) -> bool:
+    if word == other:
+        return True
+    if abs(len(word) - len(other)) > 2:
+        return False  # Too different for WORD_SIMILARITY; skips most comparisons
+    return SequenceMatcher(None, word, other).ratio() >= WORD_SIMILARITY
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _Automaton:
+    """Aho-Corasick automaton that finds every known phrase in one pass"""
+
+    def __init__(self, patterns: List[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[int]] = [[]]
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for ch in pattern:
+                if ch not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[state][ch] = len(self.goto) - 1
+                state = self.goto[state][ch]
+            self.out[state].append(index)
+
+        # Breadth-first pass to build failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def search(self, text: str) -> List[int]:
+        """Return the indexes of all patterns found in text"""
+        found = []
+        state = 0
+        for ch in text:
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            found.extend(self.out[state])
+        return found
+
+
+class IntentResolver:
+    """Resolve simple command requests locally instead of asking the model.
+
+    Known phrases are matched exactly with an Aho-Corasick automaton and
+    approximately with character trigrams. Commands the user confirmed are
+    remembered on disk and resolve with a single dictionary lookup.
+    """
+
+    def __init__(self, learned_path: Optional[str] = None):
+        self.learned_path = learned_path or os.path.join(config.CACHE_DIR, "intents.json")
+        self.phrases: List[str] = []  # Normalized phrases
+        self.commands: List[Dict[str, str]] = []  # os_type -> command, per phrase
+        self._trigrams: List[set] = []
+        self._words: List[set] = []  # Content words, per phrase
+        self._trigram_index: Dict[str, List[int]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+        for key, phrases in INTENT_PHRASES.items():
+            commands = {os_type: table[key] for os_type, table in OS_COMMANDS.items()}
+            for phrase in phrases:
+                self._add_phrase(phrase, commands)
+        for phrase, commands in self._role_examples():
+            self._add_phrase(phrase, commands)
+
+        # Phrases are padded so matches always start and end on word boundaries
+        self.automaton = _Automaton([f" {phrase} " for phrase in self.phrases])
+        self._learned_mtime = None
+        self.learned = self._load_learned()
+
+    @staticmethod
+    def _role_examples() -> List[tuple[str, Dict[str, str]]]:
+        """Collect the examples from the CLI Assistant role prompt"""
+        examples = defaultdict(dict)
+        os_types = ["windows"]
+        for line in config.ROLES["5"].splitlines():
+            if line.startswith("Examples for Windows"):
+                os_types = ["windows"]
+            elif line.startswith("Examples for Unix"):
+                os_types = ["linux", "darwin"]
+            match = EXAMPLE_PATTERN.search(line)
+            if match:
+                for os_type in os_types:
+                    examples[match.group(1)][os_type] = match.group(2).strip()
+        return list(examples.items())
+
+    def _add_phrase(self, phrase: str, commands: Dict[str, str]):
+        phrase = normalize(phrase)
+        index = len(self.phrases)
+        self.phrases.append(phrase)
+        self.commands.append(commands)
+        words = self._content_words(phrase)
+        self._words.append(set(words))
+        grams = _trigrams(" ".join(words))
+        self._trigrams.append(grams)
+        for gram in grams:
+            self._trigram_index[gram].append(index)
+
+    def _load_learned(self) -> Dict[str, Dict[str, str]]:
+        try:
+            self._learned_mtime = os.stat(self.learned_path).st_mtime
+            with open(self.learned_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _refresh_learned(self):
+        """Reload commands learned by other processes (a long-running daemon needs this)"""
+        try:
+            mtime = os.stat(self.learned_path).st_mtime
+        except OSError:
+            return
+        if mtime != self._learned_mtime:
+            self.learned = self._load_learned()
+
+    @staticmethod
+    def _content_words(text: str) -> List[str]:
+        return [word for word in text.split() if word not in FILLER_WORDS]
+
+    def _coverage(self, query_words: List[str], index: int) -> float:
+        """Share of the request's content words that the phrase accounts for"""
+        phrase_words = self._words[index]
+        covered = sum(
+            1 for word in query_words
+            if word in phrase_words or any(_same_word(word, other) for other in phrase_words)
+        )
+        return covered / len(query_words)
+
+    def resolve(self, text: str, os_type: str, min_confidence: float = 0.0) -> Optional[tuple[str, float]]:
+        """Return (command, confidence) for the best local match, or None.
+
+        Approximate matches less similar than min_confidence are not scored.
+        """
+        query = normalize(text)
+        if not query:
+            return None
+
+        # Commands the user confirmed before
+        self._refresh_learned()
+        learned = self.learned.get(os_type, {}).get(query)
+        if learned:
+            return learned, 1.0
+
+        query_words = self._content_words(query)
+        if not query_words:
+            return None
+        best: Optional[tuple[str, float]] = None
+
+        # Every content word the phrase does not account for ("show current directory
+        # *size*") may change the command, so confidence falls with the square of the
+        # uncovered share
+
+        # Exact phrases
+        for index in set(self.automaton.search(f" {query} ")):
+            command = self.commands[index].get(os_type)
+            if command:
+                confidence = self._coverage(query_words, index) ** 2
+                if best is None or confidence > best[1]:
+                    best = (command, confidence)
+
+        # Approximate phrases: Dice coefficient over character trigrams
+        grams = _trigrams(" ".join(query_words))
+        shared = defaultdict(int)
+        for gram in grams:
+            for index in self._trigram_index.get(gram, ()):
+                shared[index] += 1
+        candidates = sorted(
+            ((2 * count / (len(grams) + len(self._trigrams[index])), index) for index, count in shared.items()),
+            reverse=True,
+        )
+        for similarity, index in candidates:
+            if similarity < min_confidence or (best is not None and similarity <= best[1]):
+                break  # Confidence never exceeds similarity, so no later candidate can win
+            command = self.commands[index].get(os_type)
+            if command:
+                confidence = similarity * self._coverage(query_words, index) ** 2
+                if best is None or confidence > best[1]:
+                    best = (command, confidence)
+
+        return best
+
+    def remember(self, text: str, command: str, os_type: str):
+        """Store a confirmed command so the same request resolves locally next time"""
+        query = normalize(text)
+        if not query:
+            return
+        with self._lock:
+            self.learned.setdefault(os_type, {})[query] = command
+            try:
+                os.makedirs(os.path.dirname(self.learned_path), exist_ok=True)
+                tmp_path = f"{self.learned_path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.learned, f, ensure_ascii=False, indent=1)
+                os.replace(tmp_path, self.learned_path)
+                self._learned_mtime = os.stat(self.learned_path).st_mtime
+            except OSError:
+                pass  # Learning is an optimization; never fail the command because of it
+
+
+_resolver: Optional[IntentResolver] = None
+
+
+def get_resolver() -> IntentResolver:
+    """Return the process-wide resolver, building its index on first use"""
+    global _resolver
+    if _resolver is None:
+        _resolver = IntentResolver()
+    return _resolver
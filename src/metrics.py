@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+from . import config
+
+_write_lock = threading.Lock()
+
+# Fields summarized per role and model by the stats command
+LATENCY_FIELDS = ("total", "ttfb", "ttft")
+
+
+def role_of(system_role: str) -> str:
+    """Role number for a system prompt ("custom" for prompts not in config.ROLES)"""
+    return next((number for number, role in config.ROLES.items() if role == system_role), "custom")
+
+
+def _rotate(path: str):
+    """Shift path to path.1, path.1 to path.2, ... keeping METRICS_BACKUPS old files"""
+    for index in range(config.METRICS_BACKUPS - 1, 0, -1):
+        older = f"{path}.{index}"
+        if os.path.exists(older):
+            os.replace(older, f"{path}.{index + 1}")
+    os.replace(path, f"{path}.1")
+
+
+def record(entry: Dict):
+    """Append one request's metrics to the JSONL log (and the Prometheus textfile if enabled).
+
+    Metrics must never break a request, so I/O errors are ignored.
+    """
+    if not config.METRICS:
+        return
+    entry = {"time": round(time.time(), 3), **entry}
+    path = config.METRICS_FILE
+    try:
+        with _write_lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path) and os.path.getsize(path) > config.METRICS_MAX_BYTES:
+                _rotate(path)
+            # One short append per record, so concurrent processes do not interleave lines
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        if config.METRICS_PROMETHEUS_FILE:
+            write_prometheus(config.METRICS_PROMETHEUS_FILE, load_recent())
+    except OSError:
+        pass
+
+
+def load_recent(limit: Optional[int] = None) -> List[Dict]:
+    """Return up to limit of the newest records, oldest first, reading the log from the end"""
+    limit = limit or config.METRICS_WINDOW
+    path = config.METRICS_FILE
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            data = b""
+            while position > 0 and data.count(b"\n") <= limit:
+                step = min(64 * 1024, position)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+    except OSError:
+        return []
+    records = []
+    for line in data.splitlines()[-limit:]:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue  # A line cut in half by the seek or a concurrent write
+    return records
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of values (which must not be empty)"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def summarize(records: Iterable[Dict]) -> List[Dict]:
+    """p50/p95 latencies and throughput per (role, model) for API requests"""
+    groups = defaultdict(list)
+    for entry in records:
+        groups[(entry.get("role", "?"), entry.get("model", "?"))].append(entry)
+
+    summary = []
+    for (role, model), entries in sorted(groups.items()):
+        requests = [e for e in entries if not e.get("cache_hit") and not e.get("error")]
+        row = {
+            "role": role,
+            "model": model,
+            "requests": len(requests),
+            "cache_hits": sum(1 for e in entries if e.get("cache_hit")),
+            "errors": sum(1 for e in entries if e.get("error")),
+        }
+        for field in LATENCY_FIELDS:
+            values = [e[field] for e in requests if e.get(field) is not None]
+            if values:
+                row[f"{field}_p50"] = percentile(values, 0.5)
+                row[f"{field}_p95"] = percentile(values, 0.95)
+        rates = [e["tokens_per_second"] for e in requests if e.get("tokens_per_second")]
+        if rates:
+            row["tokens_per_second_p50"] = percentile(rates, 0.5)
+        row["completion_tokens"] = sum(e.get("completion_tokens") or 0 for e in requests)
+        # Hedged requests are counted under the model that answered
+        row["hedged"] = sum(1 for e in entries if e.get("hedged"))
+        row["hedge_wins"] = sum(1 for e in entries if e.get("hedge_won"))
+        row["hedge_saved"] = sum(e.get("hedge_saved") or 0 for e in entries)
+        summary.append(row)
+    return summary
+
+
+def write_prometheus(path: str, records: List[Dict]):
+    """Write a node_exporter textfile with per role/model quantiles over the recent window"""
+    lines = [
+        "# HELP chatbot_request_seconds Request latency over the most recent requests.",
+        "# TYPE chatbot_request_seconds gauge",
+    ]
+    counts = ["# HELP chatbot_requests Requests in the recent window.", "# TYPE chatbot_requests gauge"]
+    for row in summarize(records):
+        labels = f'role="{row["role"]}",model="{row["model"]}"'
+        for field in LATENCY_FIELDS:
+            for quantile in ("p50", "p95"):
+                value = row.get(f"{field}_{quantile}")
+                if value is not None:
+                    lines.append(
+                        f'chatbot_request_seconds{{{labels},phase="{field}",quantile="0.{quantile[1:]}"}} {value:.6f}'
+                    )
+        for kind in ("requests", "cache_hits", "errors", "hedged", "hedge_wins"):
+            counts.append(f'chatbot_requests{{{labels},kind="{kind}"}} {row[kind]}')
+    # Write then rename so the exporter never reads a half-written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines + counts) + "\n")
+    os.replace(tmp_path, path)
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import threading
+import zlib
+from typing import Dict, List, Optional
+from . import config
+
+START = b'{"messages":['
+
+
+def encode_message(message: Dict) -> bytes:
+    return json.dumps(message, ensure_ascii=False).encode("utf-8")
+
+
+class BodyEncoder:
+    """Builds JSON request bodies for one conversation, encoding each message once.
+
+    "messages" comes first in the body, so everything before the newest
+    message is a prefix shared with the previous request. The prefix is kept
+    encoded, hashed (for cache keys) and, once compression is used,
+    gzip-compressed, and each is extended by the messages added since. A turn
+    therefore costs the new messages, not the whole history. When history is
+    trimmed the prefix is rebuilt from the messages' existing encodings.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.messages: List[Dict] = []  # Messages in the prefix, compared by identity
+        self.encoded: List[bytes] = []
+        self.prefix = bytearray(START)
+        self.hash = hashlib.sha256()
+        self.compressor = None  # Started on first use; holds the compressed prefix's state
+        self.compressed = bytearray()
+
+    def _append(self, message: Dict, encoded: bytes):
+        piece = (b"," if self.messages else b"") + encoded
+        self.messages.append(message)
+        self.encoded.append(encoded)
+        self.prefix += piece
+        self.hash.update(piece)
+        if self.compressor is not None:
+            self.compressed += self.compressor.compress(piece)
+
+    def _sync(self, messages: List[Dict]):
+        """Make the prefix hold every message but the last"""
+        count = len(messages) - 1
+        known = len(self.messages)
+        if count >= known and all(a is b for a, b in zip(self.messages, messages)):
+            for message in messages[known:count]:
+                self._append(message, encode_message(message))
+            return
+        # Trimmed or replaced: start over, reusing the encodings of messages still present
+        old = dict(zip(map(id, self.messages), self.encoded))
+        kept = self.messages  # Keeps old messages alive so their ids stay unique
+        compress = self.compressor is not None
+        self._reset()
+        if compress:
+            self._start_compression()
+        for message in messages[:count]:
+            self._append(message, old.get(id(message)) or encode_message(message))
+
+    def _start_compression(self):
+        # wbits 31: gzip container, as Content-Encoding: gzip expects
+        self.compressor = zlib.compressobj(config.COMPRESS_LEVEL, zlib.DEFLATED, 31)
+        self.compressed = bytearray(self.compressor.compress(bytes(self.prefix)))
+
+    def _tail(self, payload: Dict) -> bytes:
+        messages = payload["messages"]
+        rest = {key: value for key, value in payload.items() if key != "messages"}
+        fields = json.dumps(rest, ensure_ascii=False).encode("utf-8")[1:] if rest else b"}"
+        separator = b"," if len(messages) > 1 else b""
+        return separator + encode_message(messages[-1]) + (b"]," if rest else b"]") + fields
+
+    def encode(self, payload: Dict, compress: bool = False) -> tuple[bytes, Optional[str]]:
+        """Return (body, content encoding). Bodies below COMPRESS_MIN_BYTES are never compressed"""
+        with self.lock:
+            self._sync(payload["messages"])
+            tail = self._tail(payload)
+            if not compress or len(self.prefix) + len(tail) < config.COMPRESS_MIN_BYTES:
+                return bytes(self.prefix) + tail, None
+            if self.compressor is None:
+                self._start_compression()
+            compressor = self.compressor.copy()
+            return bytes(self.compressed) + compressor.compress(tail) + compressor.flush(), "gzip"
+
+    def digest(self, messages: List[Dict]) -> str:
+        """sha256 of the encoded messages, for cache keys"""
+        with self.lock:
+            self._sync(messages)
+            digest = self.hash.copy()
+            digest.update((b"," if len(messages) > 1 else b"") + encode_message(messages[-1]))
+            return digest.hexdigest()
@@ -0,0 +1,246 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from . import config
+
+# Where a turn's time went, by the file (or builtin) of each function; the first match wins
+CATEGORIES = (
+    ("network", ("_socket", "socket.py", "ssl", "http/client", "urllib3/", "requests/", "select")),
+    ("json", ("json/", "_json")),
+    ("rendering", ("rich/", "pygments/", "markdown_it/", "src/display.py")),
+    ("regex", ("/re/__init__.py", "/re/_", "re.Pattern", "_sre", "sre_")),
+    ("subprocess", ("subprocess", "fork_exec", "waitpid", "src/shell.py")),
+    ("imports", ("<frozen importlib", "marshal.loads", "_imp.")),
+    ("waiting", ("threading.py", "queue.py", "_thread.lock", "time.sleep")),
+)
+
+MAX_STACK_DEPTH = 64
+
+
+def category(func: Tuple[str, int, str]) -> str:
+    filename, _, name = func
+    where = f"{filename}:{name}".replace(os.sep, "/")
+    for label, patterns in CATEGORIES:
+        if any(pattern in where for pattern in patterns):
+            return label
+    return "other"
+
+
+def _frame(func: Tuple[str, int, str]) -> str:
+    filename, line, name = func
+    if filename == "~":
+        return name  # A builtin such as <method 'recv_into' of '_socket.socket' objects>
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ",")
+
+
+def collapsed_stacks(stats: pstats.Stats) -> Dict[Tuple[str, ...], float]:
+    """Seconds of own time per call stack, for flame graphs.
+
+    cProfile only keeps caller/callee totals, not whole stacks, so stacks are
+    rebuilt from the call graph: a function's time reached through a caller
+    is split between its own time and its callees in the proportions cProfile
+    measured overall. Branches below 0.01% of the total are left out.
+    """
+    entries = stats.stats
+    children = defaultdict(list)
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            children[caller].append((func, edge[3]))
+    threshold = sum(entry[2] for entry in entries.values()) / 10000
+    stacks: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def walk(func, seconds: float, path: Tuple[str, ...], on_path: frozenset):
+        cumulative = entries[func][3]
+        if cumulative <= 0:
+            return
+        path += (_frame(func),)
+        stacks[path] += seconds * min(1.0, entries[func][2] / cumulative)
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for child, edge_seconds in children[func]:
+            share = seconds * edge_seconds / cumulative
+            if share >= threshold and child not in on_path:  # Recursion is folded into the first call
+                walk(child, share, path, on_path | {child})
+
+    for func, entry in entries.items():
+        if not entry[4]:  # Called from outside the profiled code
+            walk(func, entry[3], (), frozenset((func,)))
+    return stacks
+
+
+class Turn:
+    """One profiled turn: a cProfile per thread that worked on it, plus the allocations made.
+
+    From Python 3.12 cProfile is built on sys.monitoring, which sees every
+    thread but allows one active profiler per process: the turn's first
+    profile then covers its workers too, and a thread whose profiler cannot
+    be enabled (or another tool already profiling) is only timed.
+    """
+
+    def __init__(self, number: int, label: str):
+        self.number = number
+        self.label = label
+        self.profiles: List[Tuple[str, cProfile.Profile]] = []
+        self.timed: List[Tuple[str, float]] = []  # Threads without a profile of their own: (name, wall seconds)
+        self.active = 0
+        self.changed = threading.Condition()
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+
+    @contextmanager
+    def thread(self) -> Iterator[None]:
+        """Profile the calling thread for the block (e.g. the engine worker running the request)"""
+        name = threading.current_thread().name
+        profile: Optional[cProfile.Profile] = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # Another profiler is active (the turn's own on 3.12+, or a debugger)
+            profile = None
+        started = time.perf_counter()
+        with self.changed:
+            if profile is not None:
+                self.profiles.append((name, profile))
+            self.active += 1
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            with self.changed:
+                if profile is None:
+                    self.timed.append((name, time.perf_counter() - started))
+                self.active -= 1
+                self.changed.notify_all()
+
+    def wait_for_threads(self, timeout: float):
+        with self.changed:
+            self.changed.wait_for(lambda: self.active == 0, timeout)
+
+
+class TurnProfiler:
+    """Profiles turns one at a time (--profile, or 'profile on' in interactive mode).
+
+    Each turn writes turn-NNN.pstats (all its threads; open with pstats or
+    snakeviz), turn-NNN.collapsed (stacks for flamegraph.pl or speedscope) and
+    a section of summary.txt with the time per category, the top functions
+    and the largest allocation sites, into one directory per run.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or os.path.join(
+            config.PROFILE_DIR, time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        )
+        self.turns = 0
+        self.current: Optional[Turn] = None
+        self._main: Optional[ExitStack] = None
+        self._traced = False  # Whether tracemalloc was started here
+
+    def start(self, label: str):
+        if self.current is not None:
+            self.stop()
+        self.turns += 1
+        self.current = Turn(self.turns, label)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._traced = True
+        tracemalloc.reset_peak()
+        self._main = ExitStack()
+        self._main.enter_context(self.current.thread())
+
+    def stop(self):
+        """End the current turn, write its report and print a one-line summary"""
+        turn = self.current
+        if turn is None:
+            return
+        self.current = None
+        self._main.close()
+        turn.wait_for_threads(2.0)  # A worker may still be returning after the last delta
+        wall = time.perf_counter() - turn.started
+        cpu = time.process_time() - turn.cpu_started
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        if self._traced:
+            tracemalloc.stop()
+            self._traced = False
+        try:
+            categories = self._write(turn, wall, cpu, snapshot, peak)
+        except OSError as e:
+            print(f"❌ Could not write the profile: {str(e)}", file=sys.stderr)
+            return
+        spent = ", ".join(f"{label} {seconds:.2f} s" for label, seconds in categories if seconds >= 0.005)
+        # No .pstats file is written when nothing was profiled (categories are empty then)
+        saved = self._path(turn, "pstats") if categories else os.path.join(self.directory, "summary.txt")
+        print(
+            f"Profile: turn {turn.number} took {wall:.2f} s ({cpu:.2f} s CPU, peak {peak / 2**20:.1f} MB traced)"
+            f"{' - ' + spent if spent else ''} -> {saved}",
+            file=sys.stderr,
+        )
+
+    @contextmanager
+    def turn(self, label: str) -> Iterator[None]:
+        self.start(label)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def _path(self, turn: Turn, extension: str) -> str:
+        return os.path.join(self.directory, f"turn-{turn.number:03d}.{extension}")
+
+    def _write(self, turn: Turn, wall: float, cpu: float, snapshot: tracemalloc.Snapshot, peak: int) -> List[Tuple[str, float]]:
+        """Write the turn's files; returns its own time per category, largest first"""
+        os.makedirs(self.directory, exist_ok=True)
+        used = [(name, profile) for name, profile in turn.profiles if profile.getstats()]
+        profiles = [(name, pstats.Stats(profile)) for name, profile in used]
+        merged = pstats.Stats(*(profile for _, profile in used)) if used else None
+
+        with open(self._path(turn, "collapsed"), "w", encoding="utf-8") as f:
+            for name, stats in profiles:
+                for stack, seconds in collapsed_stacks(stats).items():
+                    if int(seconds * 1e6):
+                        f.write(f"{name};{';'.join(stack)} {int(seconds * 1e6)}\n")
+
+        totals: Dict[str, float] = defaultdict(float)
+        report = io.StringIO()
+        if merged is not None:
+            merged.dump_stats(self._path(turn, "pstats"))
+            for func, entry in merged.stats.items():
+                totals[category(func)] += entry[2]
+            listing = pstats.Stats(self._path(turn, "pstats"), stream=report).strip_dirs()
+            report.write("Top functions by cumulative time:\n")
+            listing.sort_stats("cumulative").print_stats(config.PROFILE_TOP)
+            report.write("Top functions by own time:\n")
+            listing.sort_stats("tottime").print_stats(config.PROFILE_TOP)
+        categories = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+        report.write("Largest allocations still held at the end of the turn:\n")
+        for stat in snapshot.statistics("lineno")[:config.PROFILE_TOP]:
+            frame = stat.traceback[0]
+            report.write(f"  {stat.size / 1024:9.1f} KiB {stat.count:7} blocks  {frame.filename}:{frame.lineno}\n")
+
+        label = " ".join(turn.label.split())
+        with open(os.path.join(self.directory, "summary.txt"), "a", encoding="utf-8") as f:
+            f.write(f"=== Turn {turn.number}: {label[:80]}{'…' if len(label) > 80 else ''}\n")
+            f.write(f"Wall {wall:.3f} s, CPU {cpu:.3f} s, peak traced memory {peak / 2**20:.1f} MB, "
+                    f"{len(profiles)} profile(s): {', '.join(name for name, _ in profiles) or 'none'}\n")
+            if turn.timed:
+                f.write("Timed only (calls appear in the profile above when one was active): "
+                        + ", ".join(f"{name} {seconds:.3f} s" for name, seconds in turn.timed) + "\n")
+            f.write("Own time by category (summed over threads; 'waiting' is a thread blocked on another): "
+                    + ", ".join(f"{label} {seconds:.3f} s" for label, seconds in categories) + "\n\n")
+            f.write(report.getvalue())
+            f.write("\n")
+        return categories
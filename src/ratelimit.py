@@ -0,0 +1,202 @@
+import json
+import os
+import random
+import re
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, Mapping, Optional
+from . import config
+
+if TYPE_CHECKING:
+    import requests
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Quotas are per minute, so 429s within a minute of the one that halved the rate are the same event
+THROTTLE_WINDOW = 60.0
+
+
+class RateLimitError(Exception):
+    """The quota will not reset within RATE_LIMIT_MAX_WAIT"""
+
+    def __init__(self, wait: float):
+        super().__init__(f"Rate limit exceeded. Try again in {wait:.0f}s.")
+        self.wait = wait
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse Groq reset values like '7.66s', '2m59.56s', '1h2m' or '120ms' into seconds"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)  # Retry-After is plain seconds
+    except ValueError:
+        pass
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+class RateLimiter:
+    """Token bucket shared by all chatbot processes through a locked state file.
+
+    The refill rate adapts: it is halved on a 429, at most once per throttling
+    event (the requests in flight at the time all report it), and grows with
+    the time spent succeeding since, by RATE_LIMIT_RECOVERY_RPM per minute, so
+    throughput settles just under the quota.
+    Remaining-request and remaining-token headers block the bucket until the
+    quota resets when they run out.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(config.CACHE_DIR, "ratelimit.json")
+
+    @contextmanager
+    def _state(self) -> Iterator[Dict]:
+        """Load the shared state under an exclusive lock and save it on exit"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.lock", "a+") as lock:
+            if os.name == "nt":
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+            else:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    state = {}
+                now = time.time()
+                state.setdefault("rpm", float(config.RATE_LIMIT_RPM))
+                state.setdefault("tokens", float(config.RATE_LIMIT_BURST))
+                state.setdefault("updated", now)
+                state.setdefault("blocked_until", 0.0)
+                state.setdefault("throttled_until", 0.0)  # Until then, 429s do not halve the rate again
+                state.setdefault("grown", now)  # When the rate last grew (or was halved)
+                yield state
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, self.path)
+            finally:
+                if os.name == "nt":
+                    lock.seek(0)
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+                else:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def acquire(self, tokens: int = 0):
+        """Block until a request (of about `tokens` prompt tokens) may be sent"""
+        while True:
+            with self._state() as state:
+                now = time.time()
+                rate = state["rpm"] / 60
+                state["tokens"] = min(
+                    float(config.RATE_LIMIT_BURST),
+                    state["tokens"] + (now - state["updated"]) * rate,
+                )
+                state["updated"] = now
+
+                wait = state["blocked_until"] - now
+                remaining_tokens = state.get("remaining_tokens")
+                if wait <= 0 and remaining_tokens is not None and remaining_tokens < tokens:
+                    wait = state.get("tokens_reset_at", 0) - now
+                if wait <= 0:
+                    if state["tokens"] >= 1:
+                        state["tokens"] -= 1
+                        if remaining_tokens is not None:
+                            state["remaining_tokens"] = remaining_tokens - tokens
+                        return
+                    wait = (1 - state["tokens"]) / rate
+
+            if wait > config.RATE_LIMIT_MAX_WAIT:
+                raise RateLimitError(wait)
+            time.sleep(wait)
+
+    def update(self, status_code: int, headers: Mapping[str, str]):
+        """Feed the limiter with the status and x-ratelimit-* headers of a response"""
+        with self._state() as state:
+            now = time.time()
+            if status_code == 429:
+                retry_after = parse_duration(headers.get("retry-after")) or config.RETRY_BASE_DELAY
+                if now >= state["throttled_until"]:
+                    state["rpm"] = max(1.0, state["rpm"] / 2)
+                    state["throttled_until"] = now + max(retry_after, THROTTLE_WINDOW)
+                    state["grown"] = now
+                state["blocked_until"] = max(state["blocked_until"], now + retry_after)
+            elif status_code < 400:
+                # Time idle counts for at most a minute, so a long pause does not jump to the maximum
+                minutes = min(max(now - state["grown"], 0.0), 60.0) / 60
+                state["rpm"] = min(
+                    float(config.RATE_LIMIT_MAX_RPM), state["rpm"] + minutes * config.RATE_LIMIT_RECOVERY_RPM
+                )
+                state["grown"] = now
+
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            reset_requests = parse_duration(headers.get("x-ratelimit-reset-requests"))
+            if remaining_requests is not None and reset_requests is not None and int(remaining_requests) <= 0:
+                state["blocked_until"] = max(state["blocked_until"], now + reset_requests)
+
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            reset_tokens = parse_duration(headers.get("x-ratelimit-reset-tokens"))
+            if remaining_tokens is not None:
+                state["remaining_tokens"] = int(remaining_tokens)
+                state["tokens_reset_at"] = now + (reset_tokens or 0)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(config.RETRY_MAX_DELAY, config.RETRY_BASE_DELAY * 2 ** attempt))
+
+
+_limiter: Optional[RateLimiter] = None
+
+
+def get_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter()
+    return _limiter
+
+
+def send_with_retry(send: Callable[[], "requests.Response"], tokens: int = 0) -> "requests.Response":
+    """Send a request through the shared limiter, retrying 429, 5xx and timeouts.
+
+    The last response is returned as is (callers still call raise_for_status);
+    the last network error is re-raised.
+    """
+    import requests
+
+    limiter = get_limiter()
+    for attempt in range(config.MAX_RETRIES + 1):
+        limiter.acquire(tokens)
+        try:
+            response = send()
+        except (requests.Timeout, requests.ConnectionError):
+            if attempt == config.MAX_RETRIES:
+                raise
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        limiter.update(response.status_code, response.headers)
+        if response.status_code not in RETRY_STATUS or attempt == config.MAX_RETRIES:
+            return response
+
+        delay = backoff_delay(attempt)
+        if response.status_code == 429:
+            retry_after = parse_duration(response.headers.get("retry-after"))
+            delay = max(delay, retry_after or 0)
+        response.content  # Drain the error body so the connection can be reused
+        if delay > config.RATE_LIMIT_MAX_WAIT:
+            raise RateLimitError(delay)
+        time.sleep(delay)
+    return response
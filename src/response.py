@@ -0,0 +1,105 @@
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Union
+
+
+class CodeBlock(NamedTuple):
+    """A fenced code block: language and the offsets of its code in the response text"""
+    lang: str
+    start: int
+    end: int
+
+
+@lru_cache(maxsize=64)
+def get_lexer(lang: str):
+    """Pygments lexer for a fence language, looked up once per process (None if unknown)"""
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+
+    try:
+        return get_lexer_by_name(lang)
+    except ClassNotFound:
+        return None
+
+
+class ParsedResponse:
+    """An answer plus an index of its code blocks, built in one pass.
+
+    Text can be fed in chunks while it streams; only complete lines are
+    scanned, each once. Code blocks are then sliced by offset, so copying
+    block N of a long answer does not re-scan it.
+    """
+
+    def __init__(self, text: str = ""):
+        self._parts: List[str] = []
+        self._joined: Optional[str] = ""
+        self._tail = ""  # Text after the last complete line
+        self._offset = 0  # Offset of _tail in the full text
+        self._fence: Optional[tuple[str, str, int]] = None  # (marker, lang, code start) of an open fence
+        self.blocks: List[CodeBlock] = []
+        self.lines = 0
+        if text:
+            self.feed(text)
+
+    @property
+    def text(self) -> str:
+        if self._joined is None:
+            self._joined = "".join(self._parts)
+            self._parts = [self._joined]
+        return self._joined
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def feed(self, chunk: str):
+        """Append streamed text and index any code blocks its complete lines finish"""
+        self._parts.append(chunk)
+        self._joined = None
+        self._tail += chunk
+        if "\n" in chunk:
+            self._scan(final=False)
+
+    def _scan(self, final: bool):
+        lines = self._tail.split("\n")
+        self._tail = lines.pop()  # Still being written
+        for line in lines:
+            self._scan_line(line, len(line) + 1)
+        if final and self._tail:
+            self._scan_line(self._tail, len(self._tail))
+            self._tail = ""
+
+    def _scan_line(self, raw: str, consumed: int):
+        pos = self._offset
+        self._offset += consumed
+        self.lines += 1
+        line = raw.strip()
+        if self._fence is None:
+            if line.startswith("```") or line.startswith("~~~"):
+                info = line[3:].strip("`~ ")
+                self._fence = (line[:3], info.split()[0] if info else "text", self._offset)
+        elif line.startswith(self._fence[0]) and not line.strip(self._fence[0][0]):
+            _, lang, start = self._fence
+            self.blocks.append(CodeBlock(lang, start, max(start, pos - 1)))
+            self._fence = None
+
+    def finish(self) -> "ParsedResponse":
+        """Index the last line once the answer is complete"""
+        self._scan(final=True)
+        return self
+
+    def code_blocks(self) -> List[tuple[str, str]]:
+        """(language, code) for every finished block, like utils.extract_code_blocks"""
+        return [self.code(index) for index in range(len(self.blocks))]
+
+    def code(self, index: int) -> tuple[str, str]:
+        block = self.blocks[index]
+        return block.lang, self.text[block.start:block.end].rstrip()
+
+
+def parse(response: Union[str, ParsedResponse]) -> ParsedResponse:
+    """Return response as a ParsedResponse, parsing plain text once"""
+    if isinstance(response, ParsedResponse):
+        return response
+    return ParsedResponse(response).finish()
@@ -0,0 +1,278 @@
+import fnmatch
+import hashlib
+import heapq
+import math
+import os
+import re
+import sqlite3
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+from . import config
+from .ingest import SKIP_DIRS, SNIFF_BYTES, is_binary
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    start_line INTEGER NOT NULL,
+    end_line INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_path ON chunks (path);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    chunk_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, chunk_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_chunk ON postings (chunk_id);
+"""
+
+# BM25 parameters (the usual defaults)
+K1 = 1.2
+B = 0.75
+
+WORD_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+CAMEL_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "do", "does", "for", "from", "how", "i", "in",
+    "is", "it", "me", "my", "of", "on", "or", "self", "that", "the", "this", "to", "what", "why",
+    "with", "you",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase identifiers plus their snake_case and camelCase parts"""
+    terms = []
+    for word in WORD_PATTERN.findall(text):
+        lower = word.lower()
+        if lower not in STOP_WORDS:
+            terms.append(lower)
+        parts = [p.lower() for piece in word.split("_") for p in CAMEL_PATTERN.findall(piece)]
+        if len(parts) > 1:
+            terms.extend(p for p in parts if len(p) > 1 and p not in STOP_WORDS)
+    return terms
+
+
+def project_root(start: str) -> Optional[str]:
+    """The nearest directory from start upwards that looks like a project, or None"""
+    home = os.path.expanduser("~")
+    directory = os.path.abspath(start)
+    while True:
+        if directory != home and any(
+            os.path.exists(os.path.join(directory, marker)) for marker in config.RETRIEVAL_PROJECT_MARKERS
+        ):
+            return directory
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def index_for(directory: str, current: Optional["CodeIndex"] = None) -> Optional["CodeIndex"]:
+    """The index of the project directory is in (current when it is already that one)"""
+    root = project_root(directory)
+    if root is None:
+        return None
+    if current is not None and current.root == root:
+        return current
+    return CodeIndex(root)
+
+
+def excluded(name: str) -> bool:
+    """Whether a file looks like it holds secrets (config.RETRIEVAL_EXCLUDE)"""
+    name = name.lower()
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in config.RETRIEVAL_EXCLUDE)
+
+
+class CodeIndex:
+    """BM25 index over a directory's text files, kept on disk (see index_for).
+
+    Files are split into fixed-size line windows (snippets). The index is
+    updated incrementally: only files whose mtime or size changed are
+    re-read, and deleted files are dropped. Between updates less than
+    RETRIEVAL_REFRESH seconds apart, only directory mtimes are checked.
+    """
+
+    def __init__(self, root: str, path: Optional[str] = None):
+        self.root = os.path.abspath(root)
+        digest = hashlib.sha1(self.root.encode("utf-8")).hexdigest()[:16]
+        self.path = path or os.path.join(config.CACHE_DIR, "index", f"{digest}.sqlite")
+        self._directories: Dict[str, float] = {}  # Directory mtimes at the last update
+        self._updated = 0.0
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open the database for one transaction (safe across threads and processes)"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            conn.executescript(SCHEMA)
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _directory_mtimes(self) -> Dict[str, float]:
+        """Modification times of the directories _walk visits (they change when files are added or removed)"""
+        mtimes = {}
+        for root, dirs, _ in os.walk(self.root):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith(".")]
+            try:
+                mtimes[root] = os.stat(root).st_mtime
+            except OSError:
+                continue
+        return mtimes
+
+    def _walk(self) -> Dict[str, tuple[float, int]]:
+        """Return {relative path: (mtime, size)} for candidate files under root"""
+        found = {}
+        total = 0
+        for root, dirs, files in os.walk(self.root):
+            dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS and not d.startswith("."))
+            for name in sorted(files):
+                if name.startswith(".") or excluded(name):
+                    continue
+                full = os.path.join(root, name)
+                try:
+                    stat = os.stat(full)
+                except OSError:
+                    continue
+                if stat.st_size > config.RETRIEVAL_MAX_FILE_BYTES:
+                    continue
+                found[os.path.relpath(full, self.root)] = (stat.st_mtime, stat.st_size)
+                total += stat.st_size
+                if len(found) >= config.RETRIEVAL_MAX_FILES or total >= config.RETRIEVAL_MAX_TOTAL_BYTES:
+                    return found
+        return found
+
+    @staticmethod
+    def _remove(conn: sqlite3.Connection, path: str):
+        conn.execute(
+            "DELETE FROM postings WHERE chunk_id IN (SELECT id FROM chunks WHERE path = ?)", (path,)
+        )
+        conn.execute("DELETE FROM chunks WHERE path = ?", (path,))
+        conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def _read_lines(self, path: str) -> Optional[List[str]]:
+        """Lines of a text file, or None for binary and undecodable files"""
+        try:
+            with open(os.path.join(self.root, path), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if is_binary(data[:SNIFF_BYTES]):
+            return None
+        try:
+            return data.decode("utf-8").splitlines()
+        except UnicodeDecodeError:
+            return None
+
+    def update(self) -> int:
+        """Re-index new and changed files and drop deleted ones. Returns files re-indexed"""
+        directories = self._directory_mtimes()
+        now = time.monotonic()
+        if directories == self._directories and now - self._updated < config.RETRIEVAL_REFRESH:
+            return 0  # Nothing added or removed, and files were checked moments ago
+        current = self._walk()
+        changed = 0
+        with self._connect() as conn:
+            indexed = {path: (mtime, size) for path, mtime, size in conn.execute("SELECT * FROM files")}
+            for path in indexed.keys() - current.keys():
+                self._remove(conn, path)
+            for path, stamp in current.items():
+                if indexed.get(path) == stamp:
+                    continue
+                changed += 1
+                if path in indexed:
+                    self._remove(conn, path)
+                # Unreadable files are still recorded so they are not retried every time
+                conn.execute("INSERT INTO files VALUES (?, ?, ?)", (path, *stamp))
+                lines = self._read_lines(path)
+                if not lines:
+                    continue
+                window = config.RETRIEVAL_SNIPPET_LINES
+                for start in range(0, len(lines), window):
+                    # The path is indexed too so questions can name files
+                    terms = Counter(tokenize(path + "\n" + "\n".join(lines[start:start + window])))
+                    if not terms:
+                        continue
+                    chunk_id = conn.execute(
+                        "INSERT INTO chunks (path, start_line, end_line, length) VALUES (?, ?, ?, ?)",
+                        (path, start + 1, min(start + window, len(lines)), sum(terms.values())),
+                    ).lastrowid
+                    conn.executemany(
+                        "INSERT INTO postings VALUES (?, ?, ?)",
+                        ((term, chunk_id, tf) for term, tf in terms.items()),
+                    )
+        self._directories, self._updated = directories, now
+        return changed
+
+    def search(self, query: str, top_k: int, min_match: float = 0.0) -> List[Dict]:
+        """Return the top_k snippets for query by BM25 score, best first.
+
+        Only snippets holding more than min_match of the query's distinct terms
+        are returned, so sharing one common word with the query is not enough.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._connect() as conn:
+            total, average = conn.execute("SELECT COUNT(*), AVG(length) FROM chunks").fetchone()
+            if not total:
+                return []
+            scores = Counter()
+            matched = Counter()  # Query terms each chunk holds
+            for term in terms:
+                postings = conn.execute(
+                    "SELECT p.chunk_id, p.tf, c.length FROM postings p JOIN chunks c ON c.id = p.chunk_id "
+                    "WHERE p.term = ?",
+                    (term,),
+                ).fetchall()
+                if not postings:
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf, length in postings:
+                    matched[chunk_id] += 1
+                    norm = K1 * (1 - B + B * length / average)
+                    scores[chunk_id] += idf * tf * (K1 + 1) / (tf + norm)
+            matches = (
+                (chunk_id, score) for chunk_id, score in scores.items() if matched[chunk_id] > min_match * len(terms)
+            )
+            best = heapq.nlargest(top_k, matches, key=lambda item: item[1])
+            results = []
+            for chunk_id, score in best:
+                path, start, end = conn.execute(
+                    "SELECT path, start_line, end_line FROM chunks WHERE id = ?", (chunk_id,)
+                ).fetchone()
+                results.append({"path": path, "start": start, "end": end, "score": score})
+        return results
+
+    def context_for(self, query: str) -> str:
+        """Relevant snippets for query formatted for the prompt, or "" if none match"""
+        try:
+            self.update()
+            results = self.search(query, config.RETRIEVAL_TOP_K, config.RETRIEVAL_MIN_MATCH)
+        except sqlite3.Error:
+            return ""  # A locked or broken index must not break the request
+        sections = []
+        for result in results:
+            lines = self._read_lines(result["path"])
+            if not lines:
+                continue
+            text = "\n".join(lines[result["start"] - 1:result["end"]])
+            file_ext = result["path"].split(".")[-1].lower()
+            fence = "````" if "```" in text else "```"  # Markdown files contain fences of their own
+            sections.append(
+                f"{result['path']} (lines {result['start']}-{result['end']}):\n{fence}{file_ext}\n{text}\n{fence}"
+            )
+        if not sections:
+            return ""
+        return "Possibly relevant code from the current directory:\n\n" + "\n\n".join(sections)
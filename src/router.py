@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, Optional, Tuple
+from . import config
+from .metrics import load_recent, percentile
+
+SIMPLE = "simple"
+COMPLEX = "complex"
+
+# (time, latency in seconds or None, failed) per request
+Sample = Tuple[float, Optional[float], bool]
+
+
+def classify(role_number: str, content: str, history_tokens: int) -> str:
+    """Whether a turn is simple enough for a small model, from cheap local features"""
+    if "```" in content:
+        return COMPLEX  # Code or an attached file
+    if len(content) > config.ROUTER_SIMPLE_MAX_CHARS:
+        return COMPLEX
+    if history_tokens > config.ROUTER_SIMPLE_MAX_HISTORY_TOKENS:
+        return COMPLEX  # A short follow-up in a long conversation still needs that context
+    if role_number in config.ROUTER_COMPLEX_ROLES:
+        return COMPLEX
+    return SIMPLE
+
+
+class ModelRouter:
+    """Picks a model per turn and moves traffic away from models that degrade.
+
+    Each kind of turn has a preference list in config.ROUTER_MODELS. A model
+    is skipped while, over the last ROUTER_WINDOW seconds, too many of its
+    requests failed or the median time to first token of its streamed
+    requests exceeded the budget for that kind of turn. Skipped models get no new
+    samples, so their bad ones age out and they are tried again after the
+    window. Samples are seeded from the metrics log, so short-lived inline
+    runs share what earlier runs observed.
+    """
+
+    def __init__(self):
+        self.samples: Dict[str, Deque[Sample]] = defaultdict(lambda: deque(maxlen=config.ROUTER_MAX_SAMPLES))
+        self.lock = threading.Lock()
+        if config.METRICS:
+            self._seed()
+
+    def _seed(self):
+        cutoff = time.time() - config.ROUTER_WINDOW
+        for entry in load_recent():
+            if entry.get("time", 0) < cutoff or entry.get("cache_hit") or entry.get("model") is None:
+                continue
+            error = entry.get("error")
+            if error == "RequestCancelled":
+                continue
+            status = error[len("HTTP "):] if error and error.startswith("HTTP ") else ""
+            if status.isdigit() and int(status) < 500 and int(status) != 429:
+                continue  # The request was at fault, not the model (as in Chatbot._observe)
+            # Only streamed requests log ttft; whole non-streamed answers are not latency samples
+            self.samples[entry["model"]].append((entry["time"], entry.get("ttft"), bool(error)))
+
+    def observe(self, model: str, latency: Optional[float], failed: bool):
+        with self.lock:
+            self.samples[model].append((time.time(), latency, failed))
+
+    def health(self, model: str) -> Dict:
+        """Error rate and median latency of model over the recent window"""
+        cutoff = time.time() - config.ROUTER_WINDOW
+        with self.lock:
+            recent = [sample for sample in self.samples[model] if sample[0] >= cutoff]
+        latencies = [latency for _, latency, failed in recent if latency is not None and not failed]
+        return {
+            "requests": len(recent),
+            "error_rate": sum(failed for _, _, failed in recent) / len(recent) if recent else 0.0,
+            "latency_p50": percentile(latencies, 0.5) if latencies else None,
+        }
+
+    def degraded(self, model: str, kind: str) -> bool:
+        health = self.health(model)
+        if health["requests"] < config.ROUTER_MIN_SAMPLES:
+            return False  # Too little to judge
+        if health["error_rate"] > config.ROUTER_MAX_ERROR_RATE:
+            return True
+        latency = health["latency_p50"]
+        return latency is not None and latency > config.ROUTER_LATENCY_BUDGET[kind]
+
+    def choose(self, role_number: str, content: str, history_tokens: int) -> Tuple[str, str]:
+        """Return (model, kind of turn) for a request"""
+        kind = classify(role_number, content, history_tokens)
+        models = config.ROUTER_MODELS[kind]
+        for model in models:
+            if not self.degraded(model, kind):
+                return model, kind
+        # Everything is degraded: use the one failing least
+        return min(models, key=lambda model: self.health(model)["error_rate"]), kind
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+    return _router
@@ -0,0 +1,209 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+from . import config
+from .history import estimate_tokens
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    title TEXT
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    role_number TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_session_role ON messages (session_id, role_number, id);
+"""
+
+# Full-text index over message contents; kept in sync by a trigger since
+# messages are only ever inserted
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (
+    content, content='messages', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+FETCH_SIZE = 64  # Rows read per step when loading a session newest first
+
+# Search snippets mark matches with these control characters for the display
+MATCH_START, MATCH_END = "\x02", "\x03"
+
+
+class SessionStore:
+    """Persistent chat sessions in SQLite.
+
+    Each message is inserted as it happens (nothing is rewritten), tagged with
+    the role it was sent under so every role keeps its own history. Search
+    uses an FTS5 index when the SQLite build has it and LIKE otherwise.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or config.SESSION_DB
+        self.fts = False
+        self._ready = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open the database for one transaction (safe across threads and processes)"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            if not self._ready:
+                conn.execute("PRAGMA journal_mode=WAL")  # Appends do not block readers
+                conn.executescript(SCHEMA)
+                try:
+                    conn.executescript(FTS_SCHEMA)
+                    self.fts = True
+                except sqlite3.OperationalError:
+                    self.fts = False  # SQLite built without FTS5
+                self._ready = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self) -> int:
+        """Start a new session and return its id"""
+        now = time.time()
+        with self._connect() as conn:
+            return conn.execute(
+                "INSERT INTO sessions (created_at, updated_at) VALUES (?, ?)", (now, now)
+            ).lastrowid
+
+    def exists(self, session_id: int) -> bool:
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone() is not None
+
+    def latest(self) -> Optional[int]:
+        """Id of the most recently used session"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT id FROM sessions ORDER BY updated_at DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def append(self, session_id: int, role_number: str, role: str, content: str):
+        """Record one message; the first user message becomes the session title"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO messages (session_id, role_number, role, content, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (session_id, role_number, role, content, now),
+            )
+            title = content.strip().splitlines()[0][:80] if role == "user" and content.strip() else None
+            conn.execute(
+                "UPDATE sessions SET updated_at = ?, title = COALESCE(title, ?) WHERE id = ?",
+                (now, title, session_id),
+            )
+
+    def last_role(self, session_id: int) -> Optional[str]:
+        """Role number of the newest message in a session"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT role_number FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT 1",
+                (session_id,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def load_history(self, session_id: int, role_number: str, budget: int) -> List[Dict]:
+        """Return the newest messages of one role that fit in budget tokens, oldest first.
+
+        Rows are read newest first in small batches and reading stops at the
+        budget, so resuming a long session does not load all of it.
+        """
+        messages = []
+        tokens = 0
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? AND role_number = ? "
+                "ORDER BY id DESC",
+                (session_id, role_number),
+            )
+            while rows := cursor.fetchmany(FETCH_SIZE):
+                for role, content in rows:
+                    tokens += estimate_tokens(content)
+                    if tokens > budget:
+                        break
+                    messages.append({"role": role, "content": content})
+                else:
+                    continue
+                break
+        messages.reverse()
+        # A resumed history starts with a user message, like a trimmed one
+        while messages and messages[0]["role"] != "user":
+            messages.pop(0)
+        return messages
+
+    def user_turns(self, session_id: int) -> List[tuple[str, str]]:
+        """(role number, content) of each user message in a session, oldest first"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT role_number, content FROM messages WHERE session_id = ? AND role = 'user' ORDER BY id",
+                (session_id,),
+            ).fetchall()
+
+    def list_sessions(self, limit: int = 20) -> List[Dict]:
+        """Most recently used sessions with their message counts"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT s.id, s.updated_at, s.title, COUNT(m.id) FROM sessions s "
+                "LEFT JOIN messages m ON m.session_id = s.id "
+                "GROUP BY s.id HAVING COUNT(m.id) > 0 ORDER BY s.updated_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [
+            {"id": row[0], "updated_at": row[1], "title": row[2] or "", "messages": row[3]}
+            for row in rows
+        ]
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        """Find past answers matching query, best matches first"""
+        with self._connect() as conn:
+            if self.fts:
+                sql = (
+                    "SELECT m.session_id, m.role_number, m.created_at, "
+                    "snippet(messages_fts, 0, char(2), char(3), '…', 16) "
+                    "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+                    "WHERE messages_fts MATCH ? AND m.role = 'assistant' "
+                    "ORDER BY bm25(messages_fts) LIMIT ?"
+                )
+                try:
+                    rows = conn.execute(sql, (query, limit)).fetchall()
+                except sqlite3.OperationalError:
+                    # Not valid FTS query syntax; search for it as a phrase
+                    phrase = '"' + query.replace('"', '""') + '"'
+                    rows = conn.execute(sql, (phrase, limit)).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT session_id, role_number, created_at, substr(content, 1, 160) FROM messages "
+                    "WHERE role = 'assistant' AND content LIKE ? ORDER BY id DESC LIMIT ?",
+                    (f"%{query}%", limit),
+                ).fetchall()
+        return [
+            {"session": row[0], "role": row[1], "created_at": row[2], "snippet": " ".join(row[3].split())}
+            for row in rows
+        ]
+
+
+def bind(chatbot, store: SessionStore, session_id: int, role_number: str):
+    """Restore a chatbot's history for this role and record every new message"""
+    chatbot.history.extend(store.load_history(session_id, role_number, chatbot.history.budget))
+
+    def record(role: str, content: str):
+        try:
+            store.append(session_id, role_number, role, content)
+        except sqlite3.Error:
+            pass  # A locked or read-only store must not break the conversation
+
+    chatbot.history.listener = record
@@ -0,0 +1,176 @@
+import codecs
+import json
+import os
+import queue
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+import uuid
+from typing import Callable, Optional
+from . import config
+from .utils import OutputBuffer, _echo_to, _stop
+
+# Prints the shell's exported variables; the interpreter is the only portable way to get them intact
+_DUMP_ENVIRONMENT = f"{shlex.quote(sys.executable)} -c 'import json, os; print(json.dumps(dict(os.environ)))'"
+
+
+class _Stream:
+    """Reads one of the shell's pipes and splits it into per-command output at the sentinel"""
+
+    def __init__(self, pipe, marker: str):
+        self.pipe = pipe
+        self.marker = "\n" + marker
+        self.pending = ""
+        self.buffer: Optional[OutputBuffer] = None
+        self.echo: Optional[Callable[[str], None]] = None
+        self.results: "queue.Queue[Optional[str]]" = queue.Queue()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _deliver(self, text: str):
+        if text and self.buffer is not None:
+            self.buffer.write(text)
+            if self.echo:
+                self.echo(text)
+
+    def _read(self):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while data := self.pipe.read1(4096):
+            self.pending += decoder.decode(data)
+            while (index := self.pending.find(self.marker)) != -1:
+                end = self.pending.find("\n", index + len(self.marker))
+                if end == -1:
+                    break  # The rest of the sentinel line has not arrived yet
+                self._deliver(self.pending[:index])
+                self.results.put(self.pending[index + len(self.marker):end].strip())
+                self.pending = self.pending[end + 1:]
+            else:
+                # Hold back what could be the start of a sentinel
+                safe = len(self.pending) - len(self.marker) + 1
+                if safe > 0:
+                    self._deliver(self.pending[:safe])
+                    self.pending = self.pending[safe:]
+        self._deliver(self.pending)
+        self.results.put(None)  # The shell exited
+
+
+class ShellSession:
+    """One long-lived shell that commands are sent to over a pipe.
+
+    Each command is followed by a sentinel line carrying its exit code and the
+    shell's working directory, so cd, export, aliases, globbing and pipelines
+    behave natively and persist between commands. A cancelled or timed-out
+    command takes the shell down with it; the next command starts a fresh
+    shell in the last known directory.
+    """
+
+    def __init__(self):
+        self.process: Optional[subprocess.Popen] = None
+        self.lock = threading.Lock()
+        self._environment: Optional[dict] = None
+
+    def _start(self):
+        self.marker = f"__chatbot_done_{uuid.uuid4().hex}__"
+        bash = shutil.which("bash")
+        args = [bash, "--noprofile", "--norc"] if bash else ["/bin/sh"]
+        self.process = subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=os.getcwd(),
+            start_new_session=True,  # Terminal Ctrl+C reaches us, not the shell
+        )
+        self.cwd = os.getcwd()
+        self.stdout = _Stream(self.process.stdout, self.marker)
+        self.stderr = _Stream(self.process.stderr, self.marker)
+        if bash:
+            self._send("shopt -s expand_aliases")
+
+    def _send(self, script: str):
+        self.process.stdin.write((script + "\n").encode("utf-8"))
+        self.process.stdin.flush()
+
+    def _wait(self, stream: _Stream, timeout: Optional[float]) -> Optional[str]:
+        try:
+            return stream.results.get(timeout=timeout)
+        except queue.Empty:
+            raise subprocess.TimeoutExpired(self.process.args, timeout)
+
+    def run(
+        self, command: str, timeout: Optional[float] = None, echo: bool = False
+    ) -> tuple[Optional[int], str, str, str]:
+        """Run command in the shell. Returns (exit code, stdout, stderr, status) like run_command"""
+        with self.lock:
+            if self.process is None or self.process.poll() is not None:
+                self._start()
+            self._environment = None  # Any command may export or unset variables
+            stdout = OutputBuffer(config.COMMAND_OUTPUT_MAX_CHARS)
+            stderr = OutputBuffer(config.COMMAND_OUTPUT_MAX_CHARS)
+            self.stdout.buffer, self.stdout.echo = stdout, _echo_to(sys.stdout) if echo else None
+            self.stderr.buffer, self.stderr.echo = stderr, _echo_to(sys.stderr) if echo else None
+
+            if os.getcwd() != self.cwd:
+                self._send(f"cd -- {shlex.quote(os.getcwd())}")  # The process changed directory itself
+                self.cwd = os.getcwd()
+
+            # eval keeps a syntax error in command from swallowing the sentinel lines
+            self._send(
+                f"eval {shlex.quote(command)} </dev/null\n"
+                "__chatbot_rc=$?\n"
+                f"printf '\\n%s %d %s\\n' '{self.marker}' \"$__chatbot_rc\" \"$PWD\"\n"
+                f"printf '\\n%s\\n' '{self.marker}' >&2"
+            )
+            try:
+                status_line = self._wait(self.stdout, timeout)
+                self._wait(self.stderr, timeout)
+            except subprocess.TimeoutExpired:
+                self._restart()
+                return None, stdout.getvalue(), stderr.getvalue(), "timeout"
+            except KeyboardInterrupt:
+                self._restart()
+                return None, stdout.getvalue(), stderr.getvalue(), "cancelled"
+
+            if status_line is None:  # The command ended the shell (e.g. exit)
+                code = self.process.wait()
+                self.process = None
+                return code, stdout.getvalue(), stderr.getvalue(), "exited"
+
+            code, _, cwd = status_line.partition(" ")
+            code = int(code)
+            if cwd and cwd != self.cwd:
+                try:
+                    os.chdir(cwd)  # Keep the prompt and file lookups in step with the shell
+                    self.cwd = cwd
+                except OSError:
+                    pass
+            return code, stdout.getvalue(), stderr.getvalue(), "exited"
+
+    def environment(self) -> Optional[dict]:
+        """The variables the shell exports, for commands run beside it (None before it starts)"""
+        if self.process is None or self.process.poll() is not None:
+            return None
+        if self._environment is None:
+            code, stdout, _, _ = self.run(_DUMP_ENVIRONMENT, 10)
+            try:
+                environment = json.loads(stdout) if code == 0 else None
+            except ValueError:
+                environment = None
+            self._environment = environment
+        return self._environment
+
+    def _restart(self):
+        """Stop the shell and whatever it is running; the next command starts a new one"""
+        _stop(self.process)
+        self.process = None
+
+
+_shell: Optional[ShellSession] = None
+
+
+def get_shell() -> ShellSession:
+    global _shell
+    if _shell is None:
+        _shell = ShellSession()
+    return _shell
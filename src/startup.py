@@ -0,0 +1,122 @@
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Inline queries to time, one per code path: the default role (CLI Assistant) and a chat role
+INLINE_QUERIES = ("hello", "1#hello")
+
+# Runs main.py as the shell would, with the request answered in-process instead of by the API
+INLINE_RUN = """
+import gzip, io, json, runpy, sys
+sys.path.insert(0, {root!r})
+from src import transport
+
+def post(url, **kwargs):
+    import requests  # Imported by the real request too, when the session is created
+    body = kwargs["data"]
+    if kwargs["headers"].get("Content-Encoding") == "gzip":
+        body = gzip.decompress(body)
+    usage = {{"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}}
+    if json.loads(body).get("stream"):
+        chunk = {{"choices": [{{"delta": {{"content": "Startup profile."}}}}], "usage": usage}}
+        content = b"data: " + json.dumps(chunk).encode() + b"\\n\\ndata: [DONE]\\n\\n"
+    else:
+        content = json.dumps({{"choices": [{{"message": {{"content": "Startup profile."}}}}], "usage": usage}}).encode()
+    response = requests.Response()
+    response.status_code, response.url, response.raw = 200, url, io.BytesIO(content)
+    return response, False
+
+transport.post = post
+sys.argv = [{main!r}, {query!r}]
+runpy.run_path({main!r}, run_name="__main__")
+"""
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _run(code: str, importtime: bool, cwd: str) -> tuple[float, str]:
+    """Run code in a fresh interpreter, with a cache directory of its own. Returns (wall seconds, stderr)"""
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    env = dict(
+        os.environ,
+        GROQ_API_KEY=os.environ.get("GROQ_API_KEY", "startup-profile"),
+        CHATBOT_CACHE_DIR=os.path.join(cwd, "cache"),  # Keeps the stub's answers out of metrics and caches
+        CHATBOT_NO_DAEMON="1",
+    )
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=cwd, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    return elapsed, result.stderr
+
+
+def _inline_run(query: str) -> str:
+    return INLINE_RUN.format(root=ROOT, main=os.path.join(ROOT, "main.py"), query=query)
+
+
+def parse_importtime(output: str) -> List[tuple[str, int, int, int]]:
+    """Parse -X importtime output into (module, self us, cumulative us, depth) after site startup"""
+    entries = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+
+    # Everything up to the top-level 'site' entry is interpreter startup, not ours
+    for index, (module, _, _, depth) in enumerate(entries):
+        if module == "site" and depth == 0:
+            return entries[index + 1:]
+    return entries
+
+
+def profile_startup(threshold_ms: float, top: int = 10) -> int:
+    """Run main.py on each of INLINE_QUERIES and print an import-time report of the slowest.
+
+    The request itself is answered in-process, so the report covers everything
+    a real inline query imports and does before and after it. Returns 1 if the
+    imports exceed threshold_ms.
+    """
+    runs = []
+    try:
+        with tempfile.TemporaryDirectory() as directory:  # Not a project, so retrieval finds nothing to index
+            interpreter_seconds, _ = _run("pass", importtime=False, cwd=directory)
+            for query in INLINE_QUERIES:
+                _, output = _run(_inline_run(query), importtime=True, cwd=directory)
+                inline_seconds, _ = _run(_inline_run(query), importtime=False, cwd=directory)
+                entries = parse_importtime(output)
+                import_ms = sum(cumulative for _, _, cumulative, depth in entries if depth == 0) / 1000
+                runs.append((import_ms, inline_seconds, query, entries))
+    except RuntimeError as e:
+        print(f"❌ Startup profile failed: {str(e)}")
+        return 1
+
+    print("Inline startup profile")
+    print(f"  Interpreter startup:  {interpreter_seconds * 1000:7.1f} ms")
+    for import_ms, inline_seconds, query, _ in runs:
+        print(f"\n  main.py {query!r}")
+        print(f"    Inline cold start:    {inline_seconds * 1000:7.1f} ms (wall clock, request stubbed)")
+        print(f"    Imports (importtime): {import_ms:7.1f} ms (threshold {threshold_ms:.0f} ms)")
+
+    import_ms, _, query, entries = max(runs)
+    print(f"\nTop-level imports of main.py {query!r} by cumulative time:")
+    top_level = sorted((e for e in entries if e[3] == 0), key=lambda e: e[2], reverse=True)
+    for module, _, cumulative, _ in top_level[:top]:
+        print(f"  {cumulative / 1000:7.1f} ms  {module}")
+
+    print("\nSlowest modules by self time:")
+    for module, self_us, _, _ in sorted(entries, key=lambda e: e[1], reverse=True)[:top]:
+        print(f"  {self_us / 1000:7.1f} ms  {module}")
+
+    if import_ms > threshold_ms:
+        print(f"\n❌ Import time {import_ms:.1f} ms exceeds the {threshold_ms:.0f} ms threshold")
+        return 1
+    print(f"\n✓ Import time is within the {threshold_ms:.0f} ms threshold")
+    return 0
@@ -0,0 +1,186 @@
+import socket
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING, Dict, Optional
+from . import config
+
+if TYPE_CHECKING:
+    import requests
+
+# One keep-alive session shared by every Chatbot instance in the process
+_session: Optional["requests.Session"] = None
+_session_lock = threading.Lock()
+
+# Connections that have already carried a request, used to report reuse
+_seen_connections = weakref.WeakSet()
+_seen_lock = threading.Lock()
+
+# URLs that rejected gzip-compressed request bodies
+_no_compression = set()
+
+_prewarm_thread: Optional[threading.Thread] = None
+_last_used = float("-inf")  # time.monotonic() of the last request or prewarm
+
+
+def _touch():
+    global _last_used
+    _last_used = time.monotonic()
+
+
+def _timed_pool_classes() -> Dict[str, type]:
+    """Connection pools whose new connections record DNS, TCP connect and TLS times"""
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class TimedConnection:
+        timings: Optional[Dict[str, float]] = None
+
+        def _new_conn(self):
+            # Resolve first so DNS time is separate; then connect to each address in turn
+            start = time.perf_counter()
+            host = self._dns_host
+            try:
+                infos = socket.getaddrinfo(host, self.port, type=socket.SOCK_STREAM)
+            except OSError:
+                return super()._new_conn()  # Let urllib3 report the resolution error
+            resolved = time.perf_counter()
+            error = None
+            for info in infos:
+                self._dns_host = info[4][0]
+                try:
+                    sock = super()._new_conn()
+                    break
+                except Exception as e:
+                    error = e
+                finally:
+                    self._dns_host = host
+            else:
+                raise error
+            self.timings = {"dns": resolved - start, "connect": time.perf_counter() - resolved}
+            return sock
+
+        def connect(self):
+            start = time.perf_counter()
+            super().connect()
+            if self.timings is not None:
+                # What connect() spent beyond opening the socket is the TLS handshake
+                opened = self.timings["dns"] + self.timings["connect"]
+                self.timings["tls"] = max(0.0, time.perf_counter() - start - opened)
+
+    class TimedHTTPConnection(TimedConnection, HTTPConnection):
+        pass
+
+    class TimedHTTPSConnection(TimedConnection, HTTPSConnection):
+        pass
+
+    class TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = TimedHTTPConnection
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = TimedHTTPSConnection
+
+    return {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
+
+def get_session() -> "requests.Session":
+    """Return the shared session, creating its connection pool on first use"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            # requests is imported here so paths that never call the API skip it
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=config.POOL_CONNECTIONS,
+                pool_maxsize=config.POOL_MAXSIZE,
+            )
+            adapter.poolmanager.pool_classes_by_scheme = _timed_pool_classes()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
+
+
+def _mark_connection(response: "requests.Response") -> bool:
+    """Record the connection behind a response. Returns True if it was used before"""
+    connection = getattr(response.raw, "connection", None)
+    if connection is None:
+        return False
+    with _seen_lock:
+        reused = connection in _seen_connections
+        _seen_connections.add(connection)
+    return reused
+
+
+def connection_timings(response: "requests.Response") -> Dict[str, float]:
+    """DNS, connect and TLS seconds if this response opened a new connection, else {}"""
+    connection = getattr(response.raw, "connection", None)
+    timings = getattr(connection, "timings", None)
+    if not timings:
+        return {}
+    connection.timings = None  # Reported once; later requests reuse the connection
+    return timings
+
+
+def post(url: str, **kwargs) -> tuple["requests.Response", bool]:
+    """POST through the shared pool. Returns (response, connection_reused).
+
+    The body is always fetched lazily so the connection can be inspected;
+    reading response.content or .json() releases it back to the pool.
+    """
+    kwargs["stream"] = True
+    response = get_session().post(url, **kwargs)
+    _touch()
+    return response, _mark_connection(response)
+
+
+def accepts_compression(url: str) -> bool:
+    return url not in _no_compression
+
+
+def refuse_compression(url: str) -> None:
+    """Send url uncompressed bodies from now on (for the rest of the process)"""
+    _no_compression.add(url)
+
+
+def abort(response: "requests.Response") -> None:
+    """Close the connection behind response now, waking any thread blocked reading it"""
+    connection = getattr(response.raw, "connection", None)
+    sock = getattr(connection, "sock", None)
+    try:
+        if sock is not None:
+            sock.shutdown(socket.SHUT_RDWR)  # close() alone does not interrupt a blocked recv
+        response.close()
+    except OSError:
+        pass  # Already closed
+
+
+def prewarm(url: str) -> None:
+    """Open a keep-alive connection to url in the background (DNS, TCP and TLS)"""
+    global _prewarm_thread
+    if _prewarm_thread is not None and _prewarm_thread.is_alive():
+        return
+
+    def warm():
+        import requests
+
+        try:
+            response = get_session().head(url, timeout=config.REQUEST_TIMEOUT, stream=True)
+            _touch()
+            _mark_connection(response)
+            connection_timings(response)  # Setup time belongs to the prewarm, not the next request
+            response.content  # Consume the (empty) body so the connection returns to the pool
+        except requests.RequestException:
+            pass  # The real request will report connection problems
+
+    _prewarm_thread = threading.Thread(target=warm, daemon=True)
+    _prewarm_thread.start()
+
+
+def refresh(url: str) -> None:
+    """prewarm, but only once the pooled connection has been idle long enough to be closed"""
+    if time.monotonic() - _last_used > config.POOL_IDLE_REFRESH:
+        prewarm(url)
@@ -1,41 +1,62 @@
-import pyperclip
-import re
 import subprocess
 import platform
 import shlex
 import os
-from prompt_toolkit import prompt
-from prompt_toolkit.completion import WordCompleter
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Optional
+from . import config
+
+if TYPE_CHECKING:
+    from .response import ParsedResponse
 
 def confirm_execution(command: str) -> bool:
     """Ask for confirmation before executing a command."""
+    # prompt_toolkit is only needed when a command has to be confirmed
+    from prompt_toolkit import prompt
+    from prompt_toolkit.completion import WordCompleter
+
     confirmation = prompt(
         f"\nDo you want to execute this command: '{command}'? (Y/N): ",
         completer=WordCompleter(['Y', 'N'])
     ).strip().upper()
     return confirmation == 'Y'
 
-def copy_content(text: str, command: str) -> str:
+def parse_command(response_text: str) -> Optional[str]:
+    """Return the command from a 'COMMAND: <cmd>' response, or None."""
+    parts = response_text.split("COMMAND:")
+    if len(parts) > 1 and parts[1].strip():
+        cmd = parts[1].split("\n")[0].strip()
+        # Remove any OS-specific comments in parentheses
+        return cmd.split("(")[0].strip() or None
+    return None
+
+def copy_content(text: "str | ParsedResponse", command: str) -> str:
     """Copy content based on command with improved error handling and feedback."""
+    from .response import parse
+
+    response = parse(text)  # Code blocks are indexed once, not per c-N
     commands = command.strip().lower().split()
     result = []
     copied_content = []
 
     for cmd in commands:
         if cmd == "cp":
-            copied_content.append(text)
+            copied_content.append(response.text)
             result.append("✓ Full response copied")
 
         elif cmd.startswith("c-"):
             try:
                 index = int(cmd.split("-")[1]) - 1
-                code_blocks = extract_code_blocks(text)
-                if 0 <= index < len(code_blocks):
-                    lang, code = code_blocks[index]
+                if 0 <= index < len(response.blocks):
+                    lang, code = response.code(index)
                     copied_content.append(code)
                     result.append(f"✓ Code block #{index + 1} copied ({lang})")
                 else:
-                    result.append(f"❌ Code block #{index + 1} not found (total blocks: {len(code_blocks)})")
+                    result.append(f"❌ Code block #{index + 1} not found (total blocks: {len(response.blocks)})")
             except ValueError:
                 result.append(f"❌ Invalid block number in command: {cmd}")
             except Exception as e:
@@ -45,6 +66,7 @@ def copy_content(text: str, command: str) -> str:
 
     if copied_content:
         try:
+            import pyperclip  # Only loaded when something is actually copied
             content = "\n\n".join(copied_content)
             pyperclip.copy(content)
         except Exception as e:
@@ -54,47 +76,44 @@ def copy_content(text: str, command: str) -> str:
 
 def extract_code_blocks(text: str) -> list:
     """Extract code blocks from markdown text, preserving language info."""
-    blocks = []
-    matches = re.finditer(r"```(\w*)\n(.*?)```", text, re.DOTALL)
-    for match in matches:
-        lang = match.group(1) or "text"
-        code = match.group(2).rstrip()
-        blocks.append((lang, code))
-    return blocks
+    from .response import parse
 
-def get_help_text(os_type: str) -> str:
-    """Get OS-specific help text."""
-    os_commands = {
-        'windows': {
-            'file_list': 'dir',
-            'file_content': 'type',
-            'pwd': 'cd',
-            'sysinfo': 'systeminfo',
-            'memory': 'wmic memorychip get',
-            'disk': 'wmic logicaldisk get size,freespace,caption',
-            'clear': 'cls'
-        },
-        'linux': {
-            'file_list': 'ls',
-            'file_content': 'cat',
-            'pwd': 'pwd',
-            'sysinfo': 'uname -a',
-            'memory': 'free -h',
-            'disk': 'df -h',
-            'clear': 'clear'
-        },
-        'darwin': {
-            'file_list': 'ls',
-            'file_content': 'cat',
-            'pwd': 'pwd',
-            'sysinfo': 'uname -a',
-            'memory': 'vm_stat',
-            'disk': 'df -h',
-            'clear': 'clear'
-        }
+    return parse(text).code_blocks()
+
+# Per-OS commands shown in help and used by the local intent resolver
+OS_COMMANDS = {
+    'windows': {
+        'file_list': 'dir',
+        'file_content': 'type',
+        'pwd': 'cd',
+        'sysinfo': 'systeminfo',
+        'memory': 'wmic memorychip get',
+        'disk': 'wmic logicaldisk get size,freespace,caption',
+        'clear': 'cls'
+    },
+    'linux': {
+        'file_list': 'ls',
+        'file_content': 'cat',
+        'pwd': 'pwd',
+        'sysinfo': 'uname -a',
+        'memory': 'free -h',
+        'disk': 'df -h',
+        'clear': 'clear'
+    },
+    'darwin': {
+        'file_list': 'ls',
+        'file_content': 'cat',
+        'pwd': 'pwd',
+        'sysinfo': 'uname -a',
+        'memory': 'vm_stat',
+        'disk': 'df -h',
+        'clear': 'clear'
     }
+}
 
-    commands = os_commands.get(os_type, os_commands['linux'])
+def get_help_text(os_type: str) -> str:
+    """Get OS-specific help text."""
+    commands = OS_COMMANDS.get(os_type, OS_COMMANDS['linux'])
 
     return f"""Available Commands (current OS: {os_type}):
 
@@ -125,26 +144,212 @@ You can request these commands in any language, examples:
 
 Notes:
 - Commands starting with '!' execute immediately
-- Natural language commands require confirmation (Y/N)
+- Suggested commands that change the system require confirmation (Y/N);
+  read-only ones (ls, df, git status, ...) run at once, side by side
 - Directory changes with 'cd' update the prompt
-- All commands have a 30-second timeout"""
+- Ctrl+C stops a running command, not the chat"""
+
+class OutputBuffer:
+    """Keeps the newest output up to max_chars; older text is dropped as new text arrives"""
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.chunks = deque()
+        self.size = 0
+        self.dropped = 0  # Characters discarded from the front
+        self.lock = threading.Lock()
+
+    def write(self, text: str):
+        with self.lock:
+            self.chunks.append(text)
+            self.size += len(text)
+            while self.size > self.max_chars:
+                excess = self.size - self.max_chars
+                oldest = self.chunks[0]
+                if len(oldest) <= excess:
+                    self.chunks.popleft()
+                    removed = len(oldest)
+                else:
+                    self.chunks[0] = oldest[excess:]
+                    removed = excess
+                self.size -= removed
+                self.dropped += removed
+
+    def getvalue(self) -> str:
+        with self.lock:
+            text = "".join(self.chunks)
+        if self.dropped:
+            # Start at a line boundary so the first line is not cut in half
+            newline = text.find("\n")
+            return f"… (earlier output omitted)\n{text[newline + 1:] if newline != -1 else text}"
+        return text
+
+
+def _pump(pipe, buffer: OutputBuffer, echo: Optional[Callable[[str], None]]):
+    """Copy a child's pipe into buffer (and echo) as data arrives, not line by line"""
+    import codecs
+
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    with pipe:
+        while data := pipe.read1(4096):
+            text = decoder.decode(data)
+            buffer.write(text)
+            if echo:
+                echo(text)
+    buffer.write(decoder.decode(b"", final=True))
+
+
+def _stop(process: subprocess.Popen):
+    """Stop a child and everything it started, forcefully if it does not exit"""
+    try:
+        if os.name == "nt":
+            process.terminate()
+        else:
+            os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=2)
+    except subprocess.TimeoutExpired:
+        if os.name == "nt":
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    except (ProcessLookupError, PermissionError):
+        pass  # Already gone
 
-def execute_command(command: str) -> tuple[str, bool]:
+
+def _echo_to(stream) -> Callable[[str], None]:
+    def echo(text: str):
+        stream.write(text)
+        stream.flush()
+    return echo
+
+
+def _wait(process: subprocess.Popen, timeout: Optional[float], stop: Optional[threading.Event]):
+    """process.wait(timeout) that also gives up, as if interrupted, once stop is set"""
+    if stop is None:
+        process.wait(timeout=timeout)
+        return
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while process.poll() is None:
+        if stop.wait(0.05):
+            raise KeyboardInterrupt
+        if deadline is not None and time.monotonic() > deadline:
+            raise subprocess.TimeoutExpired(process.args, timeout)
+
+
+def run_command(
+    args: list,
+    timeout: Optional[float] = None,
+    echo: bool = False,
+    stop: Optional[threading.Event] = None,
+    env: Optional[dict] = None,
+) -> tuple[Optional[int], str, str, str]:
+    """Run a command, streaming its output as it is produced.
+
+    Output is kept in bounded buffers (config.COMMAND_OUTPUT_MAX_CHARS per
+    stream) so long-running or chatty commands do not fill memory. With echo,
+    stdout and stderr are also written to the terminal live. Ctrl+C stops only
+    the child: it runs in its own process group and is terminated here. Setting
+    stop (from another thread) cancels it the same way. env replaces the
+    inherited environment.
+
+    Returns (exit code or None, stdout, stderr, status) where status is
+    "exited", "timeout" or "cancelled".
+    """
+    options = {}
+    if os.name == "nt":
+        options["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        options["start_new_session"] = True  # Terminal Ctrl+C reaches us, not the child
+    process = subprocess.Popen(
+        args,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=os.getcwd(),
+        env=env,
+        **options,
+    )
+    stdout = OutputBuffer(config.COMMAND_OUTPUT_MAX_CHARS)
+    stderr = OutputBuffer(config.COMMAND_OUTPUT_MAX_CHARS)
+    readers = [
+        threading.Thread(target=_pump, args=(process.stdout, stdout, _echo_to(sys.stdout) if echo else None)),
+        threading.Thread(target=_pump, args=(process.stderr, stderr, _echo_to(sys.stderr) if echo else None)),
+    ]
+    for reader in readers:
+        reader.daemon = True
+        reader.start()
+
+    status = "exited"
+    try:
+        _wait(process, timeout, stop)
+    except subprocess.TimeoutExpired:
+        status = "timeout"
+        _stop(process)
+    except KeyboardInterrupt:
+        status = "cancelled"
+        _stop(process)
+    for reader in readers:
+        reader.join(timeout=2)  # Grandchildren may still hold the pipes open
+    code = process.returncode if status == "exited" else None
+    return code, stdout.getvalue(), stderr.getvalue(), status
+
+
+def _format_result(result: tuple, os_type: str, echo: bool) -> tuple[str, bool]:
+    """Turn a run_command result into execute_command's (message, success)"""
+    code, stdout, stderr, status = result
+    if status == "timeout":
+        return (f"❌ Command timed out after {config.COMMAND_TIMEOUT} seconds", False)
+    if status == "cancelled":
+        return ("❌ Command cancelled", False)
+    current_dir = os.getcwd()
+    if code == 0:
+        output = "" if echo else stdout.strip()
+        if output:
+            return (f"✓ Command executed successfully ({os_type}) in {current_dir}:\n{output}", True)
+        return (f"✓ Command executed successfully ({os_type}) in {current_dir}", True)
+    if echo:
+        return (f"❌ Command failed in {current_dir} (exit code {code})", False)
+    return (f"❌ Command failed in {current_dir}:\n{stderr.strip()}", False)
+
+
+def captured_output(result: tuple) -> str:
+    """stdout, then stderr, of a run_command result"""
+    _, stdout, stderr, _ = result
+    return stdout + (f"\n[stderr]\n{stderr}" if stderr.strip() else "")
+
+
+def execute_command(command: str, echo: bool = False) -> tuple[str, bool]:
     """
     Execute a system command safely with OS-specific handling.
-    Returns a tuple of (output/error message, success boolean)
+    Returns a tuple of (output/error message, success boolean).
+    With echo, output is printed while the command runs and the message
+    only reports the outcome.
     """
+    message, success, _ = execute_and_capture(command, echo)
+    return message, success
+
+
+def execute_and_capture(command: str, echo: bool = False) -> tuple[str, bool, str]:
+    """execute_command that also returns the command's output (even when echoed)"""
     # Get system info
     os_type = platform.system().lower()
     
     try:
         # Validate command
         if not command.strip():
-            return ("Error: Empty command", False)
+            return ("Error: Empty command", False, "")
 
         # Handle help command
         if command.lower().strip() == "help":
-            return (get_help_text(os_type), True)
+            return (get_help_text(os_type), True, "")
+
+        # Commands go to one long-lived shell where it is available (cd, export
+        # and aliases then persist natively)
+        if config.PERSISTENT_SHELL and os_type != "windows":
+            from .shell import get_shell
+            result = get_shell().run(command, config.COMMAND_TIMEOUT, echo)
+            return (*_format_result(result, os_type, echo), captured_output(result))
 
         # Handle OS-specific command preparation
         if os_type == "windows":
@@ -168,33 +373,17 @@ def execute_command(command: str) -> tuple[str, bool]:
                 # Change to the target directory
                 os.chdir(target_dir)
                 current_dir = os.getcwd()
-                return (f"✓ Changed directory to: {current_dir}", True)
+                return (f"✓ Changed directory to: {current_dir}", True, "")
             except Exception as e:
-                return (f"❌ Failed to change directory: {str(e)}", False)
-
-        # Execute other commands with timeout
-        result = subprocess.run(
-            shell_cmd,
-            capture_output=True,
-            text=True,
-            timeout=30,  # 30 second timeout
-            shell=False,  # More secure
-            cwd=os.getcwd()  # Use current directory
-        )
-
-        # Handle command output
-        if result.returncode == 0:
-            output = result.stdout.strip()
-            current_dir = os.getcwd()
-            if output:
-                return (f"✓ Command executed successfully ({os_type}) in {current_dir}:\n{output}", True)
-            return (f"✓ Command executed successfully ({os_type}) in {current_dir}", True)
-        else:
-            return (f"❌ Command failed in {os.getcwd()}:\n{result.stderr.strip()}", False)
+                return (f"❌ Failed to change directory: {str(e)}", False, "")
 
-    except subprocess.TimeoutExpired:
-        return ("❌ Command timed out after 30 seconds", False)
+        # Execute other commands, streaming their output
+        result = run_command(shell_cmd, config.COMMAND_TIMEOUT, echo)
+        return (*_format_result(result, os_type, echo), captured_output(result))
+
+    except FileNotFoundError:
+        return (f"❌ Command not found: {command.split()[0]}", False, "")
     except subprocess.SubprocessError as e:
-        return (f"❌ Error executing command: {str(e)}", False)
+        return (f"❌ Error executing command: {str(e)}", False, "")
     except Exception as e:
-        return (f"❌ Unexpected error: {str(e)}", False)
+        return (f"❌ Unexpected error: {str(e)}", False, "")
@@ -0,0 +1,125 @@
+import pytest
+
+from src import agent
+from src.agent import is_read_only
+
+
+@pytest.mark.parametrize("command", [
+    "ls -la",
+    "df -h",
+    "du -sh /tmp",
+    "ps aux | grep python",
+    "tail -n 50 /var/log/syslog",
+    "tail -n50 app.log",
+    "date",
+    "date +%F",
+    "date -u",
+    "hostname",
+    "hostname -I",
+    "ss -tulpn",
+    "find . -name '*.py' -mtime -1",
+    "sort -k2,2 -rn data.txt",
+    "git status",
+    "git --no-pager log --oneline -5",
+    "git diff --stat",
+    "docker ps -a",
+    "docker logs --tail 100 web",
+    "docker stats --no-stream",
+    "kubectl get pods -o wide",
+    "kubectl logs --tail 50 api",
+    "journalctl -u nginx -n 50 --no-pager",
+    "systemctl status nginx",
+    "ipconfig /all",
+    "dir /s",
+])
+def test_read_only(command):
+    assert is_read_only(command)
+
+
+@pytest.mark.parametrize("command", [
+    # Change the system
+    "rm -rf build",
+    "date -s 2020-01-01",
+    "date --set=2020-01-01",
+    "date 010112002020",
+    "hostname evil",
+    "hostname -F /etc/other",
+    "ss -K dst 1.2.3.4",
+    "ipconfig /release",
+    "ipconfig /renew",
+    "ipconfig /flushdns",
+    "ipconfig /registerdns",
+    "journalctl --flush",
+    "journalctl --sync",
+    "journalctl --relinquish-var",
+    "journalctl --setup-keys",
+    "journalctl --rotate",
+    "journalctl --vacuum-size=100M",
+    "find . -delete",
+    "find . -name x -exec rm {} +",
+    "sort -o out.txt data.txt",
+    "sort -ro out.txt data.txt",
+    "git push",
+    "git -c core.pager=evil log",
+    "git diff --output=patch.txt",
+    "kubectl delete pod api",
+    "docker rm web",
+    # Never exit on their own
+    "tail -f app.log",
+    "tail -F app.log",
+    "journalctl -f",
+    "kubectl logs -f api",
+    "kubectl logs --follow api",
+    "kubectl get pods -w",
+    "docker logs -f web",
+    "docker stats",
+    "free -s 1",
+    "vm_stat 1",
+    # Shell syntax
+    "ls > files.txt",
+    "cat a; rm b",
+    "echo $(rm x)",
+    "ls || rm x",
+    "ls && rm x",
+    "/bin/ls",
+    "FOO=1 ls",
+    "ls | xargs rm",
+])
+def test_needs_confirmation(command):
+    assert not is_read_only(command)
+
+
+class _Resolver:
+    def __init__(self):
+        self.remembered = []
+
+    def remember(self, message, command, os_type):
+        self.remembered.append(command)
+
+
+class _Chatbot:
+    def __init__(self, *replies):
+        self.replies = list(replies)
+
+    def get_response(self, message):
+        return self.replies.pop(0)
+
+
+def _run(monkeypatch, response_text, *replies):
+    resolver = _Resolver()
+    monkeypatch.setattr("src.intents.get_resolver", lambda: resolver)
+    monkeypatch.setattr(agent, "run_commands", lambda commands, os_type: [
+        {"command": command, "outcome": "exit code 0", "output": "", "success": True, "ran": True}
+        for command in commands
+    ])
+    agent.run_agent(_Chatbot(*replies), "why is my disk full", "linux", show=lambda text: None,
+                    response_text=response_text)
+    return resolver.remembered
+
+
+def test_remembers_one_shot_answer(monkeypatch):
+    assert _run(monkeypatch, "COMMAND: df -h") == ["df -h"]
+
+
+def test_does_not_remember_continue_round(monkeypatch):
+    assert _run(monkeypatch, "COMMAND: df -h\nCONTINUE", "The root partition is full.") == []
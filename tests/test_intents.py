@@ -0,0 +1,41 @@
+import pytest
+
+from src import config
+from src.intents import IntentResolver
+
+
+@pytest.fixture
+def resolver(tmp_path):
+    return IntentResolver(learned_path=str(tmp_path / "intents.json"))
+
+
+@pytest.mark.parametrize("text, command", [
+    ("show me all files", "ls"),
+    ("list all the files please", "ls"),
+    ("hiển thị danh sách file", "ls"),
+    ("what is my current directory", "pwd"),
+    ("xóa màn hình", "clear"),
+    ("kiểm tra bộ nhớ", "free -h"),
+    ("check disk spce", "df -h"),
+])
+def test_resolves_known_requests(resolver, text, command):
+    resolved = resolver.resolve(text, "linux")
+    assert resolved is not None
+    assert resolved[0] == command
+    assert resolved[1] >= config.INTENT_MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize("text", [
+    "show current directory size",  # Not pwd
+    "hiển thị các file ẩn",  # Hidden files: not plain ls
+    "show files in /etc",
+    "delete all files",
+])
+def test_leaves_uncovered_words_to_the_model(resolver, text):
+    resolved = resolver.resolve(text, "linux")
+    assert resolved is None or resolved[1] < config.INTENT_MIN_CONFIDENCE
+
+
+def test_remembered_commands_resolve_exactly(resolver):
+    resolver.remember("show current directory size", "du -sh .", "linux")
+    assert resolver.resolve("show current directory size", "linux") == ("du -sh .", 1.0)